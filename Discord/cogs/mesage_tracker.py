@@ -1,12 +1,39 @@
 import discord
 from discord.ext import commands
 from datetime import datetime, timedelta
-import sqlite3
-import os
-import asyncio
-from collections import defaultdict
-from google import genai
-from google.genai import types
+from typing import Literal
+from zoneinfo import ZoneInfoNotFoundError
+
+from standup_core.catchup import CatchUp
+from standup_core.engine import DIGEST_DAYS, StandupEngine
+from standup_core.ratelimit import INTERACTIVE, llm_request
+from standup_core.scheduler import SummaryScheduler
+
+
+PLATFORM = "discord"
+# Bump whenever the summary prompt changes so cached summaries are not reused.
+SUMMARY_PROMPT_VERSION = "discord-v1"
+
+
+class QueueNotice:
+    """Shows a deferred command's place in the LLM queue while it waits."""
+
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.shown = False
+
+    async def update(self, position):
+        await self.interaction.edit_original_response(
+            content=f"⏳ The AI is busy; your request is #{position} in the queue."
+        )
+        self.shown = True
+
+    async def clear(self):
+        if self.shown:
+            try:
+                await self.interaction.delete_original_response()
+            except discord.HTTPException:
+                pass
 
 
 class MessageTrackerCog(commands.Cog):
@@ -14,212 +41,109 @@ class MessageTrackerCog(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.db_path = "standup_messages.db"
-        self.init_database()
-
-        self.client = genai.Client()
-
-    def init_database(self):
-        """Initialize SQLite database with required tables."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Create standup_channels table
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS standup_channels (
-                channel_id INTEGER PRIMARY KEY,
-                guild_id INTEGER NOT NULL,
-                channel_name TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """
+        self.settings = bot.settings
+        self.engine = StandupEngine(
+            PLATFORM,
+            bot.settings,
+            bot.db,
+            bot.ingest,
+            bot.llm,
+            SUMMARY_PROMPT_VERSION,
+            self.build_summary_prompt,
         )
-
-        # Create messages table
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY,
-                message_id INTEGER NOT NULL,
-                channel_id INTEGER NOT NULL,
-                author_name TEXT NOT NULL,
-                author_id INTEGER NOT NULL,
-                content TEXT NOT NULL,
-                timestamp TIMESTAMP NOT NULL,
-                date TEXT NOT NULL,
-                attachments INTEGER DEFAULT 0,
-                embeds INTEGER DEFAULT 0,
-                FOREIGN KEY (channel_id) REFERENCES standup_channels (channel_id)
-            )
-        """
+        self.catchup = CatchUp.from_settings(bot.db, PLATFORM, self.fetch_history, bot.settings)
+        self.scheduler = SummaryScheduler.from_settings(
+            self.engine, self.post_scheduled_summary, self.channel_name, bot.settings
         )
 
-        # Create index for faster queries
-        cursor.execute(
-            """
-            CREATE INDEX IF NOT EXISTS idx_messages_date_channel 
-            ON messages (date, channel_id)
-        """
-        )
+    async def cog_load(self):
+        await self.engine.start()
 
-        conn.commit()
-        conn.close()
+    async def cog_unload(self):
+        await self.scheduler.stop()
+        await self.catchup.stop()
+        await self.engine.stop()
 
     def get_standup_channels(self, guild_id=None):
         """Get all standup channels, optionally filtered by guild."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        if guild_id:
-            cursor.execute(
-                "SELECT channel_id FROM standup_channels WHERE guild_id = ?",
-                (guild_id,),
-            )
-        else:
-            cursor.execute("SELECT channel_id FROM standup_channels")
+        return self.engine.channels(guild_id)
 
-        channels = {row[0] for row in cursor.fetchall()}
-        conn.close()
-        return channels
-
-    def add_standup_channel(self, channel_id, guild_id, channel_name):
+    async def add_standup_channel(self, channel_id, guild_id, channel_name):
         """Add a channel to standup monitoring."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT OR REPLACE INTO standup_channels 
-            (channel_id, guild_id, channel_name) 
-            VALUES (?, ?, ?)
-        """,
-            (channel_id, guild_id, channel_name),
-        )
-
-        conn.commit()
-        conn.close()
+        await self.engine.add_channel(channel_id, guild_id, channel_name)
 
-    def remove_standup_channel(self, channel_id):
+    async def delete_standup_channel(self, channel_id):
         """Remove a channel from standup monitoring."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("DELETE FROM standup_channels WHERE channel_id = ?", (channel_id,))
-        conn.commit()
-        conn.close()
-
-    def store_message(self, message):
-        """Store a message in the database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        date_str = message.created_at.strftime("%Y-%m-%d")
-
-        cursor.execute(
-            """
-            INSERT INTO messages 
-            (message_id, channel_id, author_name, author_id, content, timestamp, date, attachments, embeds)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-            (
-                message.id,
-                message.channel.id,
-                message.author.display_name,
-                message.author.id,
-                message.content,
-                message.created_at.isoformat(),
-                date_str,
-                len(message.attachments),
-                len(message.embeds),
-            ),
+        await self.engine.remove_channel(channel_id)
+
+    async def store_message(self, message):
+        """Queue a new or edited message for the next batched write."""
+        await self.engine.store_message(
+            message.id,
+            message.channel.id,
+            message.author.id,
+            message.author.display_name,
+            message.content,
+            message.created_at,
+            len(message.attachments),
+            len(message.embeds),
         )
 
-        conn.commit()
-        conn.close()
-
-    def get_messages_for_date(self, channel_id, date):
-        """Get all messages for a specific date and channel."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT author_name, content, timestamp, attachments, embeds
-            FROM messages 
-            WHERE channel_id = ? AND date = ?
-            ORDER BY timestamp ASC
-        """,
-            (channel_id, date),
+    async def fetch_history(self, channel_id, after):
+        """Store a channel's messages sent after `after` (catch-up); returns the count."""
+        channel = self.bot.get_channel(int(channel_id))
+        if channel is None:
+            return 0
+        fetched = 0
+        # discord.py pages through history 100 at a time and waits out rate limits.
+        async for message in channel.history(limit=None, after=after, oldest_first=True):
+            if message.author.bot:
+                continue
+            await self.store_message(message)
+            fetched += 1
+        return fetched
+
+    async def channel_name(self, channel_id):
+        channel = self.bot.get_channel(int(channel_id))
+        return channel.name if channel is not None else "Unknown"
+
+    async def post_scheduled_summary(self, channel_id, date, summary, message_count):
+        """Post the end-of-day summary the scheduler generated."""
+        channel = self.bot.get_channel(int(channel_id))
+        if channel is None:
+            raise LookupError(f"channel {channel_id} is not visible to the bot")
+        await channel.send(embed=self.summary_embed(summary, date, channel, message_count))
+
+    def summary_embed(self, summary, date, channel, message_count):
+        """Embed showing a day's summary, split across fields to fit Discord's limits."""
+        embed = discord.Embed(
+            title="🤖 AI-Powered Daily Summary",
+            description=f"**Date:** {date}\n**Channel:** {channel.mention}\n**Messages Analyzed:** {message_count}",
+            color=discord.Color.blue(),
+            timestamp=datetime.now(),
         )
 
-        messages = cursor.fetchall()
-        conn.close()
-        return messages
-
-    def trim_messages_for_gemini(self, messages, max_tokens=900000):
-        """Trim messages to fit within Gemini's context window."""
-        # Rough estimate: 1 token ≈ 4 characters
-        max_chars = max_tokens * 3  # Conservative estimate
-
-        if not messages:
-            return []
-
-        # Format messages with priorities
-        formatted_messages = []
-        total_chars = 0
-
-        # Group by author for better organization
-        author_messages = defaultdict(list)
-        for msg in messages:
-            author_messages[msg[0]].append(msg)
-
-        # Add messages by author, ensuring we get representation from everyone
-        for author, msgs in author_messages.items():
-            author_content = f"\n**{author}:**\n"
-            author_chars = len(author_content)
-
-            for msg in msgs:
-                content = msg[1]
-                timestamp = datetime.fromisoformat(msg[2]).strftime("%H:%M")
-
-                # Add attachment/embed info if present
-                extras = []
-                if msg[3] > 0:  # attachments
-                    extras.append(f"{msg[3]} attachments")
-                if msg[4] > 0:  # embeds
-                    extras.append(f"{msg[4]} embeds")
-
-                extra_info = f" ({', '.join(extras)})" if extras else ""
-                msg_text = f"[{timestamp}] {content}{extra_info}\n"
-
-                if total_chars + author_chars + len(msg_text) > max_chars:
-                    if not formatted_messages:  # Ensure at least one message
-                        formatted_messages.append(author_content + msg_text)
-                    break
-
-                author_content += msg_text
-                author_chars += len(msg_text)
-
-            if author_chars > len(f"\n**{author}:**\n"):  # Has content
-                formatted_messages.append(author_content)
-                total_chars += author_chars
-
-            if total_chars > max_chars:
-                break
-
-        return formatted_messages
-
-    async def generate_ai_summary(self, messages, date, channel_name):
-        """Generate AI summary using Gemini."""
-        if not messages:
-            return "No messages found for this date."
+        # Split summary if it's too long for Discord
+        if len(summary) > 1024:
+            # Split into chunks
+            chunks = [summary[i : i + 1020] for i in range(0, len(summary), 1020)]
+            for i, chunk in enumerate(chunks[:3]):  # Limit to 3 chunks
+                embed.add_field(
+                    name=f"Summary {i + 1}" if len(chunks) > 1 else "Summary",
+                    value=chunk + ("..." if i < len(chunks) - 1 else ""),
+                    inline=False,
+                )
+        else:
+            embed.add_field(name="Summary", value=summary, inline=False)
+        return embed
 
-        # Trim messages to fit context window
-        trimmed_messages = self.trim_messages_for_gemini(messages)
-        messages_text = "\n".join(trimmed_messages)
+    async def get_messages_for_date(self, channel_id, date):
+        """Get all messages for a specific date and channel."""
+        return await self.engine.messages_for_date(channel_id, date)
 
-        prompt = f"""
+    def build_summary_prompt(self, messages_text, date, channel_name):
+        """Build the final summary prompt around the (possibly pre-summarized) messages."""
+        return f"""
         Please analyze the following standup messages from {channel_name} on {date} and provide **ONE** comprehensive summary.
 
         Focus on:
@@ -236,13 +160,9 @@ class MessageTrackerCog(commands.Cog):
         {messages_text}
         """
 
-        try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash", contents=prompt
-            )
-            return response.text
-        except Exception as e:
-            return f"Error generating AI summary: {str(e)}"
+    async def generate_ai_summary(self, messages, date, channel_name, channel_id=None):
+        """Generate AI summary using Gemini, reusing a cached one when possible."""
+        return await self.engine.generate_summary(messages, date, channel_name, channel_id)
 
     @discord.app_commands.command(
         name="set_standup_channel",
@@ -261,14 +181,13 @@ class MessageTrackerCog(commands.Cog):
         guild_id = interaction.guild_id
         channel_name = interaction.channel.name
 
-        standup_channels = self.get_standup_channels(guild_id)
-        if channel_id in standup_channels:
+        if self.engine.contains(guild_id, channel_id):
             await interaction.response.send_message(
                 "✅ This channel is already set as a standup channel!", ephemeral=True
             )
             return
 
-        self.add_standup_channel(channel_id, guild_id, channel_name)
+        await self.add_standup_channel(channel_id, guild_id, channel_name)
 
         embed = discord.Embed(
             title="📋 Standup Channel Set!",
@@ -297,15 +216,14 @@ class MessageTrackerCog(commands.Cog):
             return
 
         channel_id = interaction.channel_id
-        standup_channels = self.get_standup_channels(interaction.guild_id)
 
-        if channel_id not in standup_channels:
+        if not self.engine.contains(interaction.guild_id, channel_id):
             await interaction.response.send_message(
                 "This channel is not set as a standup channel.", ephemeral=True
             )
             return
 
-        self.remove_standup_channel(channel_id)
+        await self.delete_standup_channel(channel_id)
 
         await interaction.response.send_message(
             "✅ Removed standup monitoring from this channel.", ephemeral=True
@@ -317,20 +235,21 @@ class MessageTrackerCog(commands.Cog):
     @discord.app_commands.describe(
         date="Date to summarize (YYYY-MM-DD format, default: today)",
         channel="Channel to summarize (default: current channel)",
+        period="A single day, or a digest of the week/month ending on the date",
     )
     async def ai_summary(
         self,
         interaction: discord.Interaction,
         date: str = None,
         channel: discord.TextChannel = None,
+        period: Literal["day", "week", "month"] = "day",
     ):
         """Generate an AI-powered daily summary of messages from a standup channel."""
         await interaction.response.defer()  # This might take a while
 
         target_channel = channel or interaction.channel
-        standup_channels = self.get_standup_channels(interaction.guild_id)
 
-        if target_channel.id not in standup_channels:
+        if not self.engine.contains(interaction.guild_id, target_channel.id):
             await interaction.followup.send(
                 f"{target_channel.mention} is not set as a standup channel. Use `/set_standup_channel` first.",
                 ephemeral=True,
@@ -339,7 +258,7 @@ class MessageTrackerCog(commands.Cog):
 
         # Parse date
         if date is None:
-            target_date = datetime.now().strftime("%Y-%m-%d")
+            target_date = self.engine.today(target_channel.id)
         else:
             try:
                 datetime.strptime(date, "%Y-%m-%d")
@@ -350,39 +269,55 @@ class MessageTrackerCog(commands.Cog):
                 )
                 return
 
+        notice = QueueNotice(interaction)
+        try:
+            with llm_request(INTERACTIVE, interaction.guild_id, notice.update):
+                if period in DIGEST_DAYS:
+                    await self.send_digest(interaction, target_channel, target_date, period)
+                else:
+                    await self.send_summary(interaction, target_channel, target_date)
+        finally:
+            await notice.clear()
+
+    async def send_summary(self, interaction, channel, date):
+        """Follow up with the summary of one day."""
         # Get messages for the date and channel
-        messages = self.get_messages_for_date(target_channel.id, target_date)
+        messages = await self.get_messages_for_date(channel.id, date)
 
         if not messages:
             await interaction.followup.send(
-                f"No messages found for {target_date} in {target_channel.mention}",
+                f"No messages found for {date} in {channel.mention}",
                 ephemeral=True,
             )
             return
 
         # Generate AI summary
-        summary = await self.generate_ai_summary(messages, target_date, target_channel.name)
+        summary = await self.generate_ai_summary(messages, date, channel.name, channel.id)
+
+        embed = self.summary_embed(summary, date, channel, len(messages))
+        await interaction.followup.send(embed=embed)
+
+    async def send_digest(self, interaction, channel, end_date, period):
+        """Follow up with a digest built from the stored daily summaries."""
+        days = DIGEST_DAYS[period]
+        digest = await self.engine.generate_digest(channel.id, channel.name, end_date, days)
+        start_date = (datetime.strptime(end_date, "%Y-%m-%d") - timedelta(days=days - 1)).strftime(
+            "%Y-%m-%d"
+        )
 
-        # Create embed
         embed = discord.Embed(
-            title="🤖 AI-Powered Daily Summary",
-            description=f"**Date:** {target_date}\n**Channel:** {target_channel.mention}\n**Messages Analyzed:** {len(messages)}",
+            title=f"🗓️ AI-Powered {period.title()}ly Digest",
+            description=f"**Period:** {start_date} to {end_date}\n**Channel:** {channel.mention}",
             color=discord.Color.blue(),
             timestamp=datetime.now(),
         )
-
-        # Split summary if it's too long for Discord
-        if len(summary) > 1024:
-            # Split into chunks
-            chunks = [summary[i : i + 1020] for i in range(0, len(summary), 1020)]
-            for i, chunk in enumerate(chunks[:3]):  # Limit to 3 chunks
-                embed.add_field(
-                    name=f"Summary {i + 1}" if len(chunks) > 1 else "Summary",
-                    value=chunk + ("..." if i < len(chunks) - 1 else ""),
-                    inline=False,
-                )
-        else:
-            embed.add_field(name="Summary", value=summary, inline=False)
+        chunks = [digest[i : i + 1020] for i in range(0, len(digest), 1020)]
+        for i, chunk in enumerate(chunks[:5]):
+            embed.add_field(
+                name=f"Digest {i + 1}" if len(chunks) > 1 else "Digest",
+                value=chunk + ("..." if i < len(chunks) - 1 else ""),
+                inline=False,
+            )
 
         await interaction.followup.send(embed=embed)
 
@@ -406,22 +341,159 @@ class MessageTrackerCog(commands.Cog):
             color=discord.Color.blue(),
         )
 
+        # Counting flushes the ingest queue first, which can take a while.
+        await interaction.response.defer()
         channel_list = []
-        today = datetime.now().strftime("%Y-%m-%d")
+        counts = await self.engine.today_counts(interaction.guild_id)
 
         for channel_id in standup_channels:
-            channel = self.bot.get_channel(channel_id)
+            channel = self.bot.get_channel(int(channel_id))
             if channel:
-                # Get message count for today
-                messages = self.get_messages_for_date(channel_id, today)
-                msg_count = len(messages)
-                channel_list.append(f"• {channel.mention} ({msg_count} messages today)")
+                msg_count, authors, _ = counts.get(channel_id, (0, 0, None))
+                channel_list.append(
+                    f"• {channel.mention} ({msg_count} messages today from {authors} people)"
+                )
             else:
                 channel_list.append(f"• Unknown channel (ID: {channel_id})")
 
         embed.add_field(name="Monitored Channels:", value="\n".join(channel_list), inline=False)
 
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
+
+    @discord.app_commands.command(
+        name="standup_search", description="Search standup messages in this server"
+    )
+    @discord.app_commands.describe(
+        query='Words to find (use "quotes" for a phrase, word* for a prefix)',
+        channel="Only this standup channel",
+        author="Only messages from this person",
+        after="Only messages on or after this date (YYYY-MM-DD)",
+        before="Only messages on or before this date (YYYY-MM-DD)",
+        page="Page of results (default: 1)",
+    )
+    async def standup_search(
+        self,
+        interaction: discord.Interaction,
+        query: str,
+        channel: discord.TextChannel = None,
+        author: discord.User = None,
+        after: str = None,
+        before: str = None,
+        page: discord.app_commands.Range[int, 1] = 1,
+    ):
+        """Full-text search over the standup channels of the current server."""
+        for value in (after, before):
+            if value is not None:
+                try:
+                    datetime.strptime(value, "%Y-%m-%d")
+                except ValueError:
+                    await interaction.response.send_message(
+                        "Invalid date format. Use YYYY-MM-DD format.", ephemeral=True
+                    )
+                    return
+
+        if channel is not None and not self.engine.contains(interaction.guild_id, channel.id):
+            await interaction.response.send_message(
+                f"{channel.mention} is not set as a standup channel.", ephemeral=True
+            )
+            return
+
+        # The search flushes the ingest queue first, which can take a while.
+        await interaction.response.defer()
+        result = await self.engine.search(
+            interaction.guild_id,
+            query,
+            channel_id=channel.id if channel else None,
+            author_id=author.id if author else None,
+            since=after,
+            until=before,
+            page=page,
+        )
+        if result is None:
+            await interaction.followup.send(
+                "The search index is still being built. Try again in a few minutes.",
+                ephemeral=True,
+            )
+            return
+
+        rows, has_more = result
+        if not rows:
+            await interaction.followup.send(
+                f"No standup messages match `{query}`.", ephemeral=True
+            )
+            return
+
+        lines = []
+        for channel_id, message_id, author_name, created_at, snippet in rows:
+            when = datetime.fromtimestamp(
+                created_at / 1000, self.engine.timezone(channel_id)
+            ).strftime("%Y-%m-%d %H:%M")
+            link = f"https://discord.com/channels/{interaction.guild_id}/{channel_id}/{message_id}"
+            lines.append(f"<#{channel_id}> **{author_name}** · [{when}]({link})\n{snippet}")
+
+        embed = discord.Embed(
+            title=f"🔎 Standup search: {query}"[:256],
+            description="\n\n".join(lines)[:4096],
+            color=discord.Color.blue(),
+        )
+        footer = f"Page {page}"
+        if has_more:
+            footer += f" · use page:{page + 1} for more"
+        embed.set_footer(text=footer)
+
+        await interaction.followup.send(embed=embed)
+
+    @discord.app_commands.command(
+        name="set_standup_timezone",
+        description="Set the time zone that defines this standup channel's days",
+    )
+    @discord.app_commands.describe(
+        timezone="IANA time zone name, e.g. Europe/Berlin (default: show the current one)"
+    )
+    async def set_standup_timezone(self, interaction: discord.Interaction, timezone: str = None):
+        """Set the time zone used to split the current channel's messages into days."""
+        channel_id = interaction.channel_id
+
+        if not self.engine.contains(interaction.guild_id, channel_id):
+            await interaction.response.send_message(
+                "This channel is not set as a standup channel. Use `/set_standup_channel` first.",
+                ephemeral=True,
+            )
+            return
+
+        if timezone is None:
+            await interaction.response.send_message(
+                f"This channel uses {self.engine.timezone(channel_id).key}.", ephemeral=True
+            )
+            return
+
+        if not interaction.user.guild_permissions.manage_channels:
+            await interaction.response.send_message(
+                "You need 'Manage Channels' permission to modify standup channels.",
+                ephemeral=True,
+            )
+            return
+
+        # Re-dating a busy channel can outlast the interaction deadline.
+        await interaction.response.defer(ephemeral=True)
+        try:
+            await self.engine.set_timezone(channel_id, timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            await interaction.followup.send(
+                f"Unknown time zone `{timezone}`. Use an IANA name like `Europe/Berlin`.",
+                ephemeral=True,
+            )
+            return
+
+        await interaction.followup.send(
+            f"🕒 Standup days in this channel now follow {timezone}.", ephemeral=True
+        )
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Fetch what was missed while offline (fires again after a new session)."""
+        self.catchup.trigger()
+        self.scheduler.start()
 
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -430,13 +502,43 @@ class MessageTrackerCog(commands.Cog):
         if message.author.bot:
             return
 
-        # Only track messages in standup channels
-        standup_channels = self.get_standup_channels(message.guild.id)
-        if message.channel.id not in standup_channels:
+        # Only track messages in standup channels (in-memory set lookup)
+        if message.guild is None or not self.engine.contains(
+            message.guild.id, message.channel.id
+        ):
             return
 
         # Store message in database
-        self.store_message(message)
+        await self.store_message(message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload):
+        """Re-store edited standup messages, cached or not."""
+        message = payload.message
+        if message.author.bot or payload.guild_id is None:
+            return
+        if not self.engine.contains(payload.guild_id, payload.channel_id):
+            return
+        await self.store_message(message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        """Forget deleted standup messages."""
+        if payload.guild_id is None or not self.engine.contains(
+            payload.guild_id, payload.channel_id
+        ):
+            return
+        await self.engine.delete_message(payload.channel_id, payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        """Forget standup messages removed by a bulk delete (purge)."""
+        if payload.guild_id is None or not self.engine.contains(
+            payload.guild_id, payload.channel_id
+        ):
+            return
+        for message_id in payload.message_ids:
+            await self.engine.delete_message(payload.channel_id, message_id)
 
 
 async def setup(bot):
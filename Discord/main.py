@@ -8,6 +8,12 @@ import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 
+# The shared storage package lives at the repository root.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from standup_core import AsyncDatabase, IngestQueue, Settings  # noqa: E402
+from standup_core.llm import LLMClient  # noqa: E402
+
 load_dotenv()
 
 
@@ -26,10 +32,17 @@ class StandupBot(commands.Bot):
             intents=intents,
         )
 
+        self.settings = Settings.from_env()
+        self.db = AsyncDatabase.from_settings(self.settings)
+        self.ingest = IngestQueue.from_settings(self.db, self.settings)
+        self.llm = LLMClient.from_settings(self.settings)
+
     async def setup_hook(self) -> None:
         print("Connected to bot: Standup Bot")
         print(f"Bot ID: {self.user.id}")
 
+        await self.ingest.start()
+
         # Load cogs
         cogs_dir = "cogs"
         if os.path.exists(cogs_dir):
@@ -53,6 +66,12 @@ class StandupBot(commands.Bot):
 
         self.boot_time = discord.utils.utcnow()
 
+    async def close(self) -> None:
+        await super().close()
+        # Flush messages still waiting in the write-behind queue.
+        await self.ingest.close()
+        await self.db.close()
+
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Standup Discord Bot")
@@ -0,0 +1,140 @@
+"""Cached Slack channel metadata (name, privacy, member count).
+
+Standup channel metadata lives in the `standup_channels` table and in memory.
+It is refreshed from `conversations.info` only when older than the TTL, or
+immediately from `channel_rename` / `channel_archive` events, so slash
+commands normally answer without any Slack API calls. Misses for several
+channels are fetched concurrently.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+log = logging.getLogger("standup.slack.channels")
+
+SELECT_CHANNEL_METADATA = """
+    SELECT channel_id, channel_name, is_private, is_archived, member_count, refreshed_at
+    FROM standup_channels
+    WHERE platform = 'slack'
+"""
+UPDATE_CHANNEL_METADATA = """
+    UPDATE standup_channels
+    SET channel_name = ?, is_private = ?, is_archived = ?, member_count = ?, refreshed_at = ?
+    WHERE platform = 'slack' AND channel_id = ?
+"""
+RENAME_CHANNEL = """
+    UPDATE standup_channels SET channel_name = ?
+    WHERE platform = 'slack' AND channel_id = ?
+"""
+ARCHIVE_CHANNEL = """
+    UPDATE standup_channels SET is_archived = ?
+    WHERE platform = 'slack' AND channel_id = ?
+"""
+
+
+@dataclass
+class ChannelInfo:
+    name: str
+    is_private: bool = False
+    is_archived: bool = False
+    member_count: int = None
+    refreshed_at: int = 0
+
+
+class ChannelDirectory:
+    """channel_id -> ChannelInfo, refreshed lazily from `conversations.info`."""
+
+    def __init__(self, db, ttl=21600):
+        self.db = db
+        self.ttl = ttl
+        self._channels = {}
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls, db, settings):
+        return cls(db, settings.slack_channel_cache_ttl)
+
+    async def load(self):
+        """Load metadata stored for standup channels by this or an earlier run."""
+        for channel_id, name, is_private, is_archived, members, refreshed_at in (
+            await self.db.fetchall(SELECT_CHANNEL_METADATA)
+        ):
+            self._channels[channel_id] = ChannelInfo(
+                name, bool(is_private), bool(is_archived), members, refreshed_at
+            )
+
+    def cached(self, channel_id):
+        """Whatever is in memory, fresh or not, without calling Slack."""
+        return self._channels.get(channel_id)
+
+    async def get(self, client, channel_id):
+        """Fresh metadata for one channel, or None if Slack cannot tell us."""
+        info = self._channels.get(channel_id)
+        if info is not None and info.refreshed_at >= time.time() - self.ttl:
+            self.hits += 1
+            return info
+        self.misses += 1
+
+        pending = self._pending.get(channel_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch(client, channel_id))
+            self._pending[channel_id] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(channel_id, None))
+        return await asyncio.shield(pending)
+
+    async def get_many(self, client, channel_ids):
+        """{channel_id: ChannelInfo or None}, fetching misses concurrently."""
+        channel_ids = list(channel_ids)
+        infos = await asyncio.gather(*(self.get(client, cid) for cid in channel_ids))
+        return dict(zip(channel_ids, infos))
+
+    async def _fetch(self, client, channel_id):
+        try:
+            response = await client.conversations_info(
+                channel=channel_id, include_num_members=True
+            )
+        except Exception:
+            log.debug("conversations.info failed for %s", channel_id, exc_info=True)
+            # A stale name is better than none.
+            return self._channels.get(channel_id)
+        channel = response["channel"]
+        info = ChannelInfo(
+            name=channel["name"],
+            is_private=bool(channel.get("is_private")),
+            is_archived=bool(channel.get("is_archived")),
+            member_count=channel.get("num_members"),
+            refreshed_at=int(time.time()),
+        )
+        await self.store(channel_id, info)
+        return info
+
+    async def store(self, channel_id, info):
+        """Remember `info` in memory and in `standup_channels` (if tracked)."""
+        self._channels[channel_id] = info
+        await self.db.execute(
+            UPDATE_CHANNEL_METADATA,
+            (
+                info.name,
+                int(info.is_private),
+                int(info.is_archived),
+                info.member_count,
+                info.refreshed_at,
+                channel_id,
+            ),
+        )
+
+    async def renamed(self, channel_id, name):
+        info = self._channels.get(channel_id)
+        if info is not None:
+            info.name = name
+        await self.db.execute(RENAME_CHANNEL, (name, channel_id))
+
+    async def archived(self, channel_id, is_archived=True):
+        info = self._channels.get(channel_id)
+        if info is not None:
+            info.is_archived = is_archived
+        await self.db.execute(ARCHIVE_CHANNEL, (int(is_archived), channel_id))
@@ -1,216 +1,201 @@
 import os
-import sqlite3
+import re
+import sys
 import asyncio
-from datetime import datetime
-from collections import defaultdict
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfoNotFoundError
 from slack_bolt.async_app import AsyncApp
 from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
-from google import genai
-from google.genai import types
+from slack_sdk.errors import SlackApiError
 import logging
 import dotenv
 
+# The shared storage package lives at the repository root.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from standup_core import AsyncDatabase, IngestQueue, Settings  # noqa: E402
+from standup_core.catchup import CatchUp  # noqa: E402
+from standup_core.engine import DIGEST_DAYS, StandupEngine  # noqa: E402
+from standup_core.llm import LLMClient  # noqa: E402
+from standup_core.ratelimit import INTERACTIVE, llm_request  # noqa: E402
+from standup_core.scheduler import SummaryScheduler  # noqa: E402
+from channel_directory import ChannelDirectory  # noqa: E402
+from user_directory import UserDirectory  # noqa: E402
+
 dotenv.load_dotenv()
 
 # Initialize Slack app
 app = AsyncApp(token=os.environ.get("SLACK_BOT_TOKEN"))
 
 
+PLATFORM = "slack"
+# Bump whenever the summary prompt changes so cached summaries are not reused.
+SUMMARY_PROMPT_VERSION = "slack-v1"
+
+
 class StandupTracker:
     def __init__(self):
-        self.db_path = "standup_messages.db"
-        self.init_database()
-        self.client = genai.Client()
-
-    def init_database(self):
-        """Initialize SQLite database with required tables."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Create standup_channels table
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS standup_channels (
-                channel_id TEXT PRIMARY KEY,
-                team_id TEXT NOT NULL,
-                channel_name TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """
+        self.settings = Settings.from_env()
+        self.db = AsyncDatabase.from_settings(self.settings)
+        self.ingest = IngestQueue.from_settings(self.db, self.settings)
+        self.llm = LLMClient.from_settings(self.settings)
+        self.engine = StandupEngine(
+            PLATFORM,
+            self.settings,
+            self.db,
+            self.ingest,
+            self.llm,
+            SUMMARY_PROMPT_VERSION,
+            self.build_summary_prompt,
         )
-
-        # Create messages table
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY,
-                message_ts TEXT NOT NULL,
-                channel_id TEXT NOT NULL,
-                user_name TEXT NOT NULL,
-                user_id TEXT NOT NULL,
-                content TEXT NOT NULL,
-                timestamp TIMESTAMP NOT NULL,
-                date TEXT NOT NULL,
-                attachments INTEGER DEFAULT 0
-            )
-        """
+        self.users = UserDirectory.from_settings(self.db, self.settings)
+        self.channels = ChannelDirectory.from_settings(self.db, self.settings)
+        self.catchup = CatchUp.from_settings(self.db, PLATFORM, self.fetch_history, self.settings)
+        self.scheduler = SummaryScheduler.from_settings(
+            self.engine,
+            self.post_scheduled_summary,
+            self.channel_name,
+            self.settings,
+            # Resolve deferred names first, as /ai_summary does, so the summary matches.
+            lambda channel_id, date: self.get_messages_for_date(channel_id, date, app.client),
         )
 
-        # Create index for faster queries
-        cursor.execute(
-            """
-            CREATE INDEX IF NOT EXISTS idx_messages_date_channel 
-            ON messages (date, channel_id)
-        """
-        )
+    async def start(self):
+        """Prepare the database and load the standup channel registry."""
+        await self.engine.start()
+        await self.users.init()
+        await self.channels.load()
+        await self.ingest.start()
+        self.scheduler.start()
 
-        conn.commit()
-        conn.close()
+    async def warm_user_directory(self, client):
+        """Bulk-load workspace members so ingestion rarely calls users.info."""
+        try:
+            await self.users.warm(client)
+        except Exception:
+            logging.exception("Failed to warm the Slack user directory")
+
+    async def resolve_user_name(self, client, user_id):
+        """Name stored with a message at ingest ("" when resolution is deferred)."""
+        if self.settings.slack_resolve_names == "summary":
+            return ""
+        return await self.users.resolve(client, user_id)
+
+    async def close(self):
+        """Flush queued messages and release the database connections."""
+        logging.info("Slack user directory stats: %s", self.users.stats())
+        await self.scheduler.stop()
+        await self.catchup.stop()
+        await self.engine.stop()
+        await self.ingest.close()
+        await self.db.close()
+
+    def is_standup_channel(self, team_id, channel_id):
+        """In-memory check used on every incoming message."""
+        return self.engine.contains(team_id, channel_id)
 
     def get_standup_channels(self, team_id=None):
         """Get all standup channels, optionally filtered by team."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        if team_id:
-            cursor.execute(
-                "SELECT channel_id FROM standup_channels WHERE team_id = ?",
-                (team_id,),
-            )
-        else:
-            cursor.execute("SELECT channel_id FROM standup_channels")
-
-        channels = {row[0] for row in cursor.fetchall()}
-        conn.close()
-        return channels
-
-    def add_standup_channel(self, channel_id, team_id, channel_name):
-        """Add a channel to standup monitoring."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT OR REPLACE INTO standup_channels 
-            (channel_id, team_id, channel_name) 
-            VALUES (?, ?, ?)
-        """,
-            (channel_id, team_id, channel_name),
-        )
+        return self.engine.channels(team_id)
 
-        conn.commit()
-        conn.close()
+    async def add_standup_channel(self, channel_id, team_id, info):
+        """Add a channel (with its `ChannelInfo`) to standup monitoring."""
+        await self.engine.add_channel(channel_id, team_id, info.name)
+        await self.channels.store(channel_id, info)
 
-    def remove_standup_channel(self, channel_id):
+    async def remove_standup_channel(self, channel_id):
         """Remove a channel from standup monitoring."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("DELETE FROM standup_channels WHERE channel_id = ?", (channel_id,))
-        conn.commit()
-        conn.close()
-
-    def store_message(self, message_data):
-        """Store a message in the database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        timestamp = datetime.fromtimestamp(float(message_data["ts"]))
-        date_str = timestamp.strftime("%Y-%m-%d")
-
-        cursor.execute(
-            """
-            INSERT INTO messages 
-            (message_ts, channel_id, user_name, user_id, content, timestamp, date, attachments)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-            (
-                message_data["ts"],
-                message_data["channel"],
-                message_data.get("user_name", "Unknown"),
-                message_data["user"],
-                message_data.get("text", ""),
-                timestamp.isoformat(),
-                date_str,
-                len(message_data.get("files", [])),
-            ),
+        await self.engine.remove_channel(channel_id)
+
+    async def store_message(self, message_data):
+        """Queue a new or edited message for the next batched write."""
+        await self.engine.store_message(
+            message_data["ts"],
+            message_data["channel"],
+            message_data["user"],
+            message_data.get("user_name", "Unknown"),
+            message_data.get("text", ""),
+            datetime.fromtimestamp(float(message_data["ts"]), timezone.utc),
+            len(message_data.get("files", [])),
         )
 
-        conn.commit()
-        conn.close()
-
-    def get_messages_for_date(self, channel_id, date):
-        """Get all messages for a specific date and channel."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT user_name, content, timestamp, attachments
-            FROM messages 
-            WHERE channel_id = ? AND date = ?
-            ORDER BY timestamp ASC
-        """,
-            (channel_id, date),
+    async def track_message(self, client, channel_id, message):
+        """Store a plain user message (from an event or from history)."""
+        # Skip bot messages
+        if message.get("bot_id") or "user" not in message:
+            return False
+
+        # Get user info (cached; see user_directory.py)
+        user_name = await self.resolve_user_name(client, message["user"])
+
+        await self.store_message(
+            {
+                "ts": message["ts"],
+                "channel": channel_id,
+                "user": message["user"],
+                "user_name": user_name,
+                "text": message.get("text", ""),
+                "files": message.get("files", []),
+            }
+        )
+        return True
+
+    async def fetch_history(self, channel_id, after):
+        """Store a channel's messages sent after `after` (catch-up); returns the count."""
+        fetched = 0
+        cursor = None
+        while True:
+            try:
+                response = await app.client.conversations_history(
+                    channel=channel_id, oldest=f"{after.timestamp():.6f}", limit=200, cursor=cursor
+                )
+            except SlackApiError as e:
+                if e.response.status_code != 429:
+                    raise
+                # Tier 3 method: wait as long as Slack asks, then retry the page.
+                await asyncio.sleep(int(e.response.headers.get("Retry-After", 1)))
+                continue
+            for message in response["messages"]:
+                if message.get("subtype") is None:
+                    fetched += await self.track_message(app.client, channel_id, message)
+            cursor = (response.get("response_metadata") or {}).get("next_cursor")
+            if not response.get("has_more") or not cursor:
+                return fetched
+
+    async def channel_name(self, channel_id):
+        info = await self.channels.get(app.client, channel_id)
+        return info.name if info is not None else "Unknown"
+
+    async def post_scheduled_summary(self, channel_id, date, summary, message_count):
+        """Post the end-of-day summary the scheduler generated."""
+        await app.client.chat_postMessage(
+            channel=channel_id, text=format_summary(date, channel_id, message_count, summary)
         )
 
-        messages = cursor.fetchall()
-        conn.close()
-        return messages
-
-    def trim_messages_for_gemini(self, messages, max_tokens=900000):
-        """Trim messages to fit within Gemini's context window."""
-        max_chars = max_tokens * 3  # Conservative estimate
-
-        if not messages:
-            return []
-
-        formatted_messages = []
-        total_chars = 0
-
-        # Group by author
-        author_messages = defaultdict(list)
-        for msg in messages:
-            author_messages[msg[0]].append(msg)
-
-        for author, msgs in author_messages.items():
-            author_content = f"\n**{author}:**\n"
-            author_chars = len(author_content)
-
-            for msg in msgs:
-                content = msg[1]
-                timestamp = datetime.fromisoformat(msg[2]).strftime("%H:%M")
-
-                # Add attachment info if present
-                extra_info = f" ({msg[3]} attachments)" if msg[3] > 0 else ""
-                msg_text = f"[{timestamp}] {content}{extra_info}\n"
-
-                if total_chars + author_chars + len(msg_text) > max_chars:
-                    if not formatted_messages:
-                        formatted_messages.append(author_content + msg_text)
-                    break
-
-                author_content += msg_text
-                author_chars += len(msg_text)
-
-            if author_chars > len(f"\n**{author}:**\n"):
-                formatted_messages.append(author_content)
-                total_chars += author_chars
-
-            if total_chars > max_chars:
-                break
-
-        return formatted_messages
+    async def delete_message(self, channel_id, ts):
+        """Forget a deleted message (applied after any pending writes)."""
+        await self.engine.delete_message(channel_id, ts)
 
-    async def generate_ai_summary(self, messages, date, channel_name):
-        """Generate AI summary using Gemini."""
-        if not messages:
-            return "No messages found for this date."
+    async def get_today_counts(self, team_id):
+        """{channel_id: (messages, authors, last_message_at)} for each channel's today."""
+        return await self.engine.today_counts(team_id)
 
-        trimmed_messages = self.trim_messages_for_gemini(messages)
-        messages_text = "\n".join(trimmed_messages)
+    async def set_timezone(self, channel_id, tz_name):
+        """Partition the channel's days in `tz_name` (an IANA zone name)."""
+        await self.engine.set_timezone(channel_id, tz_name)
 
-        prompt = f"""
+    async def get_messages_for_date(self, channel_id, date, client=None):
+        """Get all messages for a specific date and channel."""
+        if client is not None:
+            # Resolve names that were deferred at ingest, one lookup per person.
+            user_ids = await self.engine.unnamed_authors(channel_id, date)
+            if user_ids:
+                await self.users.resolve_many(client, user_ids)
+        return await self.engine.messages_for_date(channel_id, date)
+
+    def build_summary_prompt(self, messages_text, date, channel_name):
+        """Build the final summary prompt around the (possibly pre-summarized) messages."""
+        return f"""
 You are an AI assistant specializing in summarizing team standups. Your task is to analyze the provided Slack messages and generate a single, clear, and concise summary for a manager.
 
 **Analyze the standup messages from #{channel_name} on {date}.**
@@ -239,13 +224,9 @@ You are an AI assistant specializing in summarizing team standups. Your task is
 {messages_text}
 """
 
-        try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash", contents=prompt
-            )
-            return response.text
-        except Exception as e:
-            return f"Error generating AI summary: {str(e)}"
+    async def generate_ai_summary(self, messages, date, channel_name, channel_id=None):
+        """Generate AI summary using Gemini, reusing a cached one when possible."""
+        return await self.engine.generate_summary(messages, date, channel_name, channel_id)
 
 
 # Initialize tracker
@@ -261,22 +242,19 @@ async def set_standup_channel(ack, respond, command, client):
     team_id = command["team_id"]
 
     # Get channel info
-    try:
-        channel_info = await client.conversations_info(channel=channel_id)
-        channel_name = channel_info["channel"]["name"]
-    except Exception as e:
-        await respond(f"Error getting channel info: {str(e)}", response_type="in_channel")
+    info = await tracker.channels.get(client, channel_id)
+    if info is None:
+        await respond("Error getting channel info for this channel.", response_type="in_channel")
         return
 
-    standup_channels = tracker.get_standup_channels(team_id)
-    if channel_id in standup_channels:
+    if tracker.is_standup_channel(team_id, channel_id):
         await respond(
             "✅ This channel is already set as a standup channel!",
             response_type="in_channel",
         )
         return
 
-    tracker.add_standup_channel(channel_id, team_id, channel_name)
+    await tracker.add_standup_channel(channel_id, team_id, info)
 
     await respond(
         f"📋 *Standup Channel Set!*\n\nNow monitoring messages in <#{channel_id}>\n\n*What happens now:*\n• All messages in this channel will be tracked\n• Use `/ai_summary` to get AI-powered daily summaries\n• Use `/remove_standup_channel` to stop monitoring",
@@ -292,25 +270,33 @@ async def remove_standup_channel(ack, respond, command):
     channel_id = command["channel_id"]
     team_id = command["team_id"]
 
-    standup_channels = tracker.get_standup_channels(team_id)
-    if channel_id not in standup_channels:
+    if not tracker.is_standup_channel(team_id, channel_id):
         await respond("This channel is not set as a standup channel.", response_type="in_channel")
         return
 
-    tracker.remove_standup_channel(channel_id)
+    await tracker.remove_standup_channel(channel_id)
     await respond("✅ Removed standup monitoring from this channel.", response_type="in_channel")
 
 
+def format_summary(date, channel_id, message_count, summary):
+    """Message text showing a day's summary."""
+    return f"🤖 *AI-Powered Daily Summary*\n\n*Date:* {date}\n*Channel:* <#{channel_id}>\n*Messages Analyzed:* {message_count}\n\n*Summary:*\n{summary}"
+
+
 @app.command("/ai_summary")
 async def ai_summary(ack, respond, command, client):
     """Generate AI-powered daily summary."""
     await ack()
 
-    # Parse arguments
+    # Parse arguments: [YYYY-MM-DD] [week|month]
     args = command.get("text", "").strip().split()
     date = None
+    period = None
     channel_id = command["channel_id"]
 
+    if args and args[-1].lower() in DIGEST_DAYS:
+        period = args.pop().lower()
+
     if args:
         # Try to parse date from first argument
         try:
@@ -321,37 +307,57 @@ async def ai_summary(ack, respond, command, client):
             return
 
     if date is None:
-        date = datetime.now().strftime("%Y-%m-%d")
+        date = tracker.engine.today(channel_id)
 
     # Check if channel is monitored
-    standup_channels = tracker.get_standup_channels(command["team_id"])
-    if channel_id not in standup_channels:
+    if not tracker.is_standup_channel(command["team_id"], channel_id):
         await respond(
             "This channel is not set as a standup channel. Use `/set_standup_channel` first."
         )
         return
 
+    notified = False
+
+    async def show_position(position):
+        # response_url takes only a few replies, so the place in line is sent once.
+        nonlocal notified
+        if not notified:
+            notified = True
+            await respond(f"⏳ The AI is busy; your request is #{position} in the queue.")
+
+    with llm_request(INTERACTIVE, command["team_id"], show_position):
+        await send_summary(respond, client, channel_id, date, period)
+
+
+async def send_summary(respond, client, channel_id, date, period):
+    """Respond with the day's summary, or the digest of `period` ending on `date`."""
+    if period is not None:
+        info = await tracker.channels.get(client, channel_id)
+        channel_name = info.name if info is not None else "Unknown"
+        digest = await tracker.engine.generate_digest(
+            channel_id, channel_name, date, DIGEST_DAYS[period]
+        )
+        await respond(
+            f"🗓️ *AI-Powered {period.title()}ly Digest*\n\n*Period:* {DIGEST_DAYS[period]} days "
+            f"ending {date}\n*Channel:* <#{channel_id}>\n\n{digest}"
+        )
+        return
+
     # Get messages
-    messages = tracker.get_messages_for_date(channel_id, date)
+    messages = await tracker.get_messages_for_date(channel_id, date, client)
 
     if not messages:
         await respond(f"No messages found for {date} in this channel.")
         return
 
     # Get channel name
-    try:
-        channel_info = await client.conversations_info(channel=channel_id)
-        channel_name = channel_info["channel"]["name"]
-    except Exception:
-        channel_name = "Unknown"
+    info = await tracker.channels.get(client, channel_id)
+    channel_name = info.name if info is not None else "Unknown"
 
     # Generate summary
-    summary = await tracker.generate_ai_summary(messages, date, channel_name)
-
-    # Format response
-    response = f"🤖 *AI-Powered Daily Summary*\n\n*Date:* {date}\n*Channel:* <#{channel_id}>\n*Messages Analyzed:* {len(messages)}\n\n*Summary:*\n{summary}"
+    summary = await tracker.generate_ai_summary(messages, date, channel_name, channel_id)
 
-    await respond(response)
+    await respond(format_summary(date, channel_id, len(messages), summary))
 
 
 @app.command("/list_standup_channels")
@@ -369,17 +375,19 @@ async def list_standup_channels(ack, respond, command, client):
         return
 
     channel_list = []
-    today = datetime.now().strftime("%Y-%m-%d")
 
+    infos = await tracker.channels.get_many(client, standup_channels)
+    counts = await tracker.get_today_counts(command["team_id"])
     for channel_id in standup_channels:
-        try:
-            channel_info = await client.conversations_info(channel=channel_id)
-            channel_name = channel_info["channel"]["name"]
-            messages = tracker.get_messages_for_date(channel_id, today)
-            msg_count = len(messages)
-            channel_list.append(f"• <#{channel_id}> ({msg_count} messages today)")
-        except Exception:
+        info = infos[channel_id]
+        if info is None:
             channel_list.append(f"• Unknown channel (ID: {channel_id})")
+            continue
+        msg_count, authors, _ = counts.get(channel_id, (0, 0, None))
+        archived = ", archived" if info.is_archived else ""
+        channel_list.append(
+            f"• <#{channel_id}> ({msg_count} messages today from {authors} people{archived})"
+        )
 
     response = f"📋 *Standup Channels*\n\nChannels currently being monitored:\n\n" + "\n".join(
         channel_list
@@ -387,46 +395,181 @@ async def list_standup_channels(ack, respond, command, client):
     await respond(response, response_type="in_channel")
 
 
+# in:#channel from:@person after:YYYY-MM-DD before:YYYY-MM-DD page:N
+SEARCH_FILTER = re.compile(r"\b(in|from|after|before|page):(\S+)")
+# Escaped mentions look like <#C123|name> / <@U123|name>; raw ids are accepted too.
+SLACK_ID = re.compile(r"^<?[#@]?([A-Z0-9]{8,})(?:\|[^>]*)?>?$")
+
+
+@app.command("/standup_search")
+async def standup_search(ack, respond, command):
+    """Full-text search over this workspace's standup channels."""
+    await ack()
+
+    text = command.get("text", "")
+    filters = dict(SEARCH_FILTER.findall(text))
+    query = SEARCH_FILTER.sub("", text).strip()
+    if not query:
+        await respond(
+            "Usage: `/standup_search words or \"a phrase\" [in:#channel] [from:@person] "
+            "[after:YYYY-MM-DD] [before:YYYY-MM-DD] [page:N]`"
+        )
+        return
+
+    channel_id = author_id = None
+    if "in" in filters:
+        match = SLACK_ID.match(filters["in"])
+        name = filters["in"].lstrip("#")
+        channel_id = match.group(1) if match else next(
+            (
+                cid
+                for cid in tracker.get_standup_channels(command["team_id"])
+                if getattr(tracker.channels.cached(cid), "name", None) == name
+            ),
+            None,
+        )
+        if channel_id is None or not tracker.is_standup_channel(command["team_id"], channel_id):
+            await respond(f"{filters['in']} is not a standup channel.")
+            return
+    if "from" in filters:
+        match = SLACK_ID.match(filters["from"])
+        if match is None:
+            await respond("Use `from:@person` (pick the person from the mention list).")
+            return
+        author_id = match.group(1)
+    for key in ("after", "before"):
+        if key in filters:
+            try:
+                datetime.strptime(filters[key], "%Y-%m-%d")
+            except ValueError:
+                await respond("Invalid date format. Use YYYY-MM-DD format.")
+                return
+    page = int(filters["page"]) if filters.get("page", "").isdigit() else 1
+
+    result = await tracker.engine.search(
+        command["team_id"],
+        query,
+        channel_id=channel_id,
+        author_id=author_id,
+        since=filters.get("after"),
+        until=filters.get("before"),
+        page=page,
+        highlight=("*", "*"),
+    )
+    if result is None:
+        await respond("The search index is still being built. Try again in a few minutes.")
+        return
+
+    rows, has_more = result
+    if not rows:
+        await respond(f"No standup messages match `{query}`.")
+        return
+
+    lines = []
+    for cid, ts, author_name, created_at, snippet in rows:
+        when = datetime.fromtimestamp(created_at / 1000, tracker.engine.timezone(cid))
+        link = f"https://slack.com/archives/{cid}/p{ts.replace('.', '')}"
+        lines.append(
+            f"• <#{cid}> *{author_name}* · <{link}|{when.strftime('%Y-%m-%d %H:%M')}>\n{snippet}"
+        )
+    more = f"\n\n_Add `page:{page + 1}` for more results._" if has_more else ""
+    await respond(
+        f"🔎 *Standup search:* {query} (page {page})\n\n" + "\n\n".join(lines) + more
+    )
+
+
+@app.command("/set_standup_timezone")
+async def set_standup_timezone(ack, respond, command):
+    """Set the time zone that defines this channel's days (e.g. Europe/Berlin)."""
+    await ack()
+
+    channel_id = command["channel_id"]
+    tz_name = command.get("text", "").strip()
+
+    if not tracker.is_standup_channel(command["team_id"], channel_id):
+        await respond(
+            "This channel is not set as a standup channel. Use `/set_standup_channel` first."
+        )
+        return
+
+    if not tz_name:
+        await respond(
+            f"This channel uses {tracker.engine.timezone(channel_id).key}. "
+            "Usage: `/set_standup_timezone Area/City` (e.g. `America/New_York`)"
+        )
+        return
+
+    try:
+        await tracker.set_timezone(channel_id, tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        await respond(f"Unknown time zone `{tz_name}`. Use an IANA name like `Europe/Berlin`.")
+        return
+
+    await respond(
+        f"🕒 Standup days in <#{channel_id}> now follow {tz_name}.", response_type="in_channel"
+    )
+
+
+@app.event(re.compile(r"^(channel|group)_rename$"))
+async def handle_channel_rename(event):
+    """Keep cached channel names current without polling Slack."""
+    channel = event["channel"]
+    await tracker.channels.renamed(channel["id"], channel["name"])
+
+
+@app.event(re.compile(r"^(channel|group)_(un)?archive$"))
+async def handle_channel_archive(event):
+    """Track archive state changes for cached channel metadata."""
+    await tracker.channels.archived(event["channel"], not event["type"].endswith("unarchive"))
+
+
 @app.event("message")
 async def handle_message(event, client):
-    """Track messages in standup channels."""
-    # Skip bot messages and message subtypes
-    if event.get("subtype") or event.get("bot_id"):
+    """Track messages in standup channels, including edits and deletions."""
+    channel_id = event["channel"]
+    subtype = event.get("subtype")
+
+    if subtype == "message_deleted":
+        if tracker.is_standup_channel(event.get("team"), channel_id):
+            await tracker.delete_message(channel_id, event["deleted_ts"])
         return
 
-    channel_id = event["channel"]
-    team_id = event.get("team")
+    if subtype == "message_changed":
+        # The edited message is nested, and may be the only place with a team id.
+        message = event["message"]
+        team_id = event.get("team") or message.get("team")
+    elif subtype:
+        # Skip other message subtypes (joins, topic changes, bot messages...)
+        return
+    else:
+        message = event
+        team_id = event.get("team")
 
-    # Check if channel is monitored
-    standup_channels = tracker.get_standup_channels(team_id)
-    if channel_id not in standup_channels:
+    # Check if channel is monitored (in-memory set lookup)
+    if not tracker.is_standup_channel(team_id, channel_id):
         return
 
-    # Get user info
-    try:
-        user_info = await client.users_info(user=event["user"])
-        user_name = user_info["user"]["real_name"] or user_info["user"]["name"]
-    except Exception:
-        user_name = "Unknown"
+    # Store (or update) message
+    await tracker.track_message(client, channel_id, message)
 
-    # Prepare message data
-    message_data = {
-        "ts": event["ts"],
-        "channel": channel_id,
-        "user": event["user"],
-        "user_name": user_name,
-        "text": event.get("text", ""),
-        "files": event.get("files", []),
-    }
 
-    # Store message
-    tracker.store_message(message_data)
+async def handle_socket_message(client, message, raw_message):
+    """Catch up on missed messages whenever Slack says hello (each new connection)."""
+    if message.get("type") == "hello":
+        tracker.catchup.trigger()
 
 
 async def main():
     """Start the bot."""
     handler = AsyncSocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
-    await handler.start_async()
+    handler.client.message_listeners.append(handle_socket_message)
+    await tracker.start()
+    warm_task = asyncio.create_task(tracker.warm_user_directory(app.client))
+    try:
+        await handler.start_async()
+    finally:
+        warm_task.cancel()
+        await tracker.close()
 
 
 if __name__ == "__main__":
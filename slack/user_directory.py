@@ -0,0 +1,143 @@
+"""Cached Slack user-name resolution.
+
+Names are held in a TTL + LRU cache in memory and persisted in the shared
+`users` table, so a restart does not have to look everyone up again.
+The directory is warmed in bulk from the paginated `users.list` API at
+startup; after that, `users.info` is only called for people who joined since,
+and concurrent lookups for the same user share one request.
+"""
+
+import asyncio
+import logging
+import time
+
+from cachetools import TTLCache
+from slack_sdk.errors import SlackApiError
+
+log = logging.getLogger("standup.slack.users")
+
+SELECT_FRESH_USERS = """
+    SELECT user_id, name FROM users
+    WHERE platform = 'slack' AND updated_at >= ?
+"""
+SELECT_USER = """
+    SELECT name, updated_at FROM users
+    WHERE platform = 'slack' AND user_id = ?
+"""
+UPSERT_USER = """
+    INSERT OR REPLACE INTO users (platform, user_id, name, updated_at)
+    VALUES ('slack', ?, ?, ?)
+"""
+
+# Page size for users.list (Slack recommends <= 200).
+USERS_LIST_PAGE_SIZE = 200
+
+
+def display_name(user):
+    """The name we show for a Slack user object."""
+    profile = user.get("profile") or {}
+    return user.get("real_name") or profile.get("real_name") or user.get("name") or "Unknown"
+
+
+class UserDirectory:
+    """user_id -> display name, backed by memory, SQLite and the Slack API."""
+
+    def __init__(self, db, ttl=86400, max_size=50000):
+        self.db = db
+        self.ttl = ttl
+        self._cache = TTLCache(maxsize=max_size, ttl=ttl)
+        self._pending = {}
+
+        # Counters, exposed for tuning.
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+
+    @classmethod
+    def from_settings(cls, db, settings):
+        return cls(db, settings.slack_user_cache_ttl, settings.slack_user_cache_size)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "api_calls": self.api_calls,
+            "cached": len(self._cache),
+        }
+
+    async def init(self):
+        """Load still-fresh names from the last run."""
+        rows = await self.db.fetchall(SELECT_FRESH_USERS, (int(time.time()) - self.ttl,))
+        for user_id, name in rows:
+            self._cache[user_id] = name
+
+    async def warm(self, client):
+        """Load every workspace member via paginated `users.list`."""
+        cursor = None
+        now = int(time.time())
+        loaded = 0
+        while True:
+            self.api_calls += 1
+            try:
+                response = await client.users_list(limit=USERS_LIST_PAGE_SIZE, cursor=cursor)
+            except SlackApiError as e:
+                if e.response.status_code != 429:
+                    raise
+                # Tier 2 method: wait as long as Slack asks, then retry the page.
+                await asyncio.sleep(int(e.response.headers.get("Retry-After", 1)))
+                continue
+            rows = []
+            for user in response.get("members", []):
+                name = display_name(user)
+                self._cache[user["id"]] = name
+                rows.append((user["id"], name, now))
+            if rows:
+                await self.db.executemany(UPSERT_USER, rows)
+                loaded += len(rows)
+            cursor = (response.get("response_metadata") or {}).get("next_cursor")
+            if not cursor:
+                break
+        log.info("Warmed Slack user directory with %d users", loaded)
+
+    async def resolve(self, client, user_id):
+        """Display name for `user_id`, calling Slack only on a full miss."""
+        name = self._cache.get(user_id)
+        if name is not None:
+            self.hits += 1
+            return name
+        self.misses += 1
+
+        pending = self._pending.get(user_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch(client, user_id))
+            self._pending[user_id] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(user_id, None))
+        return await asyncio.shield(pending)
+
+    async def resolve_many(self, client, user_ids):
+        """Resolve several users concurrently; returns {user_id: name}."""
+        user_ids = list(dict.fromkeys(user_ids))
+        names = await asyncio.gather(*(self.resolve(client, user_id) for user_id in user_ids))
+        return dict(zip(user_ids, names))
+
+    async def _fetch(self, client, user_id):
+        row = await self.db.fetchone(SELECT_USER, (user_id,))
+        now = int(time.time())
+        if row is not None and row[1] >= now - self.ttl:
+            self._cache[user_id] = row[0]
+            return row[0]
+
+        try:
+            self.api_calls += 1
+            user_info = await client.users_info(user=user_id)
+            name = display_name(user_info["user"])
+        except Exception:
+            log.debug("users.info failed for %s", user_id, exc_info=True)
+            # Fall back to a stale name rather than "Unknown" if we have one.
+            return row[0] if row is not None else "Unknown"
+
+        self._cache[user_id] = name
+        await self.db.execute(UPSERT_USER, (user_id, name, now))
+        return name
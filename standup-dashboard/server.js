@@ -1,3 +1,5 @@
+const crypto = require("crypto");
+const zlib = require("zlib");
 const express = require("express");
 const sqlite3 = require("sqlite3").verbose();
 const cors = require("cors");
@@ -13,20 +15,109 @@ app.use(express.json());
 const genAI = new GoogleGenerativeAI(process.env.GEMINI_API_KEY);
 const model = genAI.getGenerativeModel({ model: "gemini-2.5-flash" });
 
+// The database shared by both bots (see standup_core/schema.py).
+const DB_PATH =
+	process.env.STANDUP_DB_PATH ||
+	process.env.DB_PATH ||
+	"../slack/standup_messages.db";
+
+// Summaries are cached in the same `summary_cache` table the bots use
+// (see standup_core/cache.py), but under their own prompt_version and
+// fingerprint, so dashboard and bot entries never match each other.
+const DEFAULT_PLATFORM = "slack";
+const SUMMARY_PROMPT_VERSION = "dashboard-v1";
+const SUMMARY_CACHE_MAX_ENTRIES = Number(
+	process.env.STANDUP_SUMMARY_CACHE_MAX_ENTRIES || 2000,
+);
+
+const cacheDb = new sqlite3.Database(DB_PATH);
+cacheDb.exec(`
+  CREATE TABLE IF NOT EXISTS summary_cache (
+    platform TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    message_hash TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at INTEGER NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (platform, channel_id, date, prompt_version, message_hash)
+  );
+  CREATE INDEX IF NOT EXISTS idx_summary_cache_last_used
+  ON summary_cache (last_used);
+`);
+
+// Dashboard-only fingerprint; it is not compatible with
+// standup_core.cache.fingerprint (different columns, null hashed as "").
+function fingerprintMessages(messages) {
+	const hash = crypto.createHash("sha256");
+	for (const msg of messages) {
+		hash.update(
+			[
+				msg.user_name,
+				msg.content,
+				msg.timestamp,
+				msg.attachments,
+				msg.embeds,
+			].join("\x1f"),
+		);
+		hash.update("\x1e");
+	}
+	return hash.digest("hex");
+}
+
+function getCachedSummary(key) {
+	return new Promise((resolve, reject) => {
+		cacheDb.get(
+			`SELECT summary FROM summary_cache
+       WHERE platform = ? AND channel_id = ? AND date = ?
+         AND prompt_version = ? AND message_hash = ?`,
+			key,
+			(err, row) => {
+				if (err) return reject(err);
+				if (!row) return resolve(null);
+				cacheDb.run(
+					`UPDATE summary_cache SET last_used = ?
+           WHERE platform = ? AND channel_id = ? AND date = ?
+             AND prompt_version = ? AND message_hash = ?`,
+					[Math.floor(Date.now() / 1000), ...key],
+				);
+				resolve(row.summary);
+			},
+		);
+	});
+}
+
+function putCachedSummary(key, summary) {
+	const now = Math.floor(Date.now() / 1000);
+	cacheDb.serialize(() => {
+		cacheDb.run(
+			`INSERT OR REPLACE INTO summary_cache
+       (platform, channel_id, date, prompt_version, message_hash, summary, size, created_at, last_used)
+       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)`,
+			[...key, summary, Buffer.byteLength(summary), now, now],
+		);
+		cacheDb.run(
+			`DELETE FROM summary_cache WHERE rowid IN (
+         SELECT rowid FROM summary_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+       )`,
+			[SUMMARY_CACHE_MAX_ENTRIES],
+		);
+	});
+}
+
 // Get standup channels
 app.get("/api/channels", (req, res) => {
-	const db = new sqlite3.Database(
-		process.env.DB_PATH || "../slack/standup_messages.db",
-	);
+	const db = new sqlite3.Database(DB_PATH);
 
 	db.all(
 		`
-    SELECT DISTINCT sc.channel_id, sc.channel_name, sc.team_id,
-           COUNT(m.id) as message_count
+    SELECT sc.platform, sc.channel_id, sc.channel_name, sc.scope_id,
+           COALESCE(c.messages, 0) AS message_count
     FROM standup_channels sc
-    LEFT JOIN messages m ON sc.channel_id = m.channel_id 
-    AND m.date = ?
-    GROUP BY sc.channel_id, sc.channel_name, sc.team_id
+    LEFT JOIN daily_channel_counts c
+      ON c.platform = sc.platform AND c.channel_id = sc.channel_id AND c.date = ?
   `,
 		[req.query.date || new Date().toISOString().split("T")[0]],
 		(err, rows) => {
@@ -43,40 +134,82 @@ app.get("/api/channels", (req, res) => {
 
 // Get messages for channel and date
 app.get("/api/messages/:channelId", (req, res) => {
-	const db = new sqlite3.Database(
-		process.env.DB_PATH || "../slack/standup_messages.db",
-	);
+	const db = new sqlite3.Database(DB_PATH);
 	const { channelId } = req.params;
 	const { date } = req.query;
-
-	db.all(
-		`
-    SELECT user_name, content, timestamp, attachments
-    FROM messages 
-    WHERE channel_id = ? AND date = ?
-    ORDER BY timestamp ASC
+	const platform = req.query.platform || DEFAULT_PLATFORM;
+
+	const query = (sql, params) =>
+		new Promise((resolve, reject) =>
+			db.all(sql, params, (err, rows) => (err ? reject(err) : resolve(rows))),
+		);
+
+	Promise.all([
+		query(
+			`
+    SELECT COALESCE(NULLIF(m.author_name, ''), u.name, m.author_id) AS user_name,
+           m.content, m.created_at AS timestamp, m.attachments, m.embeds
+    FROM messages m
+    LEFT JOIN users u ON u.platform = m.platform AND u.user_id = m.author_id
+    WHERE m.platform = ? AND m.date = ? AND m.channel_id = ?
+    ORDER BY m.created_at ASC
   `,
-		[channelId, date],
-		(err, rows) => {
-			if (err) {
-				res.status(500).json({ error: err.message });
-				return;
+			[platform, date, channelId],
+		),
+		// Months outside the hot window (see standup_core/retention.py).
+		query(
+			`SELECT data FROM message_archive
+       WHERE platform = ? AND channel_id = ? AND month = ?`,
+			[platform, channelId, String(date).slice(0, 7)],
+		),
+	])
+		.then(([rows, archives]) => {
+			for (const { data } of archives) {
+				for (const [, , user_name, content, timestamp, day, attachments, embeds] of JSON.parse(
+					zlib.inflateSync(data).toString("utf8"),
+				)) {
+					if (day === date) {
+						rows.push({ user_name, content, timestamp, attachments, embeds });
+					}
+				}
 			}
+			rows.sort((a, b) => a.timestamp - b.timestamp);
 			res.json(rows);
-		},
-	);
+		})
+		.catch((err) => res.status(500).json({ error: err.message }));
 
 	db.close();
 });
 
 // Generate AI summary
 app.post("/api/summary", async (req, res) => {
-	const { messages, date, channelName } = req.body;
+	const { messages, date, channelName, channelId } = req.body;
+	const platform = req.body.platform || DEFAULT_PLATFORM;
 
 	if (!messages || messages.length === 0) {
 		return res.json({ summary: "No messages found for this date." });
 	}
 
+	const cacheKey = channelId
+		? [
+				platform,
+				String(channelId),
+				date,
+				SUMMARY_PROMPT_VERSION,
+				fingerprintMessages(messages),
+			]
+		: null;
+	if (cacheKey) {
+		try {
+			const cached = await getCachedSummary(cacheKey);
+			if (cached !== null) {
+				return res.json({ summary: cached, cached: true });
+			}
+		} catch (error) {
+			console.error("Summary cache lookup failed:", error.message);
+		}
+	}
+
 	const messagesText = messages
 		.map(
 			(msg) =>
@@ -101,7 +234,11 @@ app.post("/api/summary", async (req, res) => {
 	try {
 		const result = await model.generateContent(prompt);
 		const response = await result.response;
-		res.json({ summary: response.text() });
+		const summary = response.text();
+		if (cacheKey) {
+			putCachedSummary(cacheKey, summary);
+		}
+		res.json({ summary });
 	} catch (error) {
 		res
 			.status(500)
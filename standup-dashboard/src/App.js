@@ -90,6 +90,7 @@ const StandupDashboard = () => {
 					const summary = await generateSummary(
 						channel.channel_id,
 						channel.channel_name,
+						channel.platform,
 					);
 					return {
 						...channel,
@@ -121,13 +122,13 @@ const StandupDashboard = () => {
 	};
 
 	// Generate AI summary for a channel
-	const generateSummary = async (channelId, channelName) => {
+	const generateSummary = async (channelId, channelName, platform) => {
 		setSummaryLoading((prev) => ({ ...prev, [channelId]: true }));
 
 		try {
 			// Get messages for the channel
 			const messagesResponse = await fetch(
-				`${process.env.REACT_APP_API_BASE_URL || "http://localhost:3001"}/api/messages/${channelId}?date=${selectedDate}`,
+				`${process.env.REACT_APP_API_BASE_URL || "http://localhost:3001"}/api/messages/${channelId}?date=${selectedDate}&platform=${platform}`,
 			);
 			if (!messagesResponse.ok) {
 				throw new Error("Failed to fetch messages");
@@ -150,6 +151,8 @@ const StandupDashboard = () => {
 						messages,
 						date: selectedDate,
 						channelName,
+						channelId,
+						platform,
 					}),
 				},
 			);
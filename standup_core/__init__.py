@@ -0,0 +1,14 @@
+"""Shared building blocks for the Discord and Slack standup bots."""
+
+from .config import Settings
+from .ingest import IngestQueue
+from .registry import ChannelRegistry
+from .storage import AsyncDatabase, Database
+
+__all__ = (
+    "AsyncDatabase",
+    "ChannelRegistry",
+    "Database",
+    "IngestQueue",
+    "Settings",
+)
@@ -0,0 +1,187 @@
+"""LLM backends behind `LLMClient`.
+
+A backend does one thing per call: `generate`, `stream` or `count_tokens` for
+one model. Rate limiting, deadlines, retries, the circuit breaker and model
+fallback all live in `LLMClient`, so every backend gets them. Backends report
+failures as `BackendError`s: `BackendRateLimitError` for quota rejections,
+`BackendUnavailableError` for server and network failures (both retried), and
+plain `BackendError` for requests that will never succeed (not retried).
+
+`GeminiBackend` talks to the Gemini API. `FakeBackend` answers locally and
+deterministically, with configurable latency, input-token limit and error
+rate, so the bots can be load-tested, benchmarked and run in CI without an API
+key or network (``STANDUP_LLM_BACKEND=fake``).
+"""
+
+import asyncio
+import hashlib
+import random
+from dataclasses import dataclass
+from typing import Optional
+
+from .prompt import estimate_tokens
+
+# The memoized estimate would keep every whole prompt alive in its cache.
+_count_tokens = estimate_tokens.__wrapped__
+
+
+class BackendError(Exception):
+    """A request the backend rejected."""
+
+
+class BackendRateLimitError(BackendError):
+    """The backend's quota is used up for now (HTTP 429)."""
+
+
+class BackendUnavailableError(BackendError):
+    """The backend failed or could not be reached (5xx, connection errors)."""
+
+
+@dataclass
+class Generation:
+    text: str
+    # Prompt plus output tokens, when the backend reports them.
+    total_tokens: Optional[int] = None
+
+
+class LLMBackend:
+    """Interface implemented by every backend."""
+
+    async def generate(self, prompt, model):
+        """Return a `Generation` for `prompt`."""
+        raise NotImplementedError
+
+    def stream(self, prompt, model):
+        """Async iterator over the generated text, piece by piece."""
+        raise NotImplementedError
+
+    async def count_tokens(self, text, model):
+        """Exact size of `text` in tokens."""
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through the `google-genai` async client."""
+
+    def __init__(self, client=None):
+        # Imported here so the fake backend works without google-genai installed.
+        import aiohttp
+        import httpx
+        from google import genai
+        from google.genai import errors
+
+        self.client = client or genai.Client()
+        self._errors = errors
+        self._transport_errors = (ConnectionError, httpx.TransportError, aiohttp.ClientError)
+
+    def _translate(self, error):
+        """The `BackendError` for a google-genai or transport exception (None if neither)."""
+        if isinstance(error, self._errors.APIError) and error.code == 429:
+            return BackendRateLimitError(str(error))
+        if isinstance(error, (self._errors.ServerError, *self._transport_errors)):
+            return BackendUnavailableError(str(error) or type(error).__name__)
+        if isinstance(error, self._errors.APIError):
+            return BackendError(str(error))
+        return None
+
+    async def generate(self, prompt, model):
+        try:
+            response = await self.client.aio.models.generate_content(model=model, contents=prompt)
+        except Exception as e:
+            translated = self._translate(e)
+            if translated is None:
+                raise
+            raise translated from e
+        usage = getattr(response, "usage_metadata", None)
+        return Generation(response.text, usage.total_token_count if usage is not None else None)
+
+    async def stream(self, prompt, model):
+        try:
+            async for chunk in await self.client.aio.models.generate_content_stream(
+                model=model, contents=prompt
+            ):
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            translated = self._translate(e)
+            if translated is None:
+                raise
+            raise translated from e
+
+    async def count_tokens(self, text, model):
+        response = await self.client.aio.models.count_tokens(model=model, contents=text)
+        return response.total_tokens
+
+
+class FakeBackend(LLMBackend):
+    """Deterministic offline stand-in for load tests, benchmarks and CI.
+
+    The answer depends only on the model and prompt; latency is `latency`
+    seconds plus up to `jitter` more (also derived from the prompt). Prompts over
+    `max_input_tokens` are rejected like an oversized Gemini request, and a
+    seeded `error_rate` fraction of calls fails as if the backend were down.
+    """
+
+    def __init__(
+        self, latency=0.2, jitter=0.0, max_input_tokens=1_048_576, error_rate=0.0, seed=0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.max_input_tokens = max_input_tokens
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def _answer(self, prompt, model):
+        digest = hashlib.sha256(f"{model}\x1f{prompt}".encode("utf-8")).hexdigest()
+        lines = [line.strip() for line in prompt.splitlines() if line.strip()]
+        text = (
+            f"[fake {model} {digest[:12]}] Summary of {len(lines)} lines "
+            f"({_count_tokens(prompt)} tokens).\n"
+            + "\n".join(f"- {line[:120]}" for line in lines[-5:])
+        )
+        delay = self.latency + self.jitter * int(digest[12:20], 16) / 0xFFFFFFFF
+        return text, delay
+
+    async def _check(self, prompt, model):
+        self.calls += 1
+        tokens = _count_tokens(prompt)
+        if tokens > self.max_input_tokens:
+            raise BackendError(
+                f"{model}: the input has {tokens} tokens; at most {self.max_input_tokens} allowed"
+            )
+        if self.error_rate and self._random.random() < self.error_rate:
+            await asyncio.sleep(self.latency)
+            raise BackendUnavailableError(f"{model}: simulated backend failure")
+        return tokens
+
+    async def generate(self, prompt, model):
+        tokens = await self._check(prompt, model)
+        text, delay = self._answer(prompt, model)
+        await asyncio.sleep(delay)
+        return Generation(text, tokens + _count_tokens(text))
+
+    async def stream(self, prompt, model):
+        await self._check(prompt, model)
+        text, delay = self._answer(prompt, model)
+        pieces = text.split(" ")
+        for i, piece in enumerate(pieces):
+            await asyncio.sleep(delay / len(pieces))
+            yield piece if i == len(pieces) - 1 else piece + " "
+
+    async def count_tokens(self, text, model):
+        return _count_tokens(text)
+
+
+def backend_from_settings(settings):
+    """The backend named by `llm_backend` (``gemini`` or ``fake``)."""
+    if settings.llm_backend == "fake":
+        return FakeBackend(
+            latency=settings.llm_fake_latency,
+            jitter=settings.llm_fake_latency,
+            max_input_tokens=settings.llm_fake_max_tokens,
+            error_rate=settings.llm_fake_error_rate,
+        )
+    if settings.llm_backend == "gemini":
+        return GeminiBackend()
+    raise ValueError(f"Unknown LLM backend {settings.llm_backend!r}; expected 'gemini' or 'fake'")
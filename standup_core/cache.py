@@ -0,0 +1,164 @@
+"""Persistent, content-addressed cache of generated summaries.
+
+A summary is keyed by (platform, channel, date, prompt version, fingerprint of
+the messages it was generated from), so asking again for an unchanged day is
+answered from SQLite instead of Gemini. Any change to the day's messages
+produces a new fingerprint and therefore a miss; the bots additionally delete a
+day's entries from a trigger as soon as a new message for it is stored. The
+table is bounded by entry count and total size, evicting least recently used
+entries first.
+
+The cache only helps once a summary exists. `SingleFlight` covers the gap
+before that: identical requests arriving while the first one is still being
+generated wait for it and share its result instead of each calling Gemini,
+and an interactive request that joins a scheduled one raises its priority.
+"""
+
+import asyncio
+import hashlib
+import time
+
+from .ratelimit import current_request, shared_request
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summary_cache (
+    platform TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    message_hash TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at INTEGER NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (platform, channel_id, date, prompt_version, message_hash)
+);
+
+CREATE INDEX IF NOT EXISTS idx_summary_cache_last_used
+ON summary_cache (last_used);
+"""
+
+SELECT_SUMMARY = """
+    SELECT summary FROM summary_cache
+    WHERE platform = ? AND channel_id = ? AND date = ?
+      AND prompt_version = ? AND message_hash = ?
+"""
+TOUCH_SUMMARY = """
+    UPDATE summary_cache SET last_used = ?
+    WHERE platform = ? AND channel_id = ? AND date = ?
+      AND prompt_version = ? AND message_hash = ?
+"""
+UPSERT_SUMMARY = """
+    INSERT OR REPLACE INTO summary_cache
+    (platform, channel_id, date, prompt_version, message_hash, summary, size, created_at, last_used)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+DELETE_DAY = "DELETE FROM summary_cache WHERE platform = ? AND channel_id = ? AND date = ?"
+EVICT_BY_COUNT = """
+    DELETE FROM summary_cache WHERE rowid IN (
+        SELECT rowid FROM summary_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+    )
+"""
+EVICT_BY_SIZE = """
+    DELETE FROM summary_cache WHERE rowid IN (
+        SELECT rowid FROM (
+            SELECT rowid, SUM(size) OVER (ORDER BY last_used DESC, rowid DESC) AS running
+            FROM summary_cache
+        ) WHERE running > ?
+    )
+"""
+
+
+def fingerprint(messages):
+    """Stable hash of a day's message rows, used as part of the cache key."""
+    digest = hashlib.sha256()
+    for row in messages:
+        digest.update("\x1f".join(str(value) for value in row).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """LRU- and size-bounded summary store backed by the `summary_cache` table."""
+
+    def __init__(self, db, max_entries=2000, max_bytes=50_000_000):
+        self.db = db
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls, db, settings):
+        return cls(db, settings.summary_cache_max_entries, settings.summary_cache_max_bytes)
+
+    async def init(self):
+        await self.db.executescript(SCHEMA)
+
+    async def get(self, platform, channel_id, date, prompt_version, message_hash):
+        """Return the cached summary, or None on a miss."""
+        key = (platform, str(channel_id), date, prompt_version, message_hash)
+        row = await self.db.fetchone(SELECT_SUMMARY, key)
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        await self.db.execute(TOUCH_SUMMARY, (int(time.time()), *key))
+        return row[0]
+
+    async def put(self, platform, channel_id, date, prompt_version, message_hash, summary):
+        now = int(time.time())
+        row = (
+            platform,
+            str(channel_id),
+            date,
+            prompt_version,
+            message_hash,
+            summary,
+            len(summary.encode("utf-8")),
+            now,
+            now,
+        )
+        await self.db.run_in_transaction(self._put_sync, row)
+
+    def _put_sync(self, conn, row):
+        conn.execute(UPSERT_SUMMARY, row)
+        conn.execute(EVICT_BY_COUNT, (self.max_entries,))
+        conn.execute(EVICT_BY_SIZE, (self.max_bytes,))
+
+    async def invalidate(self, platform, channel_id, date):
+        """Forget every cached summary for one channel and day."""
+        await self.db.execute(DELETE_DAY, (platform, str(channel_id), date))
+
+
+class SingleFlight:
+    """At most one call in flight per key; concurrent callers share its result."""
+
+    def __init__(self):
+        self._calls = {}
+        # Callers that joined a call already in flight, exposed for tuning.
+        self.joined = 0
+
+    async def run(self, key, func, *args):
+        """Await `func(*args)`, or the call already running for `key`.
+
+        The call's LLM requests are queued at the most urgent priority of the
+        callers waiting for it (see `ratelimit.SharedRequest`).
+        """
+        if key not in self._calls:
+            with shared_request() as request:
+                call = asyncio.ensure_future(func(*args))
+            self._calls[key] = call, request
+            call.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            call, request = self._calls[key]
+            request.join(current_request())
+            self.joined += 1
+        # A caller that gives up (cancelled) does not cancel the others' call.
+        return await asyncio.shield(call)
+
+    def _finished(self, key, call):
+        self._calls.pop(key, None)
+        if not call.cancelled():
+            # Mark the exception retrieved even if every caller gave up.
+            call.exception()
@@ -0,0 +1,98 @@
+"""Gap-fill of messages missed while a bot was offline.
+
+Events sent while a bot is down for a deploy, or while its gateway/socket is
+reconnecting, are never delivered. `CatchUp` reads the newest stored message of
+every standup channel and asks the bot to fetch only the history after it; the
+bot feeds what it gets back through its normal ingestion path, where the
+message upsert makes anything already stored a no-op.
+
+Channels are caught up concurrently, at most `concurrency` at a time. Runs are
+coalesced: a trigger while a run is in progress schedules one more run after it
+instead of starting a second one.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+log = logging.getLogger("standup.catchup")
+
+# One MAX() per channel, each answered from idx_messages_channel_time.
+SELECT_LAST_MESSAGE_TIMES = """
+    SELECT c.channel_id,
+           (SELECT MAX(m.created_at) FROM messages m
+            WHERE m.platform = c.platform AND m.channel_id = c.channel_id)
+    FROM standup_channels c
+    WHERE c.platform = ? AND c.is_archived = 0
+"""
+
+
+class CatchUp:
+    """Fetches history newer than the last stored message, per standup channel."""
+
+    def __init__(self, db, platform, fetch, concurrency=4, max_age=86400):
+        # `fetch(channel_id, after)` stores the channel's messages newer than the
+        # aware datetime `after` and returns how many it saw.
+        self.db = db
+        self.platform = platform
+        self.fetch = fetch
+        self.concurrency = concurrency
+        self.max_age = max_age
+        self._task = None
+        self._rerun = False
+
+    @classmethod
+    def from_settings(cls, db, platform, fetch, settings):
+        return cls(
+            db, platform, fetch, settings.catchup_concurrency, settings.catchup_max_age
+        )
+
+    def trigger(self):
+        """Start a catch-up run in the background (startup, reconnect)."""
+        if self.concurrency <= 0:
+            return
+        if self._task is not None and not self._task.done():
+            self._rerun = True
+            return
+        self._task = asyncio.create_task(self._run_until_settled())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run_until_settled(self):
+        self._rerun = True
+        while self._rerun:
+            self._rerun = False
+            try:
+                await self.run()
+            except Exception:
+                log.exception("Catch-up run failed")
+
+    async def run(self):
+        """Catch up every standup channel once; returns messages fetched."""
+        started = time.monotonic()
+        # Never reach back further than max_age, however long we were away.
+        floor = int((time.time() - self.max_age) * 1000)
+        rows = await self.db.fetchall(SELECT_LAST_MESSAGE_TIMES, (self.platform,))
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def catch_up(channel_id, last_ms):
+            after = datetime.fromtimestamp(max(last_ms or 0, floor) / 1000, timezone.utc)
+            async with slots:
+                try:
+                    return await self.fetch(channel_id, after)
+                except Exception:
+                    log.warning("Catch-up failed for channel %s", channel_id, exc_info=True)
+                    return 0
+
+        counts = await asyncio.gather(*(catch_up(cid, last) for cid, last in rows))
+        log.info(
+            "Caught up %d channels (%d messages) in %.1fs",
+            len(rows),
+            sum(counts),
+            time.monotonic() - started,
+        )
+        return sum(counts)
@@ -0,0 +1,127 @@
+"""Environment-driven settings shared by the Discord and Slack bots."""
+
+import os
+from dataclasses import dataclass
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+@dataclass
+class Settings:
+    """Tunables read from the environment (or `.env`) at startup."""
+
+    db_path: str = "standup_messages.db"
+    db_pool_size: int = 4
+    db_read_threads: int = 4
+    db_write_queue_depth: int = 1000
+    registry_poll_interval: float = 2.0
+    timezone: str = "UTC"
+    ingest_batch_size: int = 200
+    ingest_flush_interval: float = 0.5
+    ingest_max_depth: int = 10000
+    ingest_overflow: str = "block"
+    ingest_journal_path: str = "standup_ingest.journal"
+    catchup_concurrency: int = 4
+    catchup_max_age: int = 86400
+    retention_days: int = 180
+    compaction_interval: int = 21600
+    llm_backend: str = "gemini"
+    llm_model: str = "gemini-2.5-flash"
+    llm_model_overrides: str = ""
+    llm_max_in_flight: int = 4
+    llm_rpm: int = 1000
+    llm_tpm: int = 1_000_000
+    llm_timeout: float = 60.0
+    llm_attempts: int = 3
+    llm_hedge_after: float = 0.0
+    llm_fallback_model: str = "gemini-2.5-flash-lite"
+    llm_fake_latency: float = 0.2
+    llm_fake_max_tokens: int = 1_048_576
+    llm_fake_error_rate: float = 0.0
+    summary_cache_max_entries: int = 2000
+    summary_cache_max_bytes: int = 50_000_000
+    summary_mode: str = "auto"
+    prompt_max_tokens: int = 900000
+    summary_chunk_chars: int = 60000
+    summary_parallelism: int = 4
+    summary_schedule: str = ""
+    summary_stagger: int = 900
+    summary_schedule_concurrency: int = 2
+    slack_user_cache_ttl: int = 86400
+    slack_user_cache_size: int = 50000
+    slack_resolve_names: str = "ingest"
+    slack_channel_cache_ttl: int = 21600
+
+    @classmethod
+    def from_env(cls):
+        """Build settings from `STANDUP_*` environment variables."""
+        return cls(
+            db_path=os.getenv("STANDUP_DB_PATH") or cls.db_path,
+            db_pool_size=_env_int("STANDUP_DB_POOL_SIZE", cls.db_pool_size),
+            db_read_threads=_env_int("STANDUP_DB_READ_THREADS", cls.db_read_threads),
+            db_write_queue_depth=_env_int(
+                "STANDUP_DB_WRITE_QUEUE_DEPTH", cls.db_write_queue_depth
+            ),
+            registry_poll_interval=_env_float(
+                "STANDUP_REGISTRY_POLL_SECONDS", cls.registry_poll_interval
+            ),
+            timezone=os.getenv("STANDUP_TIMEZONE") or cls.timezone,
+            ingest_batch_size=_env_int("STANDUP_INGEST_BATCH_SIZE", cls.ingest_batch_size),
+            ingest_flush_interval=_env_float(
+                "STANDUP_INGEST_FLUSH_SECONDS", cls.ingest_flush_interval
+            ),
+            ingest_max_depth=_env_int("STANDUP_INGEST_MAX_DEPTH", cls.ingest_max_depth),
+            ingest_overflow=os.getenv("STANDUP_INGEST_OVERFLOW") or cls.ingest_overflow,
+            ingest_journal_path=os.getenv("STANDUP_INGEST_JOURNAL") or cls.ingest_journal_path,
+            catchup_concurrency=_env_int("STANDUP_CATCHUP_CONCURRENCY", cls.catchup_concurrency),
+            catchup_max_age=_env_int("STANDUP_CATCHUP_MAX_AGE_SECONDS", cls.catchup_max_age),
+            retention_days=_env_int("STANDUP_RETENTION_DAYS", cls.retention_days),
+            compaction_interval=_env_int(
+                "STANDUP_COMPACTION_INTERVAL_SECONDS", cls.compaction_interval
+            ),
+            llm_backend=os.getenv("STANDUP_LLM_BACKEND") or cls.llm_backend,
+            llm_model=os.getenv("STANDUP_LLM_MODEL") or cls.llm_model,
+            llm_model_overrides=os.getenv("STANDUP_LLM_MODEL_OVERRIDES") or cls.llm_model_overrides,
+            llm_max_in_flight=_env_int("STANDUP_LLM_MAX_IN_FLIGHT", cls.llm_max_in_flight),
+            llm_rpm=_env_int("STANDUP_LLM_RPM", cls.llm_rpm),
+            llm_tpm=_env_int("STANDUP_LLM_TPM", cls.llm_tpm),
+            llm_timeout=_env_float("STANDUP_LLM_TIMEOUT_SECONDS", cls.llm_timeout),
+            llm_attempts=_env_int("STANDUP_LLM_ATTEMPTS", cls.llm_attempts),
+            llm_hedge_after=_env_float("STANDUP_LLM_HEDGE_AFTER_SECONDS", cls.llm_hedge_after),
+            # Set to an empty value to disable the fallback.
+            llm_fallback_model=os.getenv("STANDUP_LLM_FALLBACK_MODEL", cls.llm_fallback_model),
+            llm_fake_latency=_env_float("STANDUP_LLM_FAKE_LATENCY_SECONDS", cls.llm_fake_latency),
+            llm_fake_max_tokens=_env_int("STANDUP_LLM_FAKE_MAX_TOKENS", cls.llm_fake_max_tokens),
+            llm_fake_error_rate=_env_float("STANDUP_LLM_FAKE_ERROR_RATE", cls.llm_fake_error_rate),
+            summary_cache_max_entries=_env_int(
+                "STANDUP_SUMMARY_CACHE_MAX_ENTRIES", cls.summary_cache_max_entries
+            ),
+            summary_cache_max_bytes=_env_int(
+                "STANDUP_SUMMARY_CACHE_MAX_BYTES", cls.summary_cache_max_bytes
+            ),
+            summary_mode=os.getenv("STANDUP_SUMMARY_MODE") or cls.summary_mode,
+            prompt_max_tokens=_env_int("STANDUP_PROMPT_MAX_TOKENS", cls.prompt_max_tokens),
+            summary_chunk_chars=_env_int("STANDUP_SUMMARY_CHUNK_CHARS", cls.summary_chunk_chars),
+            summary_parallelism=_env_int("STANDUP_SUMMARY_PARALLELISM", cls.summary_parallelism),
+            summary_schedule=os.getenv("STANDUP_SUMMARY_SCHEDULE") or cls.summary_schedule,
+            summary_stagger=_env_int("STANDUP_SUMMARY_STAGGER_SECONDS", cls.summary_stagger),
+            summary_schedule_concurrency=_env_int(
+                "STANDUP_SUMMARY_SCHEDULE_CONCURRENCY", cls.summary_schedule_concurrency
+            ),
+            slack_user_cache_ttl=_env_int("STANDUP_SLACK_USER_CACHE_TTL", cls.slack_user_cache_ttl),
+            slack_user_cache_size=_env_int(
+                "STANDUP_SLACK_USER_CACHE_SIZE", cls.slack_user_cache_size
+            ),
+            slack_resolve_names=os.getenv("STANDUP_SLACK_RESOLVE_NAMES") or cls.slack_resolve_names,
+            slack_channel_cache_ttl=_env_int(
+                "STANDUP_SLACK_CHANNEL_CACHE_TTL", cls.slack_channel_cache_ttl
+            ),
+        )
@@ -0,0 +1,657 @@
+"""Platform-neutral storage and summarization shared by both bots.
+
+A `StandupEngine` is bound to one platform and works on the shared schema in
+`standup_core.schema`. The bots only translate their events and commands into
+calls on it, and supply the parts that really differ: the summary prompt and
+its cache version.
+"""
+
+import asyncio
+import logging
+import re
+from collections import defaultdict
+from operator import itemgetter
+from datetime import date as Date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from .cache import SingleFlight, SummaryCache, fingerprint
+from .llm import LLMRateLimitError, LLMTimeoutError, parse_model_overrides, use_model
+from .migrations import build_online_step, optimize, upgrade
+from .prompt import TokenCounter, build_verified_transcript
+from .registry import ChannelRegistry
+from .retention import STEP_PAUSE, Retention, redate_archive
+from .storage import local_date
+from .summarize import DIGEST_PROMPT, MapReduceSummarizer
+
+log = logging.getLogger("standup.engine")
+
+SELECT_CHANNEL_SCOPES = """
+    SELECT scope_id, channel_id, timezone FROM standup_channels WHERE platform = ?
+"""
+UPSERT_CHANNEL = """
+    INSERT INTO standup_channels (platform, channel_id, scope_id, channel_name)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (platform, channel_id) DO UPDATE SET
+        scope_id = excluded.scope_id,
+        channel_name = excluded.channel_name
+"""
+DELETE_CHANNEL = "DELETE FROM standup_channels WHERE platform = ? AND channel_id = ?"
+# Keyed by idx_messages_unique_id: redeliveries are no-ops, edits update the
+# row in place (and fire the summary invalidation trigger).
+UPSERT_MESSAGE = """
+    INSERT INTO messages
+    (platform, channel_id, message_id, author_id, author_name, content,
+     created_at, date, attachments, embeds)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (platform, channel_id, message_id) DO UPDATE SET
+        author_name = COALESCE(NULLIF(excluded.author_name, ''), author_name),
+        content = excluded.content,
+        attachments = excluded.attachments,
+        embeds = excluded.embeds
+    WHERE content IS NOT excluded.content
+       OR attachments IS NOT excluded.attachments
+       OR embeds IS NOT excluded.embeds
+"""
+DELETE_MESSAGE = """
+    DELETE FROM messages
+    WHERE platform = ? AND channel_id = ? AND message_id = ?
+"""
+# Channels in different time zones may be on different dates "today".
+SELECT_DAILY_COUNTS = """
+    SELECT channel_id, date, messages, authors, last_message_at
+    FROM daily_channel_counts
+    WHERE platform = ? AND date BETWEEN ? AND ? AND scope_id = ?
+"""
+# Names left empty at ingest (deferred resolution) come from `users`.
+SELECT_MESSAGES_FOR_DATE = """
+    SELECT COALESCE(NULLIF(m.author_name, ''), u.name, m.author_id),
+           m.content, m.created_at, m.attachments, m.embeds
+    FROM messages m
+    LEFT JOIN users u ON u.platform = m.platform AND u.user_id = m.author_id
+    WHERE m.platform = ? AND m.channel_id = ? AND m.created_at >= ? AND m.created_at < ?
+    ORDER BY m.created_at ASC
+"""
+SELECT_UNNAMED_AUTHORS = """
+    SELECT DISTINCT author_id FROM messages
+    WHERE platform = ? AND channel_id = ? AND created_at >= ? AND created_at < ?
+      AND author_name = ''
+"""
+SET_CHANNEL_TIMEZONE = """
+    UPDATE standup_channels SET timezone = ? WHERE platform = ? AND channel_id = ?
+"""
+# Re-partition a channel's messages into days of its new time zone.
+REDATE_CHANNEL = """
+    UPDATE messages SET date = local_date(created_at, ?)
+    WHERE platform = ? AND channel_id = ?
+"""
+DELETE_CHANNEL_COUNTS = """
+    DELETE FROM daily_channel_counts WHERE platform = ? AND channel_id = ?
+"""
+# The channel's archived messages, re-dated, are staged here so the counters
+# of archived days are rebuilt along with those of the hot window.
+CREATE_REDATED_ARCHIVE = """
+    CREATE TEMP TABLE redated_archive (
+        author_id TEXT, author_name TEXT, created_at INTEGER, date TEXT, attachments INTEGER
+    )
+"""
+INSERT_REDATED_ARCHIVE = "INSERT INTO temp.redated_archive VALUES (?, ?, ?, ?, ?)"
+DROP_REDATED_ARCHIVE = "DROP TABLE temp.redated_archive"
+CHANNEL_ROWS = """
+    SELECT date, author_id, author_name, created_at, attachments FROM messages
+    WHERE platform = ? AND channel_id = ?
+    UNION ALL
+    SELECT date, author_id, author_name, created_at, attachments FROM temp.redated_archive
+"""
+REBUILD_CHANNEL_COUNTS = f"""
+    INSERT INTO daily_channel_counts
+    (platform, date, channel_id, scope_id, messages, authors, last_message_at)
+    SELECT c.platform, m.date, c.channel_id, c.scope_id,
+           COUNT(*), COUNT(DISTINCT m.author_id), MAX(m.created_at)
+    FROM ({CHANNEL_ROWS}) m
+    JOIN standup_channels c ON c.platform = ? AND c.channel_id = ?
+    GROUP BY m.date
+"""
+DELETE_CHANNEL_AUTHOR_COUNTS = """
+    DELETE FROM daily_author_counts WHERE platform = ? AND channel_id = ?
+"""
+REBUILD_CHANNEL_AUTHOR_COUNTS = f"""
+    INSERT INTO daily_author_counts
+    (platform, channel_id, date, author_id, author_name, messages, attachments,
+     first_message_at, last_message_at)
+    SELECT ?, ?, date, author_id, MAX(author_name), COUNT(*),
+           SUM(COALESCE(attachments, 0)), MIN(created_at), MAX(created_at)
+    FROM ({CHANNEL_ROWS})
+    GROUP BY date, author_id
+"""
+SELECT_ACTIVE_DAYS = """
+    SELECT DISTINCT date FROM daily_author_counts
+    WHERE platform = ? AND channel_id = ? AND date BETWEEN ? AND ?
+    ORDER BY date
+"""
+SELECT_AUTHOR_STATS = """
+    SELECT COALESCE(NULLIF(MAX(a.author_name), ''), u.name, a.author_id),
+           SUM(a.messages), COUNT(*)
+    FROM daily_author_counts a
+    LEFT JOIN users u ON u.platform = a.platform AND u.user_id = a.author_id
+    WHERE a.platform = ? AND a.channel_id = ? AND a.date BETWEEN ? AND ?
+    GROUP BY a.author_id
+    ORDER BY SUM(a.messages) DESC
+"""
+SELECT_DAILY_SUMMARY = """
+    SELECT message_hash, summary FROM daily_summaries
+    WHERE platform = ? AND channel_id = ? AND date = ? AND prompt_version = ?
+"""
+UPSERT_DAILY_SUMMARY = """
+    INSERT OR REPLACE INTO daily_summaries
+    (platform, channel_id, date, prompt_version, message_hash, summary, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+# The full-text index exists and its batched build (migration 7) has finished.
+SEARCH_READY = """
+    SELECT 1 FROM sqlite_master
+    WHERE type = 'table' AND name = 'messages_fts'
+      AND NOT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_build')
+"""
+# Full-text search within one guild/team, best matches (FTS5 bm25 rank) first.
+# CROSS JOIN keeps the index lookup as the outer loop whatever the statistics
+# say; the other way round runs MATCH once per stored message.
+SEARCH_MESSAGES = """
+    SELECT m.channel_id, m.message_id,
+           COALESCE(NULLIF(m.author_name, ''), u.name, m.author_id),
+           m.created_at,
+           snippet(messages_fts, 0, ?, ?, '…', 16)
+    FROM messages_fts
+    CROSS JOIN messages m ON m.id = messages_fts.rowid
+    JOIN standup_channels c ON c.platform = m.platform AND c.channel_id = m.channel_id
+    LEFT JOIN users u ON u.platform = m.platform AND u.user_id = m.author_id
+    WHERE messages_fts MATCH ?
+      AND m.platform = ? AND c.scope_id = ?
+      AND (? IS NULL OR m.channel_id = ?)
+      AND (? IS NULL OR m.author_id = ?)
+      AND m.created_at >= ? AND m.created_at < ?
+    ORDER BY messages_fts.rank
+    LIMIT ? OFFSET ?
+"""
+
+SEARCH_PAGE_SIZE = 10
+# Digest periods offered next to a single day's summary.
+DIGEST_DAYS = {"week": 7, "month": 30}
+SEARCH_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def _key(value):
+    """Platform ids are stored as TEXT (Discord's are ints in memory)."""
+    return None if value is None else str(value)
+
+
+def epoch_ms(moment):
+    """Milliseconds since the epoch for an aware datetime."""
+    return int(moment.timestamp() * 1000)
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query matching every word and "quoted phrase".
+
+    Terms are quoted so punctuation and FTS5 keywords in user input are taken
+    literally; a trailing * keeps its prefix-match meaning.
+    """
+    terms = []
+    for phrase, word in SEARCH_TERM.findall(text):
+        term = phrase or word
+        prefix = not phrase and term.endswith("*") and len(term) > 1
+        term = term.rstrip("*") if prefix else term
+        if term.strip():
+            terms.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def day_bounds(date, tz):
+    """[start, end) epoch milliseconds of calendar day `date` (YYYY-MM-DD) in `tz`."""
+    day = Date.fromisoformat(date)
+    # Combining each midnight separately keeps 23/25-hour DST days correct.
+    start = datetime.combine(day, time(), tz)
+    end = datetime.combine(day + timedelta(days=1), time(), tz)
+    return epoch_ms(start), epoch_ms(end)
+
+
+class StandupEngine:
+    """Channels, messages and summaries for one platform on the shared database."""
+
+    def __init__(self, platform, settings, db, ingest, llm, prompt_version, build_prompt):
+        # `build_prompt(messages_text, date, channel_name)` returns the final prompt.
+        self.platform = platform
+        self.settings = settings
+        self.db = db
+        self.ingest = ingest
+        self.llm = llm
+        self.prompt_version = prompt_version
+        self.build_prompt = build_prompt
+        self.registry = ChannelRegistry(
+            db, SELECT_CHANNEL_SCOPES, settings.registry_poll_interval, (platform,)
+        )
+        self.summarizer = MapReduceSummarizer.from_settings(llm, settings)
+        self.token_counter = TokenCounter(llm)
+        self.summary_cache = SummaryCache.from_settings(db, settings)
+        self.in_flight = SingleFlight()
+        self.model_overrides = parse_model_overrides(settings.llm_model_overrides)
+        self.retention = Retention.from_settings(db, platform, settings)
+        self._index_task = None
+
+    async def start(self):
+        """Migrate the schema and load the channel registry.
+
+        Online index builds and compaction run in the background once the bot
+        is serving.
+        """
+        await self.db.run_write(upgrade, self.db.db, self.settings.timezone)
+        await self.summary_cache.init()
+        await self.registry.start()
+        self._index_task = asyncio.create_task(self._build_indexes())
+        self.retention.start()
+
+    async def stop(self):
+        if self._index_task is not None:
+            self._index_task.cancel()
+            self._index_task = None
+        await self.retention.stop()
+        await self.registry.stop()
+
+    async def _build_indexes(self):
+        """Build pending online indexes one short transaction at a time."""
+        try:
+            built = False
+            while await self.db.run_write(build_online_step, self.db.db, self.settings.timezone):
+                built = True
+                await asyncio.sleep(STEP_PAUSE)
+            if built:
+                await self.db.run_write(optimize, self.db.db)
+        except Exception:
+            log.exception("Online index build failed; it will be retried on next start")
+
+    # Channels
+
+    def contains(self, scope_id, channel_id):
+        """In-memory check used on every incoming message."""
+        return self.registry.contains(_key(scope_id), _key(channel_id))
+
+    def channels(self, scope_id=None):
+        """Standup channel ids (as TEXT), optionally for one guild/team."""
+        return self.registry.channels(_key(scope_id))
+
+    async def add_channel(self, channel_id, scope_id, channel_name):
+        await self.db.execute(
+            UPSERT_CHANNEL, (self.platform, _key(channel_id), _key(scope_id), channel_name)
+        )
+        self.registry.add(_key(scope_id), _key(channel_id), *self.registry.details(_key(channel_id)))
+
+    async def remove_channel(self, channel_id):
+        await self.db.execute(DELETE_CHANNEL, (self.platform, _key(channel_id)))
+        self.registry.discard(_key(channel_id))
+
+    # Time zones
+
+    def timezone(self, channel_id=None):
+        """The channel's own time zone, or the configured default."""
+        details = self.registry.details(_key(channel_id))
+        return ZoneInfo((details[0] if details else None) or self.settings.timezone)
+
+    def today(self, channel_id=None):
+        """Today's date (YYYY-MM-DD) in the channel's time zone."""
+        return datetime.now(self.timezone(channel_id)).strftime("%Y-%m-%d")
+
+    async def set_timezone(self, channel_id, tz_name):
+        """Give a channel its own time zone (raises ZoneInfoNotFoundError if unknown).
+
+        Existing messages, archived ones included, are re-partitioned into the
+        new zone's days, and the channel's counters are rebuilt accordingly.
+        Stored summaries are kept: they are matched on the day's message hash,
+        so those of days whose messages changed are simply regenerated.
+        """
+        ZoneInfo(tz_name)
+        channel = _key(channel_id)
+        scope, details = self.registry.scope(channel), self.registry.details(channel)
+        # Switch first, so messages queued from now on get the new zone's
+        # dates; those queued before are flushed and then re-dated.
+        self.registry.add(scope, channel, tz_name)
+        try:
+            await self.ingest.flush()
+            await self.db.run_in_transaction(self._set_timezone, channel, tz_name)
+        except BaseException:
+            self.registry.add(scope, channel, *details)
+            raise
+
+    def _set_timezone(self, conn, channel, tz_name):
+        conn.create_function("local_date", 2, local_date, deterministic=True)
+        key = (self.platform, channel)
+        conn.execute(SET_CHANNEL_TIMEZONE, (tz_name, *key))
+        conn.execute(REDATE_CHANNEL, (tz_name, *key))
+        archived = redate_archive(conn, *key, lambda created_at: local_date(created_at, tz_name))
+        conn.execute(CREATE_REDATED_ARCHIVE)
+        conn.executemany(
+            INSERT_REDATED_ARCHIVE,
+            [
+                (author_id, author, created_at, date, attachments)
+                for _, author_id, author, _, created_at, date, attachments, _ in archived
+            ],
+        )
+        conn.execute(DELETE_CHANNEL_COUNTS, key)
+        conn.execute(REBUILD_CHANNEL_COUNTS, (*key, *key))
+        conn.execute(DELETE_CHANNEL_AUTHOR_COUNTS, key)
+        conn.execute(REBUILD_CHANNEL_AUTHOR_COUNTS, (*key, *key))
+        conn.execute(DROP_REDATED_ARCHIVE)
+
+    # Messages
+
+    async def store_message(
+        self, message_id, channel_id, author_id, author_name, content, created_at,
+        attachments=0, embeds=0,
+    ):
+        """Queue a new or edited message for the next batched write."""
+        await self.ingest.put(
+            UPSERT_MESSAGE,
+            (
+                self.platform,
+                _key(channel_id),
+                _key(message_id),
+                _key(author_id),
+                author_name,
+                content,
+                epoch_ms(created_at),
+                created_at.astimezone(self.timezone(channel_id)).strftime("%Y-%m-%d"),
+                attachments,
+                embeds,
+            ),
+        )
+
+    async def delete_message(self, channel_id, message_id):
+        """Queue a deletion; it is applied in order after any pending writes."""
+        await self.ingest.put(DELETE_MESSAGE, (self.platform, _key(channel_id), _key(message_id)))
+
+    async def today_counts(self, scope_id):
+        """{channel_id: (messages, authors, last_message_at)} for each channel's own today."""
+        await self.ingest.flush()
+        today = {channel: self.today(channel) for channel in self.channels(scope_id)}
+        if not today:
+            return {}
+        rows = await self.db.fetchall(
+            SELECT_DAILY_COUNTS,
+            (self.platform, min(today.values()), max(today.values()), _key(scope_id)),
+        )
+        return {row[0]: row[2:] for row in rows if today.get(row[0]) == row[1]}
+
+    async def messages_for_date(self, channel_id, date):
+        """(author, content, created_at, attachments, embeds) rows in time order.
+
+        `date` is a calendar day in the channel's time zone; days in archived
+        months are read back from the archive.
+        """
+        await self.ingest.flush()
+        start, end = day_bounds(date, self.timezone(channel_id))
+        rows = await self.db.fetchall(
+            SELECT_MESSAGES_FOR_DATE, (self.platform, _key(channel_id), start, end)
+        )
+        archived = await self.retention.messages(_key(channel_id), start, end, date[:7])
+        if archived:
+            rows = sorted(rows + archived, key=itemgetter(2))
+        return rows
+
+    async def unnamed_authors(self, channel_id, date):
+        """Author ids stored without a name on `date` (deferred resolution)."""
+        await self.ingest.flush()
+        start, end = day_bounds(date, self.timezone(channel_id))
+        rows = await self.db.fetchall(
+            SELECT_UNNAMED_AUTHORS, (self.platform, _key(channel_id), start, end)
+        )
+        return [row[0] for row in rows]
+
+    # Search
+
+    async def search(
+        self, scope_id, text, channel_id=None, author_id=None, since=None, until=None,
+        page=1, highlight=("**", "**"),
+    ):
+        """Ranked (channel_id, message_id, author, created_at, snippet) rows, and
+        whether another page follows; None while the search index is being built.
+
+        `since` and `until` are inclusive YYYY-MM-DD days in the channel's (or
+        the default) time zone; `highlight` wraps matched words in snippets.
+        """
+        if await self.db.fetchone(SEARCH_READY) is None:
+            return None
+        query = fts_query(text)
+        if not query:
+            return [], False
+        await self.ingest.flush()
+        tz = self.timezone(channel_id)
+        start = day_bounds(since, tz)[0] if since else 0
+        end = day_bounds(until, tz)[1] if until else 1 << 62
+        channel, author = _key(channel_id), _key(author_id)
+        rows = await self.db.fetchall(
+            SEARCH_MESSAGES,
+            (
+                *highlight,
+                query,
+                self.platform,
+                _key(scope_id),
+                channel,
+                channel,
+                author,
+                author,
+                start,
+                end,
+                SEARCH_PAGE_SIZE + 1,
+                (max(1, page) - 1) * SEARCH_PAGE_SIZE,
+            ),
+        )
+        return rows[:SEARCH_PAGE_SIZE], len(rows) > SEARCH_PAGE_SIZE
+
+    # Summaries
+
+    def model(self, channel_id):
+        """The LLM model configured for the channel or its guild/team (None: default)."""
+        channel = _key(channel_id)
+        return self.model_overrides.get(channel) or self.model_overrides.get(
+            self.registry.scope(channel)
+        )
+
+    @staticmethod
+    def format_message_line(msg, tz):
+        """Render one stored message as a prompt line (times shown in `tz`)."""
+        content = msg[1]
+        timestamp = datetime.fromtimestamp(msg[2] / 1000, tz).strftime("%H:%M")
+
+        # Add attachment/embed info if present
+        extras = []
+        if msg[3] > 0:
+            extras.append(f"{msg[3]} attachments")
+        if msg[4] > 0:
+            extras.append(f"{msg[4]} embeds")
+
+        extra_info = f" ({', '.join(extras)})" if extras else ""
+        return f"[{timestamp}] {content}{extra_info}\n"
+
+    def author_blocks(self, messages, tz):
+        """Group formatted message lines by author, in first-seen order."""
+        blocks = defaultdict(list)
+        for msg in messages:
+            blocks[msg[0]].append(self.format_message_line(msg, tz))
+        return list(blocks.items())
+
+    async def generate_summary(self, messages, date, channel_name, channel_id=None):
+        """Summarize a day's messages, reusing a cached summary when possible.
+
+        Failures are returned as a message for the user rather than raised.
+        """
+        if not messages:
+            return "No messages found for this date."
+        try:
+            return await self.summarize_day(messages, date, channel_name, channel_id)
+        except LLMTimeoutError as e:
+            return f"AI summary timed out: {e}"
+        except LLMRateLimitError as e:
+            return f"AI summary is rate limited: {e}"
+        except Exception as e:
+            return f"Error generating AI summary: {str(e)}"
+
+    async def summarize_day(self, messages, date, channel_name, channel_id=None):
+        """`generate_summary` for non-empty `messages`, raising on failure.
+
+        Generated summaries are cached and stored as the day's summary for
+        digests; concurrent requests for the same unchanged day share one
+        generation.
+        """
+        message_hash = fingerprint(messages)
+        if channel_id is None:
+            return await self._summarize(messages, date, channel_name, None, message_hash)
+        cached = await self.summary_cache.get(
+            self.platform, _key(channel_id), date, self.prompt_version, message_hash
+        )
+        if cached is not None:
+            return cached
+        # The shared generation (and its map-reduce shards) inherits the model.
+        with use_model(self.model(channel_id)):
+            return await self.in_flight.run(
+                ("summary", _key(channel_id), date, message_hash),
+                self._summarize,
+                messages,
+                date,
+                channel_name,
+                channel_id,
+                message_hash,
+            )
+
+    async def _summarize(self, messages, date, channel_name, channel_id, message_hash):
+        blocks = self.author_blocks(messages, self.timezone(channel_id))
+
+        if self.settings.summary_mode == "single" or self.summarizer.fits_single_prompt(blocks):
+            # Trim messages to fit context window
+            transcript = await build_verified_transcript(
+                blocks, self.settings.prompt_max_tokens, self.token_counter
+            )
+            summary = await self.llm.generate(self.build_prompt(transcript.text, date, channel_name))
+            if transcript.dropped:
+                summary += (
+                    f"\n\n_{transcript.dropped} of {len(messages)} messages were left out "
+                    "to fit the model's context window._"
+                )
+        else:
+            # Too big for one prompt: summarize shards concurrently, then reduce.
+            summary = await self.summarizer.summarize(
+                blocks,
+                channel_name,
+                date,
+                lambda text: self.build_prompt(text, date, channel_name),
+            )
+
+        if channel_id is not None:
+            await self.summary_cache.put(
+                self.platform, _key(channel_id), date, self.prompt_version, message_hash, summary
+            )
+            await self.db.execute(
+                UPSERT_DAILY_SUMMARY,
+                (
+                    self.platform,
+                    _key(channel_id),
+                    date,
+                    self.prompt_version,
+                    message_hash,
+                    summary,
+                    int(datetime.now().timestamp()),
+                ),
+            )
+        return summary
+
+    # Digests
+
+    async def daily_summary(self, channel_id, date, channel_name):
+        """The stored summary of one day, regenerated only if the day has changed."""
+        messages = await self.messages_for_date(channel_id, date)
+        if not messages:
+            return None
+        row = await self.db.fetchone(
+            SELECT_DAILY_SUMMARY, (self.platform, _key(channel_id), date, self.prompt_version)
+        )
+        if row is not None and row[0] == fingerprint(messages):
+            return row[1]
+        return await self.summarize_day(messages, date, channel_name, channel_id)
+
+    async def author_stats(self, channel_id, start_date, end_date):
+        """(author, messages, active days) per person over [start_date, end_date], busiest first."""
+        return await self.db.fetchall(
+            SELECT_AUTHOR_STATS, (self.platform, _key(channel_id), start_date, end_date)
+        )
+
+    async def generate_digest(self, channel_id, channel_name, end_date, days):
+        """Roll the stored daily summaries of `days` days up to `end_date` into one digest.
+
+        Days without a stored (or current) summary are summarized first; the
+        digest itself is one small LLM call over the daily summaries and the
+        per-author rollups. Failures are returned as a message for the user.
+        """
+        channel = _key(channel_id)
+        start_date = (Date.fromisoformat(end_date) - timedelta(days=days - 1)).isoformat()
+        dates = [
+            row[0]
+            for row in await self.db.fetchall(
+                SELECT_ACTIVE_DAYS, (self.platform, channel, start_date, end_date)
+            )
+        ]
+        if not dates:
+            return f"No messages found between {start_date} and {end_date}."
+
+        daily = await asyncio.gather(
+            *(self.daily_summary(channel, date, channel_name) for date in dates),
+            return_exceptions=True,
+        )
+        sections = []
+        missing = 0
+        for date, summary in zip(dates, daily):
+            if isinstance(summary, BaseException):
+                log.warning("No summary for %s on %s: %s", channel, date, summary)
+                missing += 1
+            elif summary:
+                sections.append(f"### {date}\n{summary.strip()}")
+        if not sections:
+            return "Error generating AI digest: no daily summary could be generated."
+
+        stats = await self.author_stats(channel, start_date, end_date)
+        stats_text = "\n".join(
+            f"- {author}: {messages} messages, {active} days" for author, messages, active in stats
+        )
+        summaries_text = "\n\n".join(sections)
+        period = f"{start_date}..{end_date}"
+        digest_version = f"{self.prompt_version}:digest"
+        digest_hash = fingerprint([(stats_text,), (summaries_text,)])
+
+        cached = await self.summary_cache.get(
+            self.platform, channel, period, digest_version, digest_hash
+        )
+        if cached is not None:
+            return cached
+        prompt = DIGEST_PROMPT.format(
+            days=days,
+            channel_name=channel_name,
+            start=start_date,
+            end=end_date,
+            stats=stats_text,
+            summaries=summaries_text,
+        )
+        try:
+            digest = await self.in_flight.run(
+                ("digest", channel, period, digest_hash),
+                self.llm.generate,
+                prompt,
+                self.model(channel),
+            )
+        except LLMTimeoutError as e:
+            return f"AI digest timed out: {e}"
+        except LLMRateLimitError as e:
+            return f"AI digest is rate limited: {e}"
+        except Exception as e:
+            return f"Error generating AI digest: {str(e)}"
+        if missing:
+            digest += f"\n\n_{missing} of {len(dates)} days could not be summarized._"
+        await self.summary_cache.put(
+            self.platform, channel, period, digest_version, digest_hash, digest
+        )
+        return digest
@@ -0,0 +1,598 @@
+"""Offline bulk import of Slack and Discord export archives.
+
+A channel registered with `/set_standup_channel` starts with an empty history.
+This importer fills it from exports on disk, without any network calls:
+
+- Slack: an official workspace export ZIP (``channels.json``, ``users.json``
+  and one ``<channel>/<YYYY-MM-DD>.json`` file per channel and day).
+- Discord: DiscordChatExporter JSON files (one per channel), or directories
+  of them.
+
+Exports are streamed one member/message at a time, so memory stays flat no
+matter how large they are, and rows are written `batch_size` at a time, one
+transaction per batch. Rows already in the database (same platform, channel and
+message id) are skipped, so re-running an import is harmless.
+
+For speed, the secondary indexes on `messages` and the per-row counting and
+search-indexing triggers are dropped for the duration of the import and rebuilt
+once at the end, followed by one rebuild of the full-text index and of the
+daily counters and per-author rollups of the days imported into (other days,
+archived ones included, keep theirs). Their definitions are kept in the
+`import_deferred` table, and the days in `import_touched`, until then, so an
+interrupted import is finished by the next run. Stop the bots while importing: their writes wait on the importer's
+transactions, and their counters are only correct again once it has finished.
+
+    STANDUP_DB_PATH=standup_messages.db python3 -m standup_core.importer \\
+        --platform slack export.zip
+"""
+
+import json
+import logging
+import os
+import re
+import time
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from .migrations import FINISH_SEARCH_BUILD, build_online, optimize, upgrade
+from .retention import SELECT_ARCHIVE, decompress_rows
+from .storage import TABLE_EXISTS
+
+log = logging.getLogger("standup.importer")
+
+# Rows per write transaction.
+BATCH_SIZE = 50_000
+
+# Bytes read at a time while streaming a Discord export.
+READ_CHUNK = 1 << 20
+
+DISCORD_EPOCH_MS = 1420070400000
+
+# Slack message subtypes written by people (the rest are joins, topic changes...).
+SLACK_USER_SUBTYPES = (None, "file_share", "thread_broadcast")
+DISCORD_USER_TYPES = ("Default", "Reply")
+
+SELECT_CHANNELS = """
+    SELECT channel_id, scope_id, timezone FROM standup_channels WHERE platform = ?
+"""
+REGISTER_CHANNEL = """
+    INSERT INTO standup_channels (platform, channel_id, scope_id, channel_name)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (platform, channel_id) DO NOTHING
+"""
+INSERT_MESSAGE = """
+    INSERT INTO messages
+    (platform, channel_id, message_id, author_id, author_name, content,
+     created_at, date, attachments, embeds)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (platform, channel_id, message_id) DO NOTHING
+"""
+# Imported names are marked stale (updated_at = 0) and never replace live ones.
+INSERT_USER = """
+    INSERT OR IGNORE INTO users (platform, user_id, name, updated_at) VALUES (?, ?, ?, 0)
+"""
+
+DEFERRED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS import_deferred (
+    name TEXT PRIMARY KEY,
+    sql TEXT NOT NULL
+)
+"""
+# Everything that slows down bulk inserts into `messages` except the unique
+# index, which the duplicate check relies on.
+SELECT_DEFERRABLE = """
+    SELECT name, sql FROM sqlite_master
+    WHERE tbl_name = 'messages' AND sql IS NOT NULL
+      AND ((type = 'index' AND sql NOT LIKE 'CREATE UNIQUE%')
+           OR (type = 'trigger' AND name IN ('trg_messages_count_insert',
+                                               'trg_messages_author_count_insert',
+                                               'trg_messages_fts_insert')))
+"""
+SAVE_DEFERRED = "INSERT OR REPLACE INTO import_deferred (name, sql) VALUES (?, ?)"
+SELECT_DEFERRED = "SELECT name, sql FROM import_deferred"
+CLEAR_DEFERRED = "DELETE FROM import_deferred"
+# The (platform, channel, day) of every imported row, recorded with the rows so
+# an interrupted import still knows which days' counters to rebuild.
+TOUCHED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS import_touched (
+    platform TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (platform, channel_id, date)
+) WITHOUT ROWID
+"""
+RECORD_TOUCHED = "INSERT OR IGNORE INTO import_touched (platform, channel_id, date) VALUES (?, ?, ?)"
+SELECT_TOUCHED_MONTHS = """
+    SELECT DISTINCT platform, channel_id, substr(date, 1, 7) FROM import_touched
+"""
+SELECT_TOUCHED_DATES = """
+    SELECT date FROM import_touched WHERE platform = ? AND channel_id = ? AND date LIKE ? || '%'
+"""
+CLEAR_TOUCHED = "DELETE FROM import_touched"
+# Touched days may also have archived messages (an import into an archived
+# month); those are counted too, unless the import stored them again.
+CREATE_TOUCHED_ARCHIVE = """
+    CREATE TEMP TABLE touched_archive (
+        platform TEXT, channel_id TEXT, message_id TEXT, date TEXT, author_id TEXT,
+        author_name TEXT, created_at INTEGER, attachments INTEGER
+    )
+"""
+INSERT_TOUCHED_ARCHIVE = "INSERT INTO temp.touched_archive VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+DROP_TOUCHED_ARCHIVE = "DROP TABLE temp.touched_archive"
+TOUCHED_ROWS = """
+    SELECT m.platform, m.channel_id, m.date, m.author_id, m.author_name, m.created_at,
+           m.attachments
+    FROM import_touched t
+    JOIN messages m ON m.platform = t.platform AND m.channel_id = t.channel_id
+                   AND m.date = t.date
+    UNION ALL
+    SELECT a.platform, a.channel_id, a.date, a.author_id, a.author_name, a.created_at,
+           a.attachments
+    FROM temp.touched_archive a
+    WHERE NOT EXISTS (
+        SELECT 1 FROM messages m
+        WHERE m.platform = a.platform AND m.channel_id = a.channel_id
+          AND m.message_id = a.message_id
+    )
+"""
+IS_TOUCHED = """
+    (platform, channel_id, date) IN (SELECT platform, channel_id, date FROM import_touched)
+"""
+REBUILD_DAILY_COUNTS = (
+    f"DELETE FROM daily_channel_counts WHERE {IS_TOUCHED}",
+    f"""
+    INSERT INTO daily_channel_counts
+    (platform, date, channel_id, scope_id, messages, authors, last_message_at)
+    SELECT r.platform, r.date, r.channel_id, c.scope_id,
+           COUNT(*), COUNT(DISTINCT r.author_id), MAX(r.created_at)
+    FROM ({TOUCHED_ROWS}) r
+    JOIN standup_channels c ON c.platform = r.platform AND c.channel_id = r.channel_id
+    GROUP BY r.platform, r.date, r.channel_id
+    """,
+    f"DELETE FROM daily_author_counts WHERE {IS_TOUCHED}",
+    f"""
+    INSERT INTO daily_author_counts
+    (platform, channel_id, date, author_id, author_name, messages, attachments,
+     first_message_at, last_message_at)
+    SELECT platform, channel_id, date, author_id, MAX(author_name), COUNT(*),
+           SUM(COALESCE(attachments, 0)), MIN(created_at), MAX(created_at)
+    FROM ({TOUCHED_ROWS})
+    GROUP BY platform, channel_id, date, author_id
+    """,
+)
+REBUILD_SEARCH = "INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')"
+
+SLACK_DAY_FILE = re.compile(r"^(?:.*/)?([^/]+)/\d{4}-\d{2}-\d{2}\.json$")
+DISCORD_MESSAGES_KEY = re.compile(r'"messages"\s*:\s*\[')
+
+
+@dataclass
+class ExportMessage:
+    channel_id: str
+    message_id: str
+    author_id: str
+    author_name: str
+    content: str
+    created_at: int  # epoch milliseconds
+    attachments: int = 0
+    embeds: int = 0
+
+
+@dataclass
+class ImportStats:
+    files: int = 0
+    read: int = 0
+    inserted: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+
+    @property
+    def duplicates(self):
+        return self.read - self.inserted - self.skipped
+
+    @property
+    def rate(self):
+        return self.read / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.read} messages from {self.files} files in {self.seconds:.1f}s "
+            f"({self.rate:,.0f} msg/s): {self.inserted} imported, "
+            f"{self.duplicates} already stored, {self.skipped} skipped"
+        )
+
+
+def _slack_display_name(user):
+    """Same rule as the Slack bot's user directory."""
+    profile = user.get("profile") or {}
+    return user.get("real_name") or profile.get("real_name") or user.get("name") or "Unknown"
+
+
+class SlackExport:
+    """A Slack workspace export ZIP, read member by member."""
+
+    platform = "slack"
+
+    def __init__(self, path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        # Public channels, then private ones (only in exports that include them).
+        self._channels = {}
+        for listing in ("channels.json", "groups.json"):
+            for channel in self._load(listing, []):
+                self._channels[channel["name"]] = channel["id"]
+        self.users = {user["id"]: _slack_display_name(user) for user in self._load("users.json", [])}
+
+    def _load(self, name, default):
+        # At the root, or under the single top-level folder some zip tools add.
+        member = next(
+            (
+                n
+                for n in self._zip.namelist()
+                if n == name or (n.endswith("/" + name) and n.count("/") == 1)
+            ),
+            None,
+        )
+        if member is None:
+            return default
+        with self._zip.open(member) as fp:
+            return json.load(fp)
+
+    def channels(self):
+        """(channel_id, channel_name, scope_id) for every channel in the export."""
+        return [(cid, name, None) for name, cid in self._channels.items()]
+
+    def files(self):
+        """(channel_id, member name) for each per-day file, oldest first."""
+        for member in sorted(self._zip.namelist()):
+            match = SLACK_DAY_FILE.match(member)
+            if match and match.group(1) in self._channels:
+                yield self._channels[match.group(1)], member
+
+    def messages(self, channel_id, member, stats):
+        with self._zip.open(member) as fp:
+            day = json.load(fp)
+        for message in day:
+            stats.read += 1
+            if (
+                message.get("type") != "message"
+                or message.get("subtype") not in SLACK_USER_SUBTYPES
+                or message.get("bot_id")
+                or "user" not in message
+            ):
+                stats.skipped += 1
+                continue
+            user_id = message["user"]
+            profile = message.get("user_profile") or {}
+            yield ExportMessage(
+                channel_id,
+                message["ts"],
+                user_id,
+                self.users.get(user_id) or profile.get("real_name") or "",
+                message.get("text", ""),
+                round(float(message["ts"]) * 1000),
+                len(message.get("files", [])),
+            )
+
+    def close(self):
+        self._zip.close()
+
+
+def stream_json_array(fp, key_pattern):
+    """Split a JSON object into (fields before the array at `key_pattern`, item iterator).
+
+    The array's items are decoded one at a time from `fp` (a text file), so an
+    export with millions of messages never has to fit in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    while True:
+        match = key_pattern.search(buffer)
+        if match:
+            break
+        chunk = fp.read(READ_CHUNK)
+        if not chunk:
+            raise ValueError(f"{getattr(fp, 'name', 'export')} has no {key_pattern.pattern} array")
+        buffer += chunk
+    header = json.loads(buffer[: match.start()].rstrip().rstrip(",") + "}")
+    buffer = buffer[match.end() :]
+
+    def items():
+        nonlocal buffer
+        pos = 0
+        while True:
+            # Skip separators; refill when the buffer runs dry.
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buffer):
+                    break
+                chunk = fp.read(READ_CHUNK)
+                if not chunk:
+                    return
+                buffer, pos = chunk, 0
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                chunk = fp.read(READ_CHUNK)
+                if not chunk:
+                    raise
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield item
+            pos = end
+
+    return header, items()
+
+
+class DiscordExport:
+    """DiscordChatExporter JSON files: one path, or a directory of them."""
+
+    platform = "discord"
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.isdir(path):
+            self._paths = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(path)
+                for name in names
+                if name.endswith(".json")
+            )
+        else:
+            self._paths = [path]
+        self._channels = {}
+        for file_path in self._paths:
+            with open(file_path, encoding="utf-8") as fp:
+                header, _ = stream_json_array(fp, DISCORD_MESSAGES_KEY)
+            channel = header["channel"]
+            self._channels[file_path] = (
+                str(channel["id"]),
+                channel.get("name", ""),
+                str(header["guild"]["id"]),
+            )
+
+    def channels(self):
+        return list(self._channels.values())
+
+    def files(self):
+        for file_path in self._paths:
+            yield self._channels[file_path][0], file_path
+
+    def messages(self, channel_id, file_path, stats):
+        with open(file_path, encoding="utf-8") as fp:
+            _, messages = stream_json_array(fp, DISCORD_MESSAGES_KEY)
+            for message in messages:
+                stats.read += 1
+                author = message.get("author") or {}
+                if author.get("isBot") or message.get("type", "Default") not in DISCORD_USER_TYPES:
+                    stats.skipped += 1
+                    continue
+                message_id = str(message["id"])
+                yield ExportMessage(
+                    channel_id,
+                    message_id,
+                    str(author.get("id", "")),
+                    author.get("nickname") or author.get("name") or "",
+                    message.get("content", ""),
+                    # Same derivation as migration 5: the snowflake carries the time.
+                    (int(message_id) >> 22) + DISCORD_EPOCH_MS,
+                    len(message.get("attachments", [])),
+                    len(message.get("embeds", [])),
+                )
+
+    def close(self):
+        pass
+
+
+EXPORTS = {"slack": SlackExport, "discord": DiscordExport}
+
+
+def defer_indexes(db):
+    """Drop the deferrable indexes/trigger on `messages`, remembering their SQL."""
+    with db.transaction() as conn:
+        conn.execute(DEFERRED_SCHEMA)
+        objects = conn.execute(SELECT_DEFERRABLE).fetchall()
+        conn.executemany(SAVE_DEFERRED, objects)
+        for name, sql in objects:
+            kind = "TRIGGER" if sql.upper().startswith("CREATE TRIGGER") else "INDEX"
+            conn.execute(f"DROP {kind} IF EXISTS {name}")
+    return [name for name, _ in objects]
+
+
+def rebuild_daily_counts(conn):
+    """Recount the days the import touched, leaving every other day's counters alone."""
+    conn.execute(CREATE_TOUCHED_ARCHIVE)
+    for platform, channel_id, month in conn.execute(SELECT_TOUCHED_MONTHS).fetchall():
+        archive = conn.execute(SELECT_ARCHIVE, (platform, channel_id, month)).fetchone()
+        if archive is None:
+            continue
+        dates = {
+            date for (date,) in conn.execute(SELECT_TOUCHED_DATES, (platform, channel_id, month))
+        }
+        conn.executemany(
+            INSERT_TOUCHED_ARCHIVE,
+            [
+                (platform, channel_id, message_id, date, author_id, author, created_at, attachments)
+                for message_id, author_id, author, _, created_at, date, attachments, _
+                in decompress_rows(archive[0])
+                if date in dates
+            ],
+        )
+    for statement in REBUILD_DAILY_COUNTS:
+        conn.execute(statement)
+    conn.execute(DROP_TOUCHED_ARCHIVE)
+    conn.execute(CLEAR_TOUCHED)
+
+
+def restore_indexes(db):
+    """Recreate whatever `defer_indexes` dropped and rebuild the daily counters."""
+    with db.transaction() as conn:
+        conn.execute(DEFERRED_SCHEMA)
+        conn.execute(TOUCHED_SCHEMA)
+        deferred = conn.execute(SELECT_DEFERRED).fetchall()
+        if not deferred:
+            # The triggers were in place; the counters are up to date.
+            conn.execute(CLEAR_TOUCHED)
+            return []
+        started = time.monotonic()
+        for name, sql in deferred:
+            conn.execute(sql)
+        rebuild_daily_counts(conn)
+        if any(name == "trg_messages_fts_insert" for name, _ in deferred):
+            conn.execute(REBUILD_SEARCH)
+            if conn.execute(TABLE_EXISTS, ("search_build",)).fetchone() is not None:
+                # The rebuild indexed everything a batched build had left.
+                conn.execute(FINISH_SEARCH_BUILD)
+        conn.execute(CLEAR_DEFERRED)
+    log.info("Rebuilt %d indexes/triggers in %.1fs", len(deferred), time.monotonic() - started)
+    return [name for name, _ in deferred]
+
+
+class Importer:
+    """Writes the messages of one or more exports into the shared database."""
+
+    def __init__(self, db, platform, default_timezone="UTC", batch_size=BATCH_SIZE):
+        self.db = db
+        self.platform = platform
+        self.default_timezone = default_timezone
+        self.batch_size = batch_size
+        self._channels = {}
+
+    def load_channels(self):
+        self._channels = {
+            channel_id: ZoneInfo(tz or self.default_timezone)
+            for channel_id, _, tz in self.db.fetchall(SELECT_CHANNELS, (self.platform,))
+        }
+
+    def register(self, export, scope_id=None, only=()):
+        """Register the export's channels (or those in `only`) as standup channels."""
+        rows = []
+        for channel_id, name, export_scope in export.channels():
+            if only and channel_id not in only and name not in only:
+                continue
+            scope = scope_id or export_scope
+            if scope is None:
+                raise ValueError("Slack exports do not name their team; pass --scope TEAM_ID")
+            rows.append((self.platform, channel_id, str(scope), name))
+        self.db.executemany(REGISTER_CHANNEL, rows)
+        self.load_channels()
+        return len(rows)
+
+    def run(self, export, stats, only=()):
+        """Import every tracked channel of `export`, updating `stats` as it goes."""
+        if not self._channels:
+            self.load_channels()
+        names = {cid: name for cid, name, _ in export.channels()}
+        if export.platform == "slack":
+            users = [(self.platform, uid, name) for uid, name in export.users.items()]
+            self.db.executemany(INSERT_USER, users)
+
+        started = time.monotonic() - stats.seconds
+        batch = []
+        for channel_id, source in export.files():
+            tz = self._channels.get(channel_id)
+            if tz is None or (only and channel_id not in only and names[channel_id] not in only):
+                continue
+            stats.files += 1
+            for message in export.messages(channel_id, source, stats):
+                local = datetime.fromtimestamp(message.created_at / 1000, timezone.utc)
+                batch.append(
+                    (
+                        self.platform,
+                        message.channel_id,
+                        message.message_id,
+                        message.author_id,
+                        message.author_name,
+                        message.content,
+                        message.created_at,
+                        local.astimezone(tz).date().isoformat(),
+                        message.attachments,
+                        message.embeds,
+                    )
+                )
+                if len(batch) >= self.batch_size:
+                    stats.inserted += self._write(batch)
+                    batch = []
+                    stats.seconds = time.monotonic() - started
+                    log.info("%s", stats)
+        if batch:
+            stats.inserted += self._write(batch)
+        stats.seconds = time.monotonic() - started
+        return stats
+
+    def _write(self, rows):
+        with self.db.transaction() as conn:
+            conn.execute(TOUCHED_SCHEMA)
+            conn.executemany(RECORD_TOUCHED, {(row[0], row[1], row[7]) for row in rows})
+            return conn.executemany(INSERT_MESSAGE, rows).rowcount
+
+
+def main(argv=None):
+    """``python -m standup_core.importer --platform slack|discord EXPORT ...``"""
+    import argparse
+
+    from .config import Settings
+    from .storage import Database
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("exports", nargs="+", help="Slack export ZIPs or Discord JSON files/dirs")
+    parser.add_argument("--platform", choices=sorted(EXPORTS), required=True)
+    parser.add_argument(
+        "--channel",
+        action="append",
+        default=[],
+        help="only import this channel (id or name); repeatable",
+    )
+    parser.add_argument(
+        "--register",
+        action="store_true",
+        help="register the exported channels as standup channels first",
+    )
+    parser.add_argument("--scope", help="team/guild id to register channels under")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument(
+        "--keep-indexes",
+        action="store_true",
+        help="keep indexes while importing (faster for small imports into big databases)",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    settings = Settings.from_env()
+    db = Database(settings.db_path, settings.db_pool_size)
+    stats = ImportStats()
+    try:
+        upgrade(db, settings.timezone)
+        # Finish an import that was interrupted before its indexes came back.
+        restore_indexes(db)
+        importer = Importer(db, args.platform, settings.timezone, args.batch_size)
+        if not args.keep_indexes:
+            log.info("Deferring %s", ", ".join(defer_indexes(db)) or "nothing")
+        try:
+            for path in args.exports:
+                export = EXPORTS[args.platform](path)
+                try:
+                    if args.register:
+                        count = importer.register(export, args.scope, args.channel)
+                        log.info("Registered %d channels from %s", count, path)
+                    importer.run(export, stats, args.channel)
+                finally:
+                    export.close()
+                log.info("%s: %s", path, stats)
+        finally:
+            restore_indexes(db)
+        # Online indexes not built yet are cheaper to build once, after the import.
+        build_online(db)
+        optimize(db)
+    finally:
+        db.close()
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
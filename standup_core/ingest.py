@@ -0,0 +1,248 @@
+"""Write-behind ingestion queue that group-commits incoming messages.
+
+Handlers enqueue `(sql, params)` pairs instead of writing rows themselves. A
+background task drains the queue whenever `batch_size` records are waiting or
+`flush_interval` seconds have passed, and commits the whole batch in one
+transaction. The queue is bounded; what happens when it is full is decided by
+the overflow policy:
+
+- ``block``: the handler waits for room (back-pressure on the producer).
+- ``drop_oldest``: the oldest queued record is discarded to make room.
+- ``spill``: the record is appended to a local journal file, which is replayed
+  into the database on the next start or once the queue has drained.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger("standup.ingest")
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+
+# Rows per transaction when replaying the spill journal.
+JOURNAL_REPLAY_CHUNK = 5000
+
+
+class IngestQueue:
+    """Bounded, batching write-behind buffer in front of `AsyncDatabase`."""
+
+    def __init__(
+        self,
+        db,
+        batch_size=200,
+        flush_interval=0.5,
+        max_depth=10000,
+        overflow="block",
+        journal_path="standup_ingest.journal",
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy {overflow!r}; expected one of {OVERFLOW_POLICIES}"
+            )
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.journal_path = journal_path
+        self._queue = asyncio.Queue(max(1, max_depth))
+        self._batch_ready = asyncio.Event()
+        # Held while a batch is taken off the queue and written, so `flush`
+        # cannot return while another caller's batch is still in flight.
+        self._flushing = asyncio.Lock()
+        self._journal = None
+        # Journal file I/O runs on its own thread, in submission order, so a
+        # spill never blocks the event loop or interleaves with a rotation.
+        self._journal_io = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="standup-ingest-journal"
+        )
+        # Sequence numbers of records put on the queue and of records taken
+        # off it and handled; `flush` waits for the latter to catch up with
+        # the former as it was when `flush` was called.
+        self._enqueued = 0
+        self._handled = 0
+        self._task = None
+        self._stopping = False
+
+        # Counters, exposed for tuning.
+        self.flushed = 0
+        self.dropped = 0
+        self.spilled = 0
+
+    @classmethod
+    def from_settings(cls, db, settings):
+        return cls(
+            db,
+            batch_size=settings.ingest_batch_size,
+            flush_interval=settings.ingest_flush_interval,
+            max_depth=settings.ingest_max_depth,
+            overflow=settings.ingest_overflow,
+            journal_path=settings.ingest_journal_path,
+        )
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    async def put(self, sql, params):
+        """Queue one row for writing."""
+        if self._stopping:
+            raise RuntimeError("IngestQueue is closed.")
+        record = (sql, params)
+
+        if self.overflow == "block":
+            await self._queue.put(record)
+            self._enqueued += 1
+        else:
+            try:
+                self._queue.put_nowait(record)
+                self._enqueued += 1
+            except asyncio.QueueFull:
+                if self.overflow == "drop_oldest":
+                    self._queue.get_nowait()
+                    self._handled += 1
+                    self._queue.put_nowait(record)
+                    self._enqueued += 1
+                    self.dropped += 1
+                else:
+                    await self._spill([record])
+
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    async def start(self):
+        """Replay any spilled records, then start the background flusher."""
+        await self._replay_journal()
+        self._task = asyncio.create_task(self._run())
+
+    async def flush(self):
+        """Write everything queued so far (e.g. before reading it back).
+
+        Records queued after the call are left to the background flusher, so
+        a steady stream of new messages cannot keep `flush` waiting.
+        """
+        target = self._enqueued
+        while self._handled < target:
+            await self._flush_once()
+
+    async def close(self):
+        """Stop accepting records and flush everything still queued."""
+        if self._stopping:
+            return
+        self._stopping = True
+        self._batch_ready.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._journal_io, self._close_journal)
+        self._journal_io.shutdown()
+
+    async def _run(self):
+        while not (self._stopping and self._queue.empty()):
+            if not self._stopping and self._queue.qsize() < self.batch_size:
+                self._batch_ready.clear()
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self._flush_once()
+                if self.spilled and self._queue.empty() and not self._stopping:
+                    await self._replay_journal()
+            except Exception:
+                log.exception("Ingest flush failed")
+
+    async def _flush_once(self):
+        async with self._flushing:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            if not batch:
+                return
+
+            try:
+                await self.db.executebatch(batch)
+            except sqlite3.Error:
+                log.exception("Failed to write %d queued records", len(batch))
+                # Keep the rows so the next replay can try again.
+                await self._spill(batch)
+                return
+            finally:
+                self._handled += len(batch)
+            self.flushed += len(batch)
+
+    async def _spill(self, records):
+        if not self.journal_path:
+            self.dropped += len(records)
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._journal_io, self._write_journal, records)
+        self.spilled += len(records)
+
+    def _write_journal(self, records):
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        for sql, params in records:
+            self._journal.write(json.dumps([sql, list(params)]) + "\n")
+        self._journal.flush()
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _rotate_journal(self, replay_path):
+        # Runs on the journal thread, so no spill can write through the old
+        # handle after the rename and land in the file being replayed.
+        if os.path.exists(replay_path):
+            return True
+        if not os.path.exists(self.journal_path):
+            return False
+        self._close_journal()
+        os.replace(self.journal_path, replay_path)
+        return True
+
+    async def _replay_journal(self):
+        if not self.journal_path:
+            return
+        # Move the journal aside so records spilled during the replay start a
+        # fresh file instead of racing with the reader. A leftover `.replay`
+        # file means a previous replay was interrupted; finish it first.
+        replay_path = self.journal_path + ".replay"
+        loop = asyncio.get_running_loop()
+        while True:
+            if not await loop.run_in_executor(
+                self._journal_io, self._rotate_journal, replay_path
+            ):
+                return
+            replayed = await self.db.run_write(self._replay_journal_sync, replay_path)
+            # Records left over from an earlier process were never counted.
+            self.spilled = max(0, self.spilled - replayed)
+            log.info("Replayed %d spilled records from %s", replayed, self.journal_path)
+
+    def _replay_journal_sync(self, replay_path):
+        replayed = 0
+        chunk = []
+        with open(replay_path, encoding="utf-8") as journal:
+            for line in journal:
+                if not line.strip():
+                    continue
+                sql, params = json.loads(line)
+                chunk.append((sql, tuple(params)))
+                if len(chunk) >= JOURNAL_REPLAY_CHUNK:
+                    self.db.db.executebatch(chunk)
+                    replayed += len(chunk)
+                    chunk = []
+        if chunk:
+            self.db.db.executebatch(chunk)
+            replayed += len(chunk)
+        os.remove(replay_path)
+        return replayed
@@ -0,0 +1,304 @@
+"""Non-blocking access to the LLM shared by every summary in a process.
+
+All requests go through an async `LLMBackend` (Gemini, or the offline fake; see
+`standup_core.backends`), so a slow generation never stalls message ingestion,
+and through one `RateLimiter`, so a burst of
+`/ai_summary` calls neither opens an unbounded number of requests at once nor
+exceeds the project's requests- and tokens-per-minute quota (see
+`standup_core.ratelimit` for the queueing order).
+
+Each attempt has its own deadline (`timeout`). Attempts that fail for a
+transient reason (deadline, 5xx, connection error, 429) are retried with
+jittered exponential backoff, up to `attempts` times. With `hedge_after` set,
+an attempt still running after that many seconds gets a second, identical
+request, and whichever answers first wins (both count against the quota).
+
+Every model has a circuit breaker: after `BREAKER_THRESHOLD` consecutive
+backend failures it fails fast for `BREAKER_COOLDOWN` seconds, then lets one
+trial request through. When the primary model's breaker is open, or its
+retries are exhausted, the request goes to `fallback_model` instead.
+
+The model is, in order: the one passed to `generate`, the one set with
+`use_model` for the calls made inside a block (the engine applies the
+per-guild/channel choice from ``STANDUP_LLM_MODEL_OVERRIDES`` this way), and
+`model`.
+"""
+
+import asyncio
+import contextvars
+import logging
+import math
+import time
+from contextlib import contextmanager
+
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+from .backends import (
+    BackendRateLimitError,
+    BackendUnavailableError,
+    GeminiBackend,
+    backend_from_settings,
+)
+from .ratelimit import RateLimiter
+
+log = logging.getLogger("standup.llm")
+
+# Rough prompt size used for the tokens-per-minute bucket before Gemini
+# reports the real usage.
+CHARS_PER_TOKEN = 4
+# Output tokens reserved per request on top of the prompt.
+OUTPUT_TOKENS_ESTIMATE = 1024
+# Backoff between attempts: 1s, 2s, 4s... (plus up to 1s of jitter), at most 20s.
+RETRY_INITIAL = 1.0
+RETRY_MAX = 20.0
+# Consecutive backend failures that open a model's circuit, and for how long.
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+
+_model = contextvars.ContextVar("standup_llm_model", default=None)
+
+
+class LLMTimeoutError(Exception):
+    """Raised when a generation request exceeds its deadline."""
+
+
+class LLMRateLimitError(Exception):
+    """Raised when Gemini keeps rejecting a request for exceeding the quota."""
+
+
+class LLMUnavailableError(Exception):
+    """Raised without calling Gemini while a model's circuit breaker is open."""
+
+
+@contextmanager
+def use_model(model):
+    """Use `model` for the LLM calls made inside the block (None keeps the default)."""
+    token = _model.set(model)
+    try:
+        yield
+    finally:
+        _model.reset(token)
+
+
+def parse_model_overrides(value):
+    """{guild/team or channel id: model} from ``id=model,id=model``."""
+    overrides = {}
+    for item in value.split(","):
+        key, sep, model = item.partition("=")
+        if sep and key.strip() and model.strip():
+            overrides[key.strip()] = model.strip()
+    return overrides
+
+
+def is_rate_limit(error):
+    return isinstance(error, BackendRateLimitError)
+
+
+def is_backend_failure(error):
+    """Errors that say the backend is unhealthy (they count towards the breaker)."""
+    return isinstance(error, (LLMTimeoutError, BackendUnavailableError))
+
+
+def is_transient(error):
+    """Errors worth retrying, or trying on the fallback model."""
+    return is_backend_failure(error) or is_rate_limit(error)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; half-opens after `cooldown` seconds."""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        """Whether a request may go out now (one trial request once cooled down)."""
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.cooldown:
+            return False
+        # A trial whose outcome never arrived (cancelled) does not block forever.
+        if self._probe_at is not None and now - self._probe_at < self.cooldown:
+            return False
+        self._probe_at = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probe_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            self._probe_at = None
+
+
+class LLMClient:
+    """Async LLM client with rate limiting, retries, hedging and model fallback."""
+
+    def __init__(
+        self,
+        model="gemini-2.5-flash",
+        max_in_flight=4,
+        timeout=60.0,
+        backend=None,
+        limiter=None,
+        attempts=3,
+        hedge_after=0.0,
+        fallback_model="",
+    ):
+        self.model = model
+        self.timeout = timeout
+        self.backend = backend or GeminiBackend()
+        self.limiter = limiter or RateLimiter(max_in_flight=max_in_flight)
+        self.attempts = max(1, attempts)
+        self.hedge_after = hedge_after
+        self.fallback_model = fallback_model
+        self.breakers = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            model=settings.llm_model,
+            timeout=settings.llm_timeout,
+            backend=backend_from_settings(settings),
+            limiter=RateLimiter.from_settings(settings),
+            attempts=settings.llm_attempts,
+            hedge_after=settings.llm_hedge_after,
+            fallback_model=settings.llm_fallback_model,
+        )
+
+    def breaker(self, model):
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker()
+        return self.breakers[model]
+
+    async def generate(self, prompt, model=None, timeout=None):
+        """Generate text for `prompt`, falling back to the fallback model if needed."""
+        timeout = self.timeout if timeout is None else timeout
+        models = [model or _model.get() or self.model]
+        if self.fallback_model and self.fallback_model not in models:
+            models.append(self.fallback_model)
+
+        error = None
+        for name in models:
+            try:
+                return await self._generate_with_retries(prompt, name, timeout)
+            except Exception as e:
+                if not (is_transient(e) or isinstance(e, LLMUnavailableError)):
+                    raise
+                error = e
+                # While a breaker is open every request would log this.
+                if name != models[-1] and not isinstance(e, LLMUnavailableError):
+                    log.warning("%s failed (%r); falling back to %s", name, e, models[-1])
+        if is_rate_limit(error):
+            raise LLMRateLimitError("Gemini's request quota is used up; try again in a minute")
+        raise error
+
+    async def _generate_with_retries(self, prompt, model, timeout):
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.attempts),
+            wait=wait_exponential_jitter(initial=RETRY_INITIAL, max=RETRY_MAX),
+            retry=retry_if_exception(is_transient),
+            reraise=True,
+        )
+        async for attempt in retrying:
+            with attempt:
+                return await self._attempt(prompt, model, timeout)
+
+    async def _attempt(self, prompt, model, timeout):
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            raise LLMUnavailableError(
+                f"{model} failed {breaker.failures} times in a row; paused for {breaker.cooldown:g}s"
+            )
+        try:
+            text = await self._hedged(prompt, model, timeout)
+        except Exception as e:
+            if is_backend_failure(e):
+                breaker.record_failure()
+            raise
+        breaker.record_success()
+        return text
+
+    async def _hedged(self, prompt, model, timeout):
+        """One request, plus a second one if the first is slower than `hedge_after`."""
+        if not self.hedge_after or self.hedge_after >= timeout:
+            return await self._request(prompt, model, timeout)
+        requests = [asyncio.ensure_future(self._request(prompt, model, timeout))]
+        try:
+            done, _ = await asyncio.wait(requests, timeout=self.hedge_after)
+            if not done:
+                requests.append(asyncio.ensure_future(self._request(prompt, model, timeout)))
+            error = None
+            for finished in asyncio.as_completed(requests):
+                try:
+                    return await finished
+                except Exception as e:
+                    # The other request may still succeed.
+                    error = error or e
+            raise error
+        finally:
+            for request in requests:
+                request.cancel()
+
+    async def _request(self, prompt, model, timeout):
+        estimate = math.ceil(len(prompt) / CHARS_PER_TOKEN) + OUTPUT_TOKENS_ESTIMATE
+        async with self.limiter.slot(estimate):
+            try:
+                result = await asyncio.wait_for(self.backend.generate(prompt, model), timeout)
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"{model} did not respond within {timeout:g}s") from None
+            except BackendRateLimitError:
+                self.limiter.throttled()
+                raise
+        if result.total_tokens:
+            self.limiter.charge(result.total_tokens - estimate)
+        return result.text
+
+    async def stream(self, prompt, model=None, timeout=None):
+        """Yield the text for `prompt` as it is generated.
+
+        Rate limited like `generate`, with `timeout` applying to each piece;
+        a stream that fails part way is not retried.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        model = model or _model.get() or self.model
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            raise LLMUnavailableError(f"{model} is paused after repeated failures")
+        estimate = math.ceil(len(prompt) / CHARS_PER_TOKEN) + OUTPUT_TOKENS_ESTIMATE
+        async with self.limiter.slot(estimate):
+            pieces = self.backend.stream(prompt, model).__aiter__()
+            while True:
+                try:
+                    piece = await asyncio.wait_for(pieces.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    breaker.record_failure()
+                    raise LLMTimeoutError(f"{model} stopped responding for {timeout:g}s") from None
+                except BackendUnavailableError:
+                    breaker.record_failure()
+                    raise
+                except BackendRateLimitError:
+                    self.limiter.throttled()
+                    raise
+                yield piece
+        breaker.record_success()
+
+    async def count_tokens(self, text, model=None):
+        """Exact prompt size in tokens as counted by the backend."""
+        return await asyncio.wait_for(
+            self.backend.count_tokens(text, model or _model.get() or self.model), self.timeout
+        )
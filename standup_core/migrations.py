@@ -0,0 +1,471 @@
+"""Versioned schema migrations for the shared database.
+
+Each migration has a version number, runs at most once per database file and
+is recorded in `schema_version`. Migrations run in order, each in its own
+`BEGIN IMMEDIATE` transaction that re-checks the version first, so two bots
+starting against the same file never apply one twice.
+
+Migrations marked `online` only build indexes (including the full-text one).
+They are skipped at startup and built afterwards, one `build_online_step` at a
+time, so a bot starts serving instead of blocking on a large index build. A
+plain index is one transaction, during which writes wait; the full-text index
+is filled in batches of `SEARCH_BUILD_BATCH` messages, so writes only ever
+wait for one batch. After migrating, the query planner statistics are refreshed
+with `ANALYZE` (bounded by `analysis_limit`) on first use and `PRAGMA optimize`
+afterwards.
+
+Run ``python -m standup_core.migrations`` to apply everything, including the
+online index builds, ahead of a deploy, and to import legacy per-bot files.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Union
+
+from .retention import SCHEMA as ARCHIVE_SCHEMA
+from .scheduler import SCHEMA as SUMMARY_JOBS_SCHEMA
+from .schema import create_shared_schema
+from .storage import TABLE_EXISTS, register_date_functions, split_script
+
+log = logging.getLogger("standup.migrations")
+
+VERSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at INTEGER NOT NULL,
+    duration REAL NOT NULL
+)
+"""
+SELECT_APPLIED = "SELECT version FROM schema_version"
+IS_APPLIED = "SELECT 1 FROM schema_version WHERE version = ?"
+RECORD_VERSION = """
+    INSERT INTO schema_version (version, name, applied_at, duration)
+    VALUES (?, ?, ?, ?)
+"""
+HAS_STATISTICS = "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+
+# Rows sampled per index by ANALYZE; keeps the first analysis of a big file short.
+ANALYSIS_LIMIT = 1000
+
+# Exact creation times come from the platform message ids: Discord snowflakes
+# embed milliseconds since 2015-01-01, Slack ts values are epoch seconds.
+EPOCH_TIMESTAMPS = """
+ALTER TABLE messages ADD COLUMN created_at INTEGER NOT NULL DEFAULT 0;
+
+UPDATE messages SET created_at = CASE platform
+    WHEN 'discord' THEN (CAST(message_id AS INTEGER) >> 22) + 1420070400000
+    WHEN 'slack' THEN CAST(ROUND(CAST(message_id AS REAL) * 1000) AS INTEGER)
+    ELSE CAST(strftime('%s', timestamp) AS INTEGER) * 1000
+END;
+
+ALTER TABLE standup_channels ADD COLUMN timezone TEXT;
+
+DROP INDEX IF EXISTS idx_messages_platform_date_channel;
+DROP INDEX IF EXISTS idx_messages_channel_date_time;
+DROP TRIGGER IF EXISTS trg_messages_count_insert;
+ALTER TABLE messages DROP COLUMN timestamp;
+
+-- Legacy dates were the server's local day (Slack) or the UTC day (Discord);
+-- re-date every row in the default zone, as new messages are
+UPDATE messages SET date = local_date(created_at, default_timezone());
+
+-- Day queries are range scans over one channel's creation times
+CREATE INDEX IF NOT EXISTS idx_messages_channel_time
+ON messages (platform, channel_id, created_at);
+
+-- Distinct-author checks for the daily counters
+CREATE INDEX IF NOT EXISTS idx_messages_day_author
+ON messages (platform, date, channel_id, author_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_messages_count_insert
+AFTER INSERT ON messages
+BEGIN
+    INSERT INTO daily_channel_counts
+    (platform, date, channel_id, scope_id, messages, authors, last_message_at)
+    SELECT NEW.platform, NEW.date, NEW.channel_id, scope_id, 1, 1, NEW.created_at
+    FROM standup_channels
+    WHERE platform = NEW.platform AND channel_id = NEW.channel_id
+    ON CONFLICT (platform, date, channel_id) DO UPDATE SET
+        messages = messages + 1,
+        authors = authors + NOT EXISTS (
+            SELECT 1 FROM messages
+            WHERE platform = NEW.platform
+              AND date = NEW.date
+              AND channel_id = NEW.channel_id
+              AND author_id = NEW.author_id
+              AND id <> NEW.id
+        ),
+        last_message_at = MAX(COALESCE(last_message_at, 0), excluded.last_message_at);
+END;
+
+-- last_message_at becomes epoch milliseconds too, and the days changed
+DELETE FROM daily_channel_counts;
+INSERT INTO daily_channel_counts
+(platform, date, channel_id, scope_id, messages, authors, last_message_at)
+SELECT m.platform, m.date, m.channel_id, c.scope_id,
+       COUNT(*), COUNT(DISTINCT m.author_id), MAX(m.created_at)
+FROM messages m
+JOIN standup_channels c ON c.platform = m.platform AND c.channel_id = m.channel_id
+GROUP BY m.platform, m.date, m.channel_id;
+
+-- Migration 3's index is replaced by idx_messages_channel_time
+INSERT OR IGNORE INTO schema_version (version, name, applied_at, duration)
+VALUES (3, 'index for the per-day message fetch (superseded by 5)', CAST(strftime('%s') AS INTEGER), 0);
+"""
+
+# External-content FTS5 index over message text, kept in step by triggers.
+# Archived months (standup_core.retention) leave the index with their rows.
+SEARCH_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    content = 'messages',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+SEARCH_TRIGGER_NAMES = ("trg_messages_fts_insert", "trg_messages_fts_delete", "trg_messages_fts_update")
+SEARCH_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS trg_messages_fts_insert
+AFTER INSERT ON messages
+{when_new}BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (NEW.id, NEW.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_messages_fts_delete
+AFTER DELETE ON messages
+{when_old}BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_messages_fts_update
+AFTER UPDATE OF content ON messages
+{when_old}BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+    INSERT INTO messages_fts (rowid, content) VALUES (NEW.id, NEW.content);
+END;
+"""
+# While the index is built (migration 7), rows with ids in (indexed_to, high]
+# are left to the build: an edit or delete must not touch their missing
+# entries, and whatever they hold when their batch comes is what gets indexed.
+SEARCH_BUILD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_build (indexed_to INTEGER NOT NULL, high INTEGER NOT NULL)
+"""
+START_SEARCH_BUILD = "INSERT INTO search_build SELECT 0, COALESCE(MAX(id), 0) FROM messages"
+SELECT_SEARCH_BUILD = "SELECT indexed_to, high FROM search_build"
+INDEX_SEARCH_BATCH = """
+    INSERT INTO messages_fts (rowid, content)
+    SELECT id, content FROM messages WHERE id > ? AND id <= ?
+"""
+ADVANCE_SEARCH_BUILD = "UPDATE search_build SET indexed_to = ?"
+# A full 'rebuild' of the index (bulk import) completes the build.
+FINISH_SEARCH_BUILD = "UPDATE search_build SET indexed_to = high"
+SEARCH_BUILT_WHEN = (
+    "WHEN {row}.id <= (SELECT indexed_to FROM search_build)"
+    " OR {row}.id > (SELECT high FROM search_build)\n"
+)
+
+# Messages indexed per transaction while building the full-text index.
+SEARCH_BUILD_BATCH = 20_000
+
+# Per-day, per-author statistics kept by triggers, and the latest generated
+# summary of each day, kept (unlike summary_cache) until the day changes.
+ROLLUPS = """
+CREATE TABLE IF NOT EXISTS daily_author_counts (
+    platform TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    author_id TEXT NOT NULL,
+    author_name TEXT NOT NULL DEFAULT '',
+    messages INTEGER NOT NULL DEFAULT 0,
+    attachments INTEGER NOT NULL DEFAULT 0,
+    first_message_at INTEGER,
+    last_message_at INTEGER,
+    PRIMARY KEY (platform, channel_id, date, author_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_messages_author_count_insert
+AFTER INSERT ON messages
+BEGIN
+    INSERT INTO daily_author_counts
+    (platform, channel_id, date, author_id, author_name, messages, attachments,
+     first_message_at, last_message_at)
+    VALUES (NEW.platform, NEW.channel_id, NEW.date, NEW.author_id, NEW.author_name, 1,
+            COALESCE(NEW.attachments, 0), NEW.created_at, NEW.created_at)
+    ON CONFLICT (platform, channel_id, date, author_id) DO UPDATE SET
+        author_name = COALESCE(NULLIF(excluded.author_name, ''), author_name),
+        messages = messages + 1,
+        attachments = attachments + excluded.attachments,
+        first_message_at = MIN(first_message_at, excluded.first_message_at),
+        last_message_at = MAX(last_message_at, excluded.last_message_at);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_messages_author_count_delete
+AFTER DELETE ON messages
+BEGIN
+    UPDATE daily_author_counts SET
+        messages = messages - 1,
+        attachments = attachments - COALESCE(OLD.attachments, 0)
+    WHERE platform = OLD.platform AND channel_id = OLD.channel_id
+      AND date = OLD.date AND author_id = OLD.author_id;
+    DELETE FROM daily_author_counts
+    WHERE platform = OLD.platform AND channel_id = OLD.channel_id
+      AND date = OLD.date AND author_id = OLD.author_id AND messages <= 0;
+END;
+
+INSERT OR REPLACE INTO daily_author_counts
+(platform, channel_id, date, author_id, author_name, messages, attachments,
+ first_message_at, last_message_at)
+SELECT platform, channel_id, date, author_id, MAX(author_name), COUNT(*),
+       SUM(COALESCE(attachments, 0)), MIN(created_at), MAX(created_at)
+FROM messages
+GROUP BY platform, channel_id, date, author_id;
+
+CREATE TABLE IF NOT EXISTS daily_summaries (
+    platform TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    message_hash TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    PRIMARY KEY (platform, channel_id, date, prompt_version)
+) WITHOUT ROWID;
+"""
+
+DELETE_DUPLICATE_MESSAGES = """
+    DELETE FROM messages
+    WHERE id NOT IN (
+        SELECT MIN(id) FROM messages GROUP BY platform, channel_id, message_id
+    )
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    # SQL script, or a callable taking the writer connection. A callable that
+    # returns True is called again, in a new transaction, until it returns a
+    # false value (a batched online build); only then is the version recorded.
+    apply: Union[str, Callable]
+    online: bool = False
+
+    def run(self, conn):
+        """Apply the migration (or its next batch); True if more batches remain."""
+        if callable(self.apply):
+            return bool(self.apply(conn))
+        for statement in split_script(self.apply):
+            conn.execute(statement)
+        return False
+
+
+def _search_index(conn):
+    """Migration 7, one step per call; returns True while batches remain.
+
+    The first step creates the empty index with triggers for the rows already
+    indexed (and new ones), the following ones index `SEARCH_BUILD_BATCH`
+    existing messages each, and the last one switches to the plain triggers.
+    """
+    if conn.execute(TABLE_EXISTS, ("search_build",)).fetchone() is None:
+        conn.execute(SEARCH_TABLE)
+        conn.execute(SEARCH_BUILD_SCHEMA)
+        conn.execute(START_SEARCH_BUILD)
+        triggers = SEARCH_TRIGGERS.format(
+            when_new=SEARCH_BUILT_WHEN.format(row="NEW"),
+            when_old=SEARCH_BUILT_WHEN.format(row="OLD"),
+        )
+        for statement in split_script(triggers):
+            conn.execute(statement)
+        return True
+    indexed_to, high = conn.execute(SELECT_SEARCH_BUILD).fetchone()
+    if indexed_to < high:
+        upto = min(indexed_to + SEARCH_BUILD_BATCH, high)
+        conn.execute(INDEX_SEARCH_BATCH, (indexed_to, upto))
+        conn.execute(ADVANCE_SEARCH_BUILD, (upto,))
+        return True
+    for name in SEARCH_TRIGGER_NAMES:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for statement in split_script(SEARCH_TRIGGERS.format(when_new="", when_old="")):
+        conn.execute(statement)
+    conn.execute("DROP TABLE search_build")
+    return False
+
+
+def _unique_message_ids(conn):
+    conn.execute(DELETE_DUPLICATE_MESSAGES)
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_unique_id "
+        "ON messages (platform, channel_id, message_id)"
+    )
+
+
+MIGRATIONS = (
+    Migration(1, "shared schema", create_shared_schema),
+    Migration(2, "unique message ids", _unique_message_ids),
+    Migration(
+        3,
+        "index for the per-day message fetch",
+        # Serves WHERE platform/channel/date ORDER BY timestamp without a sort.
+        """
+        CREATE INDEX IF NOT EXISTS idx_messages_channel_date_time
+        ON messages (platform, channel_id, date, timestamp);
+        """,
+        online=True,
+    ),
+    Migration(
+        4,
+        "invalidate summaries on edit and delete",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_messages_invalidate_summary_update
+        AFTER UPDATE OF content, attachments, embeds, author_name ON messages
+        BEGIN
+            DELETE FROM summary_cache
+            WHERE platform = NEW.platform
+              AND channel_id = NEW.channel_id
+              AND date = NEW.date;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_messages_invalidate_summary_delete
+        AFTER DELETE ON messages
+        BEGIN
+            DELETE FROM summary_cache
+            WHERE platform = OLD.platform
+              AND channel_id = OLD.channel_id
+              AND date = OLD.date;
+        END;
+        """,
+    ),
+    Migration(5, "integer epoch timestamps and channel time zones", EPOCH_TIMESTAMPS),
+    Migration(6, "compressed per-month message archive", ARCHIVE_SCHEMA),
+    Migration(7, "full-text search index", _search_index, online=True),
+    Migration(8, "per-author daily rollups and stored daily summaries", ROLLUPS),
+    Migration(9, "scheduled summary job state", SUMMARY_JOBS_SCHEMA),
+)
+
+
+def applied_versions(conn):
+    conn.execute(VERSION_SCHEMA)
+    return {row[0] for row in conn.execute(SELECT_APPLIED)}
+
+
+def migrate(db, online=False, timezone="UTC"):
+    """Apply pending migrations (online ones only if `online`); returns versions applied.
+
+    `timezone` is the default time zone (``STANDUP_TIMEZONE``) that migrations
+    dating messages use, through the ``local_date(created_at, tz)`` and
+    ``default_timezone()`` SQL functions.
+    """
+    with db.transaction() as conn:
+        known = applied_versions(conn)
+    newest = max(m.version for m in MIGRATIONS)
+    if known and max(known) > newest:
+        log.warning(
+            "Database is at schema version %d; this code only knows up to %d",
+            max(known),
+            newest,
+        )
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version in known or (migration.online and not online):
+            continue
+        more = _step(db, migration, timezone)
+        while more:
+            more = _step(db, migration, timezone)
+        if more is False:
+            applied.append(migration.version)
+    return applied
+
+
+def _step(db, migration, timezone):
+    """Run `migration` (or its next batch) in one transaction.
+
+    Returns True if batches remain, False once it is recorded and None if
+    another process had already applied it.
+    """
+    with db.transaction() as conn:
+        # Another process may have applied it since we looked.
+        if conn.execute(IS_APPLIED, (migration.version,)).fetchone() is not None:
+            return None
+        register_date_functions(conn, timezone)
+        started = time.monotonic()
+        if migration.run(conn):
+            return True
+        # For a batched migration this is the duration of the last batch.
+        duration = time.monotonic() - started
+        conn.execute(
+            RECORD_VERSION, (migration.version, migration.name, int(time.time()), duration)
+        )
+    log.info("Applied migration %d (%s) in %.2fs", migration.version, migration.name, duration)
+    return False
+
+
+def optimize(db, analysis_limit=ANALYSIS_LIMIT):
+    """Refresh planner statistics: a bounded ANALYZE the first time, then PRAGMA optimize."""
+    with db.transaction() as conn:
+        conn.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+        if conn.execute(HAS_STATISTICS).fetchone() is None:
+            conn.execute("ANALYZE")
+        else:
+            conn.execute("PRAGMA optimize")
+
+
+def upgrade(db, timezone="UTC"):
+    """Startup path: blocking migrations, then planner statistics."""
+    applied = migrate(db, timezone=timezone)
+    optimize(db)
+    return applied
+
+
+def build_online_step(db, timezone="UTC"):
+    """Run one transaction of the next pending online migration.
+
+    Returns its version, or None once nothing is left. The bots call this
+    with a pause in between, so their own writes are never held up for
+    longer than one step.
+    """
+    with db.transaction() as conn:
+        known = applied_versions(conn)
+    for migration in MIGRATIONS:
+        if migration.online and migration.version not in known:
+            _step(db, migration, timezone)
+            return migration.version
+    return None
+
+
+def build_online(db):
+    """Build pending online indexes, then refresh statistics if any were built."""
+    applied = migrate(db, online=True)
+    if applied:
+        optimize(db)
+    return applied
+
+
+def main(argv=None):
+    """``python -m standup_core.migrations [OLD.db ...]``: migrate STANDUP_DB_PATH fully."""
+    import argparse
+
+    from .config import Settings
+    from .schema import import_legacy
+    from .storage import Database
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("legacy", nargs="*", help="per-bot database files to import")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    settings = Settings.from_env()
+    db = Database(settings.db_path, settings.db_pool_size)
+    try:
+        migrate(db, online=True, timezone=settings.timezone)
+        for path in args.legacy:
+            log.info("Imported %d messages from %s", import_legacy(db, path, settings.timezone), path)
+        optimize(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Token-budgeted transcript building for summary prompts.
+
+Token counts come from a local approximation that is cheap enough to run per
+message line (and is memoized), calibrated against Gemini's `count_tokens` on
+the finished transcript: the observed real/estimated ratio scales every later
+estimate, and if the real count is over budget the transcript is rebuilt with
+the corrected estimates.
+
+The budget is shared fairly between authors (max-min fairness): authors who
+need less than an equal share get everything they wrote, and the rest of the
+budget is split evenly among the prolific ones. Text is assembled with list
+joins, so building is linear in the size of the day.
+"""
+
+import logging
+import math
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+log = logging.getLogger("standup.prompt")
+
+# Runs of ASCII letters/digits are words; every other visible character (CJK,
+# emoji, punctuation, code symbols) is counted separately.
+_PIECE_RE = re.compile(r"[A-Za-z0-9]+|\S")
+
+# How many times to rebuild when count_tokens says the estimate was low.
+MAX_CALIBRATION_ROUNDS = 2
+
+
+@lru_cache(maxsize=65536)
+def estimate_tokens(text):
+    """Approximate the Gemini token count of `text` without a network call."""
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        if len(piece) > 1:
+            # English-like words average ~4 characters per token.
+            tokens += math.ceil(len(piece) / 4)
+        else:
+            tokens += 1
+    return tokens
+
+
+class TokenCounter:
+    """Local token estimates, calibrated by the backend's real counter when available."""
+
+    def __init__(self, llm=None):
+        self.llm = llm
+        # Observed real/estimated ratio; starts neutral.
+        self.ratio = 1.0
+
+    def estimate(self, text):
+        return math.ceil(estimate_tokens(text) * self.ratio)
+
+    async def count(self, text):
+        """Exact count from the backend, falling back to the local estimate."""
+        if self.llm is not None:
+            try:
+                return await self.llm.count_tokens(text)
+            except Exception:
+                log.debug("count_tokens failed; using the local estimate", exc_info=True)
+        return self.estimate(text)
+
+    def calibrate(self, estimated, actual):
+        if estimated > 0 and actual > 0:
+            self.ratio = max(self.ratio * actual / estimated, 0.1)
+
+
+@dataclass
+class Transcript:
+    """A budgeted transcript plus what had to be left out."""
+
+    blocks: list
+    text: str
+    tokens: int
+    included: int
+    dropped: int
+    dropped_authors: int
+
+
+def fair_shares(demands, budget):
+    """Max-min fair split of `budget` across `demands` (same order as input)."""
+    shares = [0] * len(demands)
+    remaining = budget
+    pending = sorted(range(len(demands)), key=lambda i: demands[i])
+    while pending:
+        equal = remaining // len(pending)
+        index = pending[0]
+        if demands[index] <= equal:
+            shares[index] = demands[index]
+            remaining -= demands[index]
+            pending.pop(0)
+            continue
+        for index in pending:
+            shares[index] = equal
+        break
+    return shares
+
+
+def build_transcript(blocks, max_tokens, counter):
+    """Fit author blocks ``(author, [line, ...])`` into `max_tokens` tokens."""
+    headers = [f"\n**{author}:**\n" for author, _ in blocks]
+    line_tokens = [[counter.estimate(line) for line in lines] for _, lines in blocks]
+    demands = [
+        counter.estimate(header) + sum(tokens) for header, tokens in zip(headers, line_tokens)
+    ]
+    shares = fair_shares(demands, max_tokens)
+
+    out_blocks = []
+    included = dropped = dropped_authors = total = 0
+    for (author, lines), header, tokens, share in zip(blocks, headers, line_tokens, shares):
+        used = counter.estimate(header)
+        kept = []
+        for line, cost in zip(lines, tokens):
+            if used + cost > share:
+                break
+            kept.append(line)
+            used += cost
+        if not kept and not out_blocks and lines:
+            # Always send at least one message, even if it is over budget.
+            kept.append(lines[0])
+            used += tokens[0]
+        dropped += len(lines) - len(kept)
+        if kept:
+            out_blocks.append(header + "".join(kept))
+            included += len(kept)
+            total += used
+        else:
+            dropped_authors += 1
+
+    return Transcript(
+        blocks=out_blocks,
+        text="\n".join(out_blocks),
+        tokens=total,
+        included=included,
+        dropped=dropped,
+        dropped_authors=dropped_authors,
+    )
+
+
+async def build_verified_transcript(blocks, max_tokens, counter):
+    """`build_transcript`, re-checked (and re-built if needed) with a real count."""
+    transcript = build_transcript(blocks, max_tokens, counter)
+    # Far below budget the estimate cannot be wrong enough to matter, so skip
+    # the count_tokens round-trip.
+    if transcript.tokens <= max_tokens // 4:
+        return transcript
+    for _ in range(MAX_CALIBRATION_ROUNDS):
+        actual = await counter.count(transcript.text)
+        counter.calibrate(transcript.tokens, actual)
+        transcript.tokens = actual
+        if actual <= max_tokens or transcript.included <= 1:
+            break
+        # The calibrated ratio now makes every estimate larger.
+        transcript = build_transcript(blocks, max_tokens, counter)
+    return transcript
@@ -0,0 +1,315 @@
+"""Process-wide admission control for LLM requests.
+
+Every generation waits here for three things: a free concurrency slot, a
+request from the requests-per-minute bucket and its estimated tokens from the
+tokens-per-minute bucket. Buckets refill continuously and hold at most one
+minute's allowance, so bursts are absorbed but the per-minute quota is never
+exceeded. When the API answers 429 anyway (another process shares the quota),
+`throttled` empties both buckets so everyone backs off together.
+
+Waiting requests are served in priority order (`INTERACTIVE` commands before
+`BATCH` jobs) and, within a priority, round-robin across guilds/teams, so one
+busy server queues behind itself instead of in front of everyone else. The
+priority, the guild/team and an optional `on_wait(position)` callback travel
+with the request in a context variable set by `llm_request`; tasks started
+inside the block (map-reduce shards) inherit it. Work shared by several
+callers (`cache.SingleFlight`) runs as a `SharedRequest`: it waits at the most
+urgent of its callers' priorities, raised as callers join, and reports queue
+positions to all of them.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+log = logging.getLogger("standup.ratelimit")
+
+INTERACTIVE = 0
+BATCH = 1
+
+# Minimum seconds between two queue-position updates sent to one waiter.
+FEEDBACK_INTERVAL = 5.0
+
+
+@dataclass(frozen=True)
+class RequestContext:
+    priority: int = BATCH
+    scope: Optional[str] = None
+    # Called with the 1-based queue position while the request waits.
+    on_wait: Optional[Callable[[int], Awaitable[None]]] = None
+
+
+_current = contextvars.ContextVar("standup_llm_request", default=RequestContext())
+
+
+@contextmanager
+def llm_request(priority=BATCH, scope=None, on_wait=None):
+    """Tag the LLM calls made inside the block with a priority and guild/team."""
+    token = _current.set(
+        RequestContext(priority, None if scope is None else str(scope), on_wait)
+    )
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def current_request():
+    return _current.get()
+
+
+class SharedRequest:
+    """The request context of one call that several callers wait on."""
+
+    def __init__(self, context):
+        self.scope = context.scope
+        self._contexts = [context]
+        self._limiters = set()
+        self._children = []
+        if isinstance(context, SharedRequest):
+            # Shared work started by shared work (a digest's day summaries).
+            context._children.append(self)
+
+    @property
+    def priority(self):
+        return min(context.priority for context in self._contexts)
+
+    @property
+    def on_wait(self):
+        if any(context.on_wait is not None for context in self._contexts):
+            return self._send_position
+        return None
+
+    def join(self, context):
+        """Add a caller; its priority applies from now on if it is more urgent."""
+        self._contexts.append(context)
+        self._changed()
+
+    def _changed(self):
+        for limiter in self._limiters:
+            limiter.update(self)
+        for child in self._children:
+            child._changed()
+
+    async def _send_position(self, position):
+        callbacks = [c.on_wait for c in self._contexts if c.on_wait is not None]
+        results = await asyncio.gather(
+            *(callback(position) for callback in callbacks), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                log.warning("Queue position update failed", exc_info=result)
+
+
+@contextmanager
+def shared_request():
+    """Run the block, and the tasks it starts, as a `SharedRequest` of the current request."""
+    request = SharedRequest(_current.get())
+    token = _current.set(request)
+    try:
+        yield request
+    finally:
+        _current.reset(token)
+
+
+class TokenBucket:
+    """Allows `per_minute` units a minute, with bursts of up to one minute's worth."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+
+    def take(self, amount):
+        # May go negative: the deficit delays later requests.
+        self.level -= amount
+
+    def drain(self):
+        self.level = min(self.level, 0)
+
+
+class _Waiter:
+    def __init__(self, tokens, context, future):
+        self.tokens = tokens
+        self.context = context
+        self.future = future
+        self.position = None
+        self.notified_at = 0.0
+
+
+class RateLimiter:
+    """Priority- and fairness-ordered admission against RPM, TPM and concurrency limits."""
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, max_in_flight=4):
+        # A limit of 0 disables that bucket.
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_in_flight = max(1, max_in_flight)
+        self.in_flight = 0
+        # {priority: OrderedDict(scope -> deque of waiters)}; scopes rotate.
+        self._queues = {}
+        self._timer = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.llm_rpm, settings.llm_tpm, settings.llm_max_in_flight)
+
+    @property
+    def waiting(self):
+        return sum(len(q) for scopes in self._queues.values() for q in scopes.values())
+
+    @asynccontextmanager
+    async def slot(self, tokens):
+        """Hold one request's admission (and concurrency slot) for the block."""
+        await self.acquire(tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, tokens):
+        context = _current.get()
+        if isinstance(context, SharedRequest):
+            context._limiters.add(self)
+        waiter = _Waiter(tokens, context, asyncio.get_running_loop().create_future())
+        scopes = self._queues.setdefault(context.priority, OrderedDict())
+        scopes.setdefault(context.scope, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def update(self, request):
+        """Re-queue the waiters of a `SharedRequest` whose callers changed."""
+        moved = []
+        for priority, scopes in self._queues.items():
+            for scope, queue in list(scopes.items()):
+                for waiter in [w for w in queue if w.context is request]:
+                    # Report the position to the new caller too.
+                    waiter.position = None
+                    if priority != request.priority:
+                        queue.remove(waiter)
+                        moved.append(waiter)
+                if not queue:
+                    del scopes[scope]
+        for waiter in moved:
+            scopes = self._queues.setdefault(request.priority, OrderedDict())
+            scopes.setdefault(request.scope, deque()).append(waiter)
+        self._dispatch()
+
+    def throttled(self):
+        """The API reported a rate limit: wait for both buckets to refill."""
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.drain()
+
+    def charge(self, tokens):
+        """Correct the TPM bucket once a request's real token usage is known."""
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+    def _remove(self, waiter):
+        scopes = self._queues.get(waiter.context.priority, {})
+        queue = scopes.get(waiter.context.scope)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del scopes[waiter.context.scope]
+        self._dispatch()
+
+    def _next(self):
+        for priority in sorted(self._queues):
+            scopes = self._queues[priority]
+            if scopes:
+                return scopes, next(iter(scopes))
+        return None, None
+
+    def order(self):
+        """Waiters in the order they will be admitted if nothing else arrives."""
+        ordered = []
+        for priority in sorted(self._queues):
+            queues = list(self._queues[priority].values())
+            for depth in range(max((len(q) for q in queues), default=0)):
+                ordered.extend(q[depth] for q in queues if len(q) > depth)
+        return ordered
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        while self.in_flight < self.max_in_flight:
+            scopes, scope = self._next()
+            if scopes is None:
+                break
+            waiter = scopes[scope][0]
+            if waiter.future.done():
+                # Cancelled; its task has not yet taken it off the queue.
+                self._pop(scopes, scope)
+                continue
+            wait = max(
+                self.requests.delay(1, now) if self.requests else 0.0,
+                self.tokens.delay(waiter.tokens, now) if self.tokens else 0.0,
+            )
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                break
+            self._pop(scopes, scope)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(waiter.tokens)
+            self.in_flight += 1
+            waiter.future.set_result(None)
+        self._notify(now)
+
+    @staticmethod
+    def _pop(scopes, scope):
+        """Take the head of `scope`'s queue and move the scope to the back."""
+        scopes[scope].popleft()
+        if scopes[scope]:
+            scopes.move_to_end(scope)
+        else:
+            del scopes[scope]
+
+    def _notify(self, now):
+        for position, waiter in enumerate(self.order(), 1):
+            callback = waiter.context.on_wait
+            if callback is None or position == waiter.position:
+                continue
+            if waiter.position is not None and now - waiter.notified_at < FEEDBACK_INTERVAL:
+                continue
+            waiter.position = position
+            waiter.notified_at = now
+            asyncio.ensure_future(self._send_position(callback, position))
+
+    @staticmethod
+    async def _send_position(callback, position):
+        try:
+            await callback(position)
+        except Exception:
+            log.warning("Queue position update failed", exc_info=True)
@@ -0,0 +1,113 @@
+"""In-memory registry of standup channels for the message hot path.
+
+Deciding whether a message belongs to a standup channel happens for every
+message the bots see, so it must not touch the database. The registry is
+loaded once at startup, updated in place when channels are added or removed
+through this process, and reloaded when another process (the other bot, the
+dashboard) commits to the shared database file, which SQLite reports through
+`PRAGMA data_version` on the writer connection. Our own commits go through
+that same connection and so never trigger a reload.
+"""
+
+import asyncio
+import logging
+import sqlite3
+
+log = logging.getLogger("standup.registry")
+
+
+class ChannelRegistry:
+    """Map of scope (guild or team) id -> set of standup channel ids."""
+
+    def __init__(self, db, load_sql, poll_interval=2.0, load_params=()):
+        # `load_sql` must return (scope_id, channel_id, *details) rows.
+        self.db = db
+        self.load_sql = load_sql
+        self.load_params = load_params
+        self.poll_interval = poll_interval
+        self._channels = {}
+        self._scope_by_channel = {}
+        self._details = {}
+        self._data_version = None
+        self._task = None
+
+    def contains(self, scope_id, channel_id):
+        """Whether `channel_id` is a standup channel (in `scope_id`, if given)."""
+        scope = self._scope_by_channel.get(channel_id)
+        if scope is None:
+            return False
+        return scope_id is None or scope == scope_id
+
+    def channels(self, scope_id=None):
+        """Snapshot of the standup channel ids, optionally for one scope."""
+        if scope_id is None:
+            return set(self._scope_by_channel)
+        return set(self._channels.get(scope_id, ()))
+
+    def scope(self, channel_id):
+        """The guild/team `channel_id` belongs to, or None if it is not tracked."""
+        return self._scope_by_channel.get(channel_id)
+
+    def details(self, channel_id):
+        """Extra columns loaded for `channel_id` (empty if none or unknown)."""
+        return self._details.get(channel_id, ())
+
+    def add(self, scope_id, channel_id, *details):
+        self.discard(channel_id)
+        self._channels.setdefault(scope_id, set()).add(channel_id)
+        self._scope_by_channel[channel_id] = scope_id
+        self._details[channel_id] = details
+
+    def discard(self, channel_id):
+        self._details.pop(channel_id, None)
+        scope = self._scope_by_channel.pop(channel_id, None)
+        if scope is None:
+            return
+        scoped = self._channels.get(scope)
+        if scoped is not None:
+            scoped.discard(channel_id)
+            if not scoped:
+                del self._channels[scope]
+
+    async def load(self):
+        """Replace the registry contents with what is in the database."""
+        rows = await self.db.fetchall(self.load_sql, self.load_params)
+        channels = {}
+        scope_by_channel = {}
+        details = {}
+        for scope_id, channel_id, *extra in rows:
+            channels.setdefault(scope_id, set()).add(channel_id)
+            scope_by_channel[channel_id] = scope_id
+            details[channel_id] = tuple(extra)
+        # Swap the maps at once so readers never see a half-built registry.
+        self._channels, self._scope_by_channel, self._details = (
+            channels,
+            scope_by_channel,
+            details,
+        )
+
+    async def start(self):
+        """Load the registry and start watching for changes from other processes."""
+        self._data_version = await self.db.data_version()
+        await self.load()
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                version = await self.db.data_version()
+                if version != self._data_version:
+                    self._data_version = version
+                    await self.load()
+            except sqlite3.Error:
+                log.exception("Failed to refresh the standup channel registry")
@@ -0,0 +1,358 @@
+"""Retention, archival and compaction of the message store.
+
+Only the last `retention_days` days of messages stay in `messages` (the hot
+window). Whole calendar months older than that are moved, per channel, into
+`message_archive` as one zlib-compressed JSON row each. Archived months remain
+queryable: `Retention.messages` returns an archived day in the same shape as
+the hot per-day fetch, and the engine merges the two, so summaries and reports
+(and their cache fingerprints) do not change when a month is archived. The
+per-day counters, rollups and cached summaries of archived days are kept as
+they were. A channel's time zone change re-dates its archive too
+(`redate_archive`), so archived days follow the channel's current zone.
+
+Compaction runs in the background every `compaction_interval` seconds. Work is
+split into short write transactions (at most `ARCHIVE_CHUNK` messages, or
+`VACUUM_PAGES` freed pages, each) with a pause in between, so the bots' writes
+never wait long for the lock. Freed pages are returned to the filesystem with
+`PRAGMA incremental_vacuum`, which needs ``auto_vacuum = INCREMENTAL``; new
+database files get it from `storage.PRAGMAS`, and an existing file is converted
+once, offline, with ``python -m standup_core.retention --vacuum``.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import zlib
+from datetime import date as Date, timedelta
+
+log = logging.getLogger("standup.retention")
+
+# Messages moved per write transaction.
+ARCHIVE_CHUNK = 5000
+# Pages released per incremental_vacuum transaction (~8 MiB at 4 KiB pages).
+VACUUM_PAGES = 2048
+# Seconds to leave the write lock free between two steps.
+STEP_PAUSE = 0.05
+ZLIB_LEVEL = 6
+
+# Created by migration 6 (see standup_core.migrations).
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_archive (
+    platform TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    messages INTEGER NOT NULL,
+    first_created_at INTEGER NOT NULL,
+    last_created_at INTEGER NOT NULL,
+    raw_size INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    archived_at INTEGER NOT NULL,
+    PRIMARY KEY (platform, channel_id, month)
+)
+"""
+
+# (channel, month) pairs with hot messages older than the cutoff date.
+SELECT_ARCHIVABLE_MONTHS = """
+    SELECT DISTINCT channel_id, substr(date, 1, 7)
+    FROM messages
+    WHERE platform = ? AND date < ?
+"""
+# Archived rows store the display name resolved at archive time.
+SELECT_MONTH_CHUNK = """
+    SELECT m.id, m.message_id, m.author_id,
+           COALESCE(NULLIF(m.author_name, ''), u.name, m.author_id),
+           m.content, m.created_at, m.date, m.attachments, m.embeds
+    FROM messages m
+    LEFT JOIN users u ON u.platform = m.platform AND u.user_id = m.author_id
+    WHERE m.platform = ? AND m.channel_id = ? AND m.date >= ? AND m.date < ?
+    LIMIT ?
+"""
+SELECT_ARCHIVE = """
+    SELECT data FROM message_archive WHERE platform = ? AND channel_id = ? AND month = ?
+"""
+SELECT_CHANNEL_ARCHIVES = """
+    SELECT data FROM message_archive WHERE platform = ? AND channel_id = ?
+"""
+DELETE_CHANNEL_ARCHIVES = "DELETE FROM message_archive WHERE platform = ? AND channel_id = ?"
+UPSERT_ARCHIVE = """
+    INSERT OR REPLACE INTO message_archive
+    (platform, channel_id, month, messages, first_created_at, last_created_at,
+     raw_size, data, archived_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+DELETE_ARCHIVED_MESSAGE = "DELETE FROM messages WHERE id = ?"
+# Deleting archived rows fires the counter and invalidation triggers; what they
+# remove is put back afterwards, in the same transaction.
+COUNT_COLUMNS = "platform, date, channel_id, scope_id, messages, authors, last_message_at"
+SELECT_MONTH_COUNTS = f"""
+    SELECT {COUNT_COLUMNS} FROM daily_channel_counts
+    WHERE platform = ? AND channel_id = ? AND date >= ? AND date < ?
+"""
+RESTORE_COUNTS = f"""
+    INSERT OR REPLACE INTO daily_channel_counts ({COUNT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+AUTHOR_COUNT_COLUMNS = (
+    "platform, channel_id, date, author_id, author_name, messages, attachments, "
+    "first_message_at, last_message_at"
+)
+SELECT_MONTH_AUTHOR_COUNTS = f"""
+    SELECT {AUTHOR_COUNT_COLUMNS} FROM daily_author_counts
+    WHERE platform = ? AND channel_id = ? AND date >= ? AND date < ?
+"""
+RESTORE_AUTHOR_COUNTS = f"""
+    INSERT OR REPLACE INTO daily_author_counts ({AUTHOR_COUNT_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SUMMARY_COLUMNS = (
+    "platform, channel_id, date, prompt_version, message_hash, summary, size, created_at, last_used"
+)
+SELECT_MONTH_SUMMARIES = f"""
+    SELECT {SUMMARY_COLUMNS} FROM summary_cache
+    WHERE platform = ? AND channel_id = ? AND date >= ? AND date < ?
+"""
+RESTORE_SUMMARIES = f"""
+    INSERT OR REPLACE INTO summary_cache ({SUMMARY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def month_bounds(month):
+    """First day of `month` (YYYY-MM) and of the month after, as YYYY-MM-DD."""
+    first = Date.fromisoformat(month + "-01")
+    following = (first + timedelta(days=32)).replace(day=1)
+    return first.isoformat(), following.isoformat()
+
+
+def cutoff_date(retention_days, today=None):
+    """Messages dated before this day (a month start) are archived."""
+    today = today or Date.today()
+    return (today - timedelta(days=retention_days)).replace(day=1).isoformat()
+
+
+def compress_rows(rows):
+    """zlib-compressed JSON of archived rows: [message_id, author_id, author,
+    content, created_at, date, attachments, embeds], oldest first."""
+    raw = json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(raw, ZLIB_LEVEL), len(raw)
+
+
+def decompress_rows(data):
+    return json.loads(zlib.decompress(data))
+
+
+def archive_chunk(conn, platform, channel_id, month, limit=ARCHIVE_CHUNK):
+    """Move up to `limit` of a channel's messages for `month` into its archive row.
+
+    Runs inside the caller's write transaction; returns the number moved.
+    """
+    start, end = month_bounds(month)
+    span = (platform, channel_id, start, end)
+    rows = conn.execute(SELECT_MONTH_CHUNK, (*span, limit)).fetchall()
+    if not rows:
+        return 0
+
+    archived = {}
+    existing = conn.execute(SELECT_ARCHIVE, (platform, channel_id, month)).fetchone()
+    if existing is not None:
+        archived = {row[0]: row for row in decompress_rows(existing[0])}
+    for row in rows:
+        archived[row[1]] = list(row[1:])
+    merged = sorted(archived.values(), key=lambda row: row[4])
+    data, raw_size = compress_rows(merged)
+
+    counts = conn.execute(SELECT_MONTH_COUNTS, span).fetchall()
+    author_counts = conn.execute(SELECT_MONTH_AUTHOR_COUNTS, span).fetchall()
+    summaries = conn.execute(SELECT_MONTH_SUMMARIES, span).fetchall()
+    conn.execute(
+        UPSERT_ARCHIVE,
+        (
+            platform,
+            channel_id,
+            month,
+            len(merged),
+            merged[0][4],
+            merged[-1][4],
+            raw_size,
+            data,
+            int(time.time()),
+        ),
+    )
+    conn.executemany(DELETE_ARCHIVED_MESSAGE, [(row[0],) for row in rows])
+    conn.executemany(RESTORE_COUNTS, counts)
+    conn.executemany(RESTORE_AUTHOR_COUNTS, author_counts)
+    conn.executemany(RESTORE_SUMMARIES, summaries)
+    return len(rows)
+
+
+def redate_archive(conn, platform, channel_id, day_of):
+    """Re-date a channel's archived messages with `day_of(created_at)` and
+    re-partition them into the months of their new dates.
+
+    Runs inside the caller's write transaction (a time zone change); returns
+    the archived rows, oldest first.
+    """
+    rows = []
+    for (data,) in conn.execute(SELECT_CHANNEL_ARCHIVES, (platform, channel_id)).fetchall():
+        rows.extend(decompress_rows(data))
+    if not rows:
+        return rows
+    rows.sort(key=lambda row: row[4])
+    months = {}
+    for row in rows:
+        row[5] = day_of(row[4])
+        months.setdefault(row[5][:7], []).append(row)
+
+    conn.execute(DELETE_CHANNEL_ARCHIVES, (platform, channel_id))
+    now = int(time.time())
+    for month, month_rows in months.items():
+        data, raw_size = compress_rows(month_rows)
+        conn.execute(
+            UPSERT_ARCHIVE,
+            (
+                platform,
+                channel_id,
+                month,
+                len(month_rows),
+                month_rows[0][4],
+                month_rows[-1][4],
+                raw_size,
+                data,
+                now,
+            ),
+        )
+    return rows
+
+
+def incremental_vacuum(conn, pages=VACUUM_PAGES):
+    """Release up to `pages` free pages; returns how many remain free."""
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+class Retention:
+    """Archives old months and compacts the database file in the background."""
+
+    def __init__(self, db, platform, retention_days=180, compaction_interval=21600):
+        self.db = db
+        self.platform = platform
+        self.retention_days = retention_days
+        self.compaction_interval = compaction_interval
+        self._task = None
+
+    @classmethod
+    def from_settings(cls, db, platform, settings):
+        return cls(db, platform, settings.retention_days, settings.compaction_interval)
+
+    def start(self):
+        """Run compaction now and then every `compaction_interval` seconds."""
+        if self.compaction_interval > 0:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await self.compact()
+            except Exception:
+                log.exception("Compaction failed; retrying in %ss", self.compaction_interval)
+            await asyncio.sleep(self.compaction_interval)
+
+    async def compact(self):
+        """Archive months outside the hot window, then free unused pages."""
+        started = time.monotonic()
+        moved = await self.archive()
+        freed = await self.vacuum()
+        if moved or freed:
+            log.info(
+                "Compaction archived %d messages and freed %d pages in %.1fs",
+                moved,
+                freed,
+                time.monotonic() - started,
+            )
+        return moved, freed
+
+    async def archive(self):
+        if self.retention_days <= 0:
+            return 0
+        cutoff = cutoff_date(self.retention_days)
+        months = await self.db.fetchall(SELECT_ARCHIVABLE_MONTHS, (self.platform, cutoff))
+        moved = 0
+        for channel_id, month in months:
+            while True:
+                count = await self.db.run_in_transaction(
+                    archive_chunk, self.platform, channel_id, month
+                )
+                moved += count
+                if count < ARCHIVE_CHUNK:
+                    break
+                await asyncio.sleep(STEP_PAUSE)
+            await asyncio.sleep(STEP_PAUSE)
+        return moved
+
+    async def vacuum(self):
+        """Return free pages to the filesystem a few MiB at a time."""
+        mode = await self.db.fetchone("PRAGMA auto_vacuum")
+        if mode is None or mode[0] != 2:  # 2 = INCREMENTAL
+            return 0
+        before = (await self.db.fetchone("PRAGMA freelist_count"))[0]
+        remaining = before
+        while remaining:
+            remaining = await self.db.run_in_transaction(incremental_vacuum)
+            await asyncio.sleep(STEP_PAUSE)
+        return before
+
+    async def messages(self, channel_id, start, end, month):
+        """Archived (author, content, created_at, attachments, embeds) rows in [start, end)."""
+        row = await self.db.fetchone(SELECT_ARCHIVE, (self.platform, channel_id, month))
+        if row is None:
+            return []
+        return [
+            (author, content, created_at, attachments, embeds)
+            for _, _, author, content, created_at, _, attachments, embeds in decompress_rows(
+                row[0]
+            )
+            if start <= created_at < end
+        ]
+
+
+def main(argv=None):
+    """``python -m standup_core.retention [--vacuum]``: archive and compact now."""
+    import argparse
+
+    from .config import Settings
+    from .migrations import upgrade
+    from .storage import AsyncDatabase
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="switch the file to incremental auto_vacuum with one full VACUUM (stop the bots first)",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    settings = Settings.from_env()
+
+    async def run():
+        db = AsyncDatabase.from_settings(settings)
+        try:
+            await db.run_write(upgrade, db.db, settings.timezone)
+            if args.vacuum:
+                await db.run_write(db.db.executescript, "PRAGMA auto_vacuum = INCREMENTAL; VACUUM;")
+            for platform in ("discord", "slack"):
+                retention = Retention.from_settings(db, platform, settings)
+                moved, freed = await retention.compact()
+                log.info("%s: archived %d messages, freed %d pages", platform, moved, freed)
+        finally:
+            await db.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Automatic end-of-day summaries.
+
+When `summary_schedule` is set (a local HH:MM), every standup channel gets the
+day's summary posted at that time in the channel's own time zone. Channels are
+spread over `summary_stagger` seconds after it, each at a fixed offset derived
+from its id, and at most `concurrency` jobs run at once, so hundreds of
+channels sharing a time zone do not hit the LLM and the chat platform in the
+same minute. Their LLM calls are also queued as `BATCH` work, behind
+interactive commands (see `standup_core.ratelimit`).
+
+Generating the summary goes through `StandupEngine.summarize_day`, which stores
+it in the summary cache and as the day's summary, so a later ``/ai_summary``
+(or digest) for that day is answered without another LLM call.
+
+Job state is kept in `summary_jobs`, one row per channel and day. A job is
+claimed (``posting``) only after its summary is ready and just before it is
+posted, and claims are never retried: a restart, or a second bot process, can
+lose a post that was in flight but never posts a day twice. Failed jobs are
+retried with backoff, up to `MAX_ATTEMPTS` times; a job that could not start
+within `LATE_LIMIT` of its time (the bot was down) is skipped, not posted late.
+"""
+
+import asyncio
+import logging
+import time as clock
+import zlib
+from datetime import date as Date, datetime, time, timedelta
+
+from .ratelimit import BATCH, llm_request
+
+log = logging.getLogger("standup.scheduler")
+
+# Seconds between two looks at which channels are due.
+POLL_INTERVAL = 60
+MAX_ATTEMPTS = 3
+# First retry delay in seconds; doubled for each further attempt.
+RETRY_DELAY = 300
+# A job not started within this many seconds of becoming due (the bot was down)
+# is given up rather than posted late.
+LATE_LIMIT = 6 * 3600
+# Job rows older than this many days are deleted.
+KEEP_DAYS = 14
+
+# Created by migration 9 (see standup_core.migrations).
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summary_jobs (
+    platform TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at INTEGER NOT NULL DEFAULT 0,
+    updated_at INTEGER NOT NULL,
+    error TEXT,
+    PRIMARY KEY (platform, channel_id, date)
+) WITHOUT ROWID
+"""
+
+SELECT_JOBS = """
+    SELECT channel_id, date, status, attempts, next_attempt_at FROM summary_jobs
+    WHERE platform = ? AND date >= ?
+"""
+INSERT_JOB = """
+    INSERT INTO summary_jobs (platform, channel_id, date, status, updated_at)
+    VALUES (?, ?, ?, 'pending', ?)
+    ON CONFLICT (platform, channel_id, date) DO NOTHING
+"""
+# Only one process (and one attempt) ever gets to post a given day.
+CLAIM_JOB = """
+    UPDATE summary_jobs SET status = 'posting', updated_at = ?
+    WHERE platform = ? AND channel_id = ? AND date = ? AND status IN ('pending', 'failed')
+"""
+FINISH_JOB = """
+    UPDATE summary_jobs SET status = ?, updated_at = ?, error = ?
+    WHERE platform = ? AND channel_id = ? AND date = ?
+"""
+# The retry delay doubles with every attempt already made.
+FAIL_JOB = """
+    UPDATE summary_jobs
+    SET status = 'failed', attempts = attempts + 1, next_attempt_at = ? + ? * (1 << attempts),
+        updated_at = ?, error = ?
+    WHERE platform = ? AND channel_id = ? AND date = ? AND status IN ('pending', 'failed')
+"""
+DELETE_OLD_JOBS = "DELETE FROM summary_jobs WHERE platform = ? AND date < ?"
+
+
+def parse_schedule(value):
+    """`time` of day for an HH:MM setting; None when scheduling is off."""
+    if not value:
+        return None
+    hours, _, minutes = value.partition(":")
+    return time(int(hours), int(minutes or 0))
+
+
+def stagger_offset(channel_id, window):
+    """Fixed delay (seconds in [0, window)) of a channel's job after the schedule."""
+    if window <= 0:
+        return 0
+    return zlib.crc32(str(channel_id).encode()) % window
+
+
+class SummaryScheduler:
+    """Posts each standup channel's summary at the end of its local day."""
+
+    def __init__(
+        self, engine, post, channel_name, at=None, stagger=900, concurrency=2, messages=None
+    ):
+        # `post(channel_id, date, summary, message_count)` sends the summary;
+        # `channel_name(channel_id)` returns the name used in the prompt and
+        # `messages(channel_id, date)` loads the day (default: the engine's).
+        self.engine = engine
+        self.db = engine.db
+        self.platform = engine.platform
+        self.post = post
+        self.channel_name = channel_name
+        self.messages = messages or engine.messages_for_date
+        self.at = at
+        self.stagger = stagger
+        self.concurrency = concurrency
+        self._task = None
+        self._running = {}
+
+    @classmethod
+    def from_settings(cls, engine, post, channel_name, settings, messages=None):
+        return cls(
+            engine,
+            post,
+            channel_name,
+            parse_schedule(settings.summary_schedule),
+            settings.summary_stagger,
+            settings.summary_schedule_concurrency,
+            messages,
+        )
+
+    def start(self):
+        """Check for due channels now and then every `POLL_INTERVAL` seconds."""
+        if self.at is not None and self.concurrency > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in self._running.values():
+            task.cancel()
+        self._running.clear()
+
+    def due_at(self, channel_id, date):
+        """Epoch seconds at which the job of `channel_id` for `date` becomes due."""
+        tz = self.engine.timezone(channel_id)
+        moment = datetime.combine(Date.fromisoformat(date), self.at, tz)
+        return moment.timestamp() + stagger_offset(channel_id, self.stagger)
+
+    async def _run_forever(self):
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            try:
+                await self.tick(slots)
+            except Exception:
+                log.exception("Summary schedule check failed")
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def tick(self, slots):
+        """Start the jobs that are due and not done, failed for good or running."""
+        now = clock.time()
+        # Yesterday too: a late schedule plus its stagger can end after midnight.
+        candidates = []
+        for channel in self.engine.channels():
+            today = Date.fromisoformat(self.engine.today(channel))
+            for day in (today - timedelta(days=1), today):
+                candidates.append((channel, day.isoformat()))
+        if not candidates:
+            return
+        oldest = min(date for _, date in candidates)
+        await self.db.execute(
+            DELETE_OLD_JOBS,
+            (self.platform, (Date.fromisoformat(oldest) - timedelta(days=KEEP_DAYS)).isoformat()),
+        )
+        jobs = {
+            (channel, date): (status, attempts, next_attempt_at)
+            for channel, date, status, attempts, next_attempt_at in await self.db.fetchall(
+                SELECT_JOBS, (self.platform, oldest)
+            )
+        }
+        for key in candidates:
+            due = self.due_at(*key)
+            if key in self._running or not due <= now < due + LATE_LIMIT:
+                continue
+            status, attempts, next_attempt_at = jobs.get(key, ("pending", 0, 0))
+            if status not in ("pending", "failed") or attempts >= MAX_ATTEMPTS:
+                continue
+            if now < next_attempt_at:
+                continue
+            task = asyncio.create_task(self._run_job(slots, *key))
+            self._running[key] = task
+            task.add_done_callback(lambda _, key=key: self._running.pop(key, None))
+
+    async def _run_job(self, slots, channel, date):
+        async with slots:
+            try:
+                await self.run_job(channel, date)
+            except Exception as e:
+                log.warning("Scheduled summary failed for %s on %s", channel, date, exc_info=True)
+                await self._fail(channel, date, e)
+
+    async def run_job(self, channel, date):
+        """Summarize and post one channel's day; returns the final job status."""
+        now = int(clock.time())
+        await self.db.execute(INSERT_JOB, (self.platform, channel, date, now))
+        messages = await self.messages(channel, date)
+        if not messages:
+            await self._finish(channel, date, "skipped")
+            return "skipped"
+
+        name = await self.channel_name(channel)
+        # Queued behind interactive commands, in turn with the channel's guild/team.
+        with llm_request(BATCH, self.engine.registry.scope(channel)):
+            summary = await self.engine.summarize_day(messages, date, name, channel)
+        claim = await self.db.execute(
+            CLAIM_JOB, (int(clock.time()), self.platform, channel, date)
+        )
+        if claim.rowcount == 0:
+            return "claimed"
+        try:
+            await self.post(channel, date, summary, len(messages))
+        except Exception as e:
+            # Whether the post went out is unknown; never risk posting twice.
+            await self._finish(channel, date, "abandoned", e)
+            raise
+        await self._finish(channel, date, "posted")
+        log.info("Posted the %s summary of channel %s", date, channel)
+        return "posted"
+
+    async def _finish(self, channel, date, status, error=None):
+        await self.db.execute(
+            FINISH_JOB,
+            (status, int(clock.time()), error and str(error)[:500], self.platform, channel, date),
+        )
+
+    async def _fail(self, channel, date, error):
+        now = int(clock.time())
+        await self.db.execute(
+            FAIL_JOB, (now, RETRY_DELAY, now, str(error)[:500], self.platform, channel, date)
+        )
@@ -0,0 +1,282 @@
+"""The shared database schema, and migration from the per-bot layouts.
+
+Both bots (and the dashboard) store channels and messages in the same tables,
+told apart by a `platform` column ('discord' or 'slack'). Platform ids are
+stored as TEXT: Discord snowflakes are integers, Slack ids are strings, and a
+single type keeps every key and index usable by both.
+
+Databases written by earlier versions have a `messages` table in one of two
+incompatible layouts. The first migration (`create_shared_schema`, see
+`standup_core.migrations`) upgrades such a file in place, and `import_legacy`
+copies a second legacy file (the other bot's) into the shared one, so both bots
+can be pointed at one `STANDUP_DB_PATH`.
+"""
+
+import logging
+import sqlite3
+
+from .cache import SCHEMA as CACHE_SCHEMA
+from .storage import TABLE_EXISTS, register_date_functions, split_script
+
+log = logging.getLogger("standup.schema")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS standup_channels (
+    platform TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    scope_id TEXT NOT NULL,
+    channel_name TEXT NOT NULL,
+    is_private INTEGER NOT NULL DEFAULT 0,
+    is_archived INTEGER NOT NULL DEFAULT 0,
+    member_count INTEGER,
+    refreshed_at INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (platform, channel_id)
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    platform TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    author_id TEXT NOT NULL,
+    author_name TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TIMESTAMP NOT NULL,
+    date TEXT NOT NULL,
+    attachments INTEGER DEFAULT 0,
+    embeds INTEGER DEFAULT 0
+);
+
+-- Covers the per-day message fetch and per-day aggregates (message count,
+-- distinct authors, last message)
+CREATE INDEX IF NOT EXISTS idx_messages_platform_date_channel
+ON messages (platform, date, channel_id, author_id, timestamp);
+
+-- Names for authors stored without one (deferred resolution on Slack)
+CREATE TABLE IF NOT EXISTS users (
+    platform TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (platform, user_id)
+) WITHOUT ROWID;
+
+-- Per-day counters for each standup channel, maintained at ingest
+CREATE TABLE IF NOT EXISTS daily_channel_counts (
+    platform TEXT NOT NULL,
+    date TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    scope_id TEXT NOT NULL,
+    messages INTEGER NOT NULL DEFAULT 0,
+    authors INTEGER NOT NULL DEFAULT 0,
+    last_message_at TIMESTAMP,
+    PRIMARY KEY (platform, date, channel_id)
+) WITHOUT ROWID;
+
+-- Drop cached summaries for a day as soon as a new message for it arrives
+CREATE TRIGGER IF NOT EXISTS trg_messages_invalidate_summary
+AFTER INSERT ON messages
+BEGIN
+    DELETE FROM summary_cache
+    WHERE platform = NEW.platform
+      AND channel_id = NEW.channel_id
+      AND date = NEW.date;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_messages_count_insert
+AFTER INSERT ON messages
+BEGIN
+    INSERT INTO daily_channel_counts
+    (platform, date, channel_id, scope_id, messages, authors, last_message_at)
+    SELECT NEW.platform, NEW.date, NEW.channel_id, scope_id, 1, 1, NEW.timestamp
+    FROM standup_channels
+    WHERE platform = NEW.platform AND channel_id = NEW.channel_id
+    ON CONFLICT (platform, date, channel_id) DO UPDATE SET
+        messages = messages + 1,
+        authors = authors + NOT EXISTS (
+            SELECT 1 FROM messages
+            WHERE platform = NEW.platform
+              AND date = NEW.date
+              AND channel_id = NEW.channel_id
+              AND author_id = NEW.author_id
+              AND id <> NEW.id
+        ),
+        last_message_at = MAX(COALESCE(last_message_at, ''), excluded.last_message_at);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_messages_count_delete
+AFTER DELETE ON messages
+BEGIN
+    UPDATE daily_channel_counts SET
+        messages = messages - 1,
+        authors = authors - NOT EXISTS (
+            SELECT 1 FROM messages
+            WHERE platform = OLD.platform
+              AND date = OLD.date
+              AND channel_id = OLD.channel_id
+              AND author_id = OLD.author_id
+        )
+    WHERE platform = OLD.platform AND date = OLD.date AND channel_id = OLD.channel_id;
+END;
+"""
+
+# Legacy objects that would clash with (or fire against) the shared schema.
+LEGACY_DROPS = (
+    "DROP TRIGGER IF EXISTS trg_messages_invalidate_summary",
+    "DROP TRIGGER IF EXISTS trg_messages_count_insert",
+    "DROP TRIGGER IF EXISTS trg_messages_count_delete",
+    "DROP INDEX IF EXISTS idx_messages_date_channel",
+    "DROP INDEX IF EXISTS idx_messages_date_channel_author",
+    "DROP TABLE IF EXISTS daily_channel_counts",
+)
+
+# Copy statements per legacy layout; `{src}` is the schema holding the legacy
+# tables ("main" with renamed tables, or an attached database).
+COPY_CHANNELS = {
+    "discord": """
+        INSERT OR IGNORE INTO main.standup_channels
+        (platform, channel_id, scope_id, channel_name, created_at)
+        SELECT 'discord', CAST(channel_id AS TEXT), CAST(guild_id AS TEXT),
+               channel_name, created_at
+        FROM {src}.{channels}
+    """,
+    "slack": """
+        INSERT OR IGNORE INTO main.standup_channels
+        (platform, channel_id, scope_id, channel_name, created_at)
+        SELECT 'slack', channel_id, team_id, channel_name, created_at
+        FROM {src}.{channels}
+    """,
+}
+COPY_MESSAGES = {
+    "discord": """
+        INSERT INTO main.messages
+        (platform, channel_id, message_id, author_id, author_name, content,
+         {time_column}, date, attachments, embeds)
+        SELECT 'discord', CAST(l.channel_id AS TEXT), CAST(l.message_id AS TEXT),
+               CAST(l.author_id AS TEXT), l.author_name, l.content,
+               {time_value}, {date_value}, l.attachments, l.embeds
+        FROM {src}.{messages} l
+        WHERE NOT EXISTS (
+            SELECT 1 FROM main.messages m
+            WHERE m.platform = 'discord'
+              AND m.channel_id = CAST(l.channel_id AS TEXT)
+              AND m.message_id = CAST(l.message_id AS TEXT)
+        )
+        ORDER BY l.id
+    """,
+    "slack": """
+        INSERT INTO main.messages
+        (platform, channel_id, message_id, author_id, author_name, content,
+         {time_column}, date, attachments, embeds)
+        SELECT 'slack', l.channel_id, l.message_ts, l.user_id, l.user_name, l.content,
+               {time_value}, {date_value}, l.attachments, 0
+        FROM {src}.{messages} l
+        WHERE NOT EXISTS (
+            SELECT 1 FROM main.messages m
+            WHERE m.platform = 'slack'
+              AND m.channel_id = l.channel_id AND m.message_id = l.message_ts
+        )
+        ORDER BY l.id
+    """,
+}
+# Once migration 5 has run, creation times are epoch milliseconds taken from
+# the message ids (see EPOCH_TIMESTAMPS in standup_core.migrations).
+LEGACY_CREATED_AT = {
+    "discord": "(CAST(l.message_id AS INTEGER) >> 22) + 1420070400000",
+    "slack": "CAST(ROUND(CAST(l.message_ts AS REAL) * 1000) AS INTEGER)",
+}
+# ...and the day is recomputed from them in the channel's time zone (or the
+# default one): legacy dates are the server's local day (Slack) or the UTC day
+# (Discord). Needs the SQL functions from `storage.register_date_functions`.
+LEGACY_DATE = """local_date({time_value}, COALESCE(
+            (SELECT c.timezone FROM main.standup_channels c
+             WHERE c.platform = '{platform}' AND c.channel_id = {channel}),
+            default_timezone()))"""
+LEGACY_CHANNEL = {"discord": "CAST(l.channel_id AS TEXT)", "slack": "l.channel_id"}
+COPY_SLACK_USERS = """
+    INSERT OR IGNORE INTO main.users (platform, user_id, name, updated_at)
+    SELECT 'slack', user_id, name, updated_at FROM {src}.slack_users
+"""
+
+
+def _columns(conn, table, schema="main"):
+    return {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")}
+
+
+def legacy_platform(conn, table="messages", schema="main"):
+    """Which per-bot layout `table` has, or None if it is missing or shared."""
+    columns = _columns(conn, table, schema)
+    if not columns or "platform" in columns:
+        return None
+    if "message_ts" in columns:
+        return "slack"
+    if "author_name" in columns:
+        return "discord"
+    raise sqlite3.DatabaseError(f"Unrecognized layout for {schema}.{table}: {sorted(columns)}")
+
+
+def _set_aside_legacy(conn):
+    """Rename per-bot tables out of the way of the shared schema."""
+    platform = legacy_platform(conn)
+    if platform is None:
+        return
+    log.info("Upgrading %s database layout to the shared schema", platform)
+    for statement in LEGACY_DROPS:
+        conn.execute(statement)
+    conn.execute("ALTER TABLE messages RENAME TO legacy_messages")
+    if conn.execute(TABLE_EXISTS, ("standup_channels",)).fetchone() is not None:
+        conn.execute("ALTER TABLE standup_channels RENAME TO legacy_standup_channels")
+
+
+def _copy_legacy(conn, src, messages, channels):
+    """Copy legacy rows from `src` into the shared tables; returns rows copied."""
+    platform = legacy_platform(conn, messages, src)
+    if platform is None:
+        return 0
+    names = {"src": src, "messages": messages, "channels": channels}
+    if "created_at" in _columns(conn, "messages"):
+        time_value = LEGACY_CREATED_AT[platform]
+        date_value = LEGACY_DATE.format(
+            time_value=time_value, platform=platform, channel=LEGACY_CHANNEL[platform]
+        )
+        names.update(time_column="created_at", time_value=time_value, date_value=date_value)
+    else:
+        # Migration 5 re-dates these rows.
+        names.update(time_column="timestamp", time_value="l.timestamp", date_value="l.date")
+    if _columns(conn, channels, src):
+        conn.execute(COPY_CHANNELS[platform].format(**names))
+    copied = conn.execute(COPY_MESSAGES[platform].format(**names)).rowcount
+    if platform == "slack" and _columns(conn, "slack_users", src):
+        conn.execute(COPY_SLACK_USERS.format(**names))
+    return copied
+
+
+def _finish_upgrade(conn):
+    """Move set-aside legacy rows into the shared tables and drop the old ones."""
+    if conn.execute(TABLE_EXISTS, ("legacy_messages",)).fetchone() is None:
+        return
+    copied = _copy_legacy(conn, "main", "legacy_messages", "legacy_standup_channels")
+    conn.execute("DROP TABLE legacy_messages")
+    conn.execute("DROP TABLE IF EXISTS legacy_standup_channels")
+    conn.execute("DROP TABLE IF EXISTS slack_users")
+    log.info("Moved %d messages into the shared schema", copied)
+
+
+def create_shared_schema(conn):
+    """Migration 1: create the shared schema, upgrading a legacy layout in place."""
+    _set_aside_legacy(conn)
+    # The triggers on `messages` maintain `summary_cache`, so create it too.
+    for statement in split_script(CACHE_SCHEMA + SCHEMA):
+        conn.execute(statement)
+    _finish_upgrade(conn)
+
+
+def import_legacy(db, path, timezone="UTC"):
+    """Copy a per-bot legacy database at `path` into `db`; returns rows copied.
+
+    `timezone` dates the messages of channels without a time zone of their own.
+    """
+    with db.attached(path, "legacy"), db.transaction() as conn:
+        register_date_functions(conn, timezone)
+        return _copy_legacy(conn, "legacy", "messages", "standup_channels")
@@ -0,0 +1,280 @@
+"""Persistent SQLite storage shared by the Discord and Slack bots.
+
+One writer connection and a small pool of reader connections are opened once
+and reused for the life of the process. WAL mode lets readers run while a write
+is in progress, and every SQL string is compiled once per connection by
+sqlite3's statement cache, so callers should pass the same module-level SQL
+constants rather than building queries on the fly.
+
+Coroutines must not call `Database` directly: `AsyncDatabase` runs the same
+operations on background threads so the Discord gateway and Slack socket-mode
+loops never wait on disk.
+"""
+
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from zoneinfo import ZoneInfo
+
+log = logging.getLogger("standup.storage")
+
+PRAGMAS = (
+    # Only takes effect on a new file (see standup_core.retention for existing ones).
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    # WAL + NORMAL only fsyncs on checkpoint, not on every commit.
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",  # ~16 MiB page cache per connection
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Number of compiled statements each connection keeps around.
+STATEMENT_CACHE_SIZE = 256
+
+TABLE_EXISTS = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+
+
+def local_date(created_at, tz_name):
+    """The YYYY-MM-DD date of epoch milliseconds `created_at` in `tz_name`."""
+    return datetime.fromtimestamp(created_at / 1000, ZoneInfo(tz_name)).strftime("%Y-%m-%d")
+
+
+def register_date_functions(conn, timezone):
+    """SQL ``local_date(created_at, tz)`` and ``default_timezone()`` (= `timezone`)
+    for statements that date messages."""
+    conn.create_function("local_date", 2, local_date, deterministic=True)
+    conn.create_function("default_timezone", 0, lambda: timezone, deterministic=True)
+
+
+def split_script(script):
+    """Split a SQL script into statements (trigger bodies stay whole)."""
+    statements = []
+    current = ""
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    if current.strip():
+        statements.append(current.strip())
+    return statements
+
+
+class Database:
+    """Long-lived, pooled SQLite connections with tuned pragmas."""
+
+    def __init__(self, path, pool_size=4):
+        self.path = path
+        self._closed = False
+        self._write_lock = threading.RLock()
+        self._writer = self._connect()
+        self._readers = queue.LifoQueue()
+        self._all_readers = []
+        for _ in range(max(1, pool_size)):
+            conn = self._connect()
+            self._all_readers.append(conn)
+            self._readers.put(conn)
+
+    def _connect(self):
+        # isolation_level=None hands transaction control to `transaction()`
+        # instead of sqlite3's implicit BEGIN before every DML statement.
+        conn = sqlite3.connect(
+            self.path,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _check_open(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Database has been closed.")
+
+    @contextmanager
+    def transaction(self):
+        """Run several writes on the writer connection as one transaction."""
+        self._check_open()
+        with self._write_lock:
+            conn = self._writer
+            if conn.in_transaction:
+                # Nested use joins the outer transaction.
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            else:
+                conn.execute("COMMIT")
+
+    @contextmanager
+    def reader(self):
+        """Borrow a reader connection from the pool."""
+        self._check_open()
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def attached(self, path, name):
+        """Attach the database file at `path` as `name` on the writer connection."""
+        self._check_open()
+        with self._write_lock:
+            # ATTACH cannot run inside a transaction, so this must come first.
+            self._writer.execute(f"ATTACH DATABASE ? AS {name}", (path,))
+            try:
+                yield self._writer
+            finally:
+                self._writer.execute(f"DETACH DATABASE {name}")
+
+    def execute(self, sql, params=()):
+        """Run a single write statement and commit it."""
+        with self.transaction() as conn:
+            return conn.execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        """Run a write statement for every parameter set in one transaction."""
+        with self.transaction() as conn:
+            return conn.executemany(sql, seq_of_params)
+
+    def executebatch(self, statements):
+        """Run (sql, params) pairs in one transaction.
+
+        Consecutive pairs sharing the same SQL are sent through a single
+        `executemany`, which is how the ingest queue group-commits rows.
+        """
+        with self.transaction() as conn:
+            for sql, group in groupby(statements, key=itemgetter(0)):
+                conn.executemany(sql, [params for _, params in group])
+
+    def executescript(self, script):
+        """Run a multi-statement script (e.g. schema setup) on the writer."""
+        self._check_open()
+        with self._write_lock:
+            self._writer.executescript(script)
+
+    def fetchall(self, sql, params=()):
+        """Run a read query on a pooled connection and return all rows."""
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def fetchone(self, sql, params=()):
+        """Run a read query on a pooled connection and return the first row."""
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def data_version(self):
+        """`PRAGMA data_version` as seen by the writer connection.
+
+        The writer's value only changes when some other connection (another
+        process) commits, so this process's own writes never bump it.
+        """
+        self._check_open()
+        with self._write_lock:
+            return self._writer.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        """Optimize, checkpoint and close every connection. Safe to call twice."""
+        if self._closed:
+            return
+        self._closed = True
+        with self._write_lock:
+            try:
+                self._writer.execute("PRAGMA optimize")
+                self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error:
+                log.exception("Failed to checkpoint %s on shutdown", self.path)
+            self._writer.close()
+        for conn in self._all_readers:
+            conn.close()
+
+
+class AsyncDatabase:
+    """Awaitable front-end for `Database` that keeps SQLite off the event loop.
+
+    Writes run one at a time, in submission order, on a dedicated writer
+    thread; reads run on a small thread pool. At most `queue_depth` writes may
+    be pending at once, after which callers wait (without blocking the loop)
+    for the writer to catch up.
+    """
+
+    def __init__(self, db, read_threads=4, queue_depth=1000):
+        self.db = db
+        self._reads = ThreadPoolExecutor(
+            max_workers=max(1, read_threads), thread_name_prefix="standup-db-read"
+        )
+        self._writes = ThreadPoolExecutor(max_workers=1, thread_name_prefix="standup-db-write")
+        self._write_slots = asyncio.Semaphore(max(1, queue_depth))
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Open the database described by a `Settings` instance."""
+        db = Database(settings.db_path, settings.db_pool_size)
+        return cls(db, settings.db_read_threads, settings.db_write_queue_depth)
+
+    @property
+    def path(self):
+        return self.db.path
+
+    async def run_read(self, func, *args):
+        """Run `func(*args)` on a reader thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reads, func, *args)
+
+    async def run_write(self, func, *args):
+        """Run `func(*args)` on the writer thread, applying back-pressure."""
+        loop = asyncio.get_running_loop()
+        async with self._write_slots:
+            return await loop.run_in_executor(self._writes, func, *args)
+
+    async def run_in_transaction(self, func, *args):
+        """Run `func(conn, *args)` inside one write transaction."""
+        return await self.run_write(self._call_in_transaction, func, args)
+
+    def _call_in_transaction(self, func, args):
+        with self.db.transaction() as conn:
+            return func(conn, *args)
+
+    async def execute(self, sql, params=()):
+        return await self.run_write(self.db.execute, sql, params)
+
+    async def executemany(self, sql, seq_of_params):
+        return await self.run_write(self.db.executemany, sql, seq_of_params)
+
+    async def executebatch(self, statements):
+        return await self.run_write(self.db.executebatch, statements)
+
+    async def executescript(self, script):
+        return await self.run_write(self.db.executescript, script)
+
+    async def fetchall(self, sql, params=()):
+        return await self.run_read(self.db.fetchall, sql, params)
+
+    async def fetchone(self, sql, params=()):
+        return await self.run_read(self.db.fetchone, sql, params)
+
+    async def data_version(self):
+        return await self.run_write(self.db.data_version)
+
+    async def close(self):
+        """Wait for queued writes to land, then close the database."""
+        loop = asyncio.get_running_loop()
+        # shutdown(wait=True) blocks, so let a worker thread do the waiting.
+        await loop.run_in_executor(None, self._writes.shutdown, True)
+        await loop.run_in_executor(None, self._reads.shutdown, True)
+        self.db.close()
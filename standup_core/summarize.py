@@ -0,0 +1,165 @@
+"""Hierarchical map-reduce summarization for days too large for one prompt.
+
+A day's messages arrive as author blocks: ``(author, [line, ...])``. Blocks are
+packed into chunks of at most `chunk_chars` characters, keeping each author's
+lines together where possible and splitting prolific authors by time (their
+lines are already in chronological order). Each chunk is summarized
+concurrently (the map step), partial summaries are merged in groups until they
+fit in one chunk, and the caller's own prompt turns them into the final summary
+(the reduce step). Unlike trimming, every author is covered.
+"""
+
+import asyncio
+
+MAP_PROMPT = """
+You are summarizing part {part} of {total} of the standup messages from #{channel_name} on {date}.
+
+For every person who appears below, write a short bullet list covering:
+- progress and accomplishments
+- blockers or challenges
+- next steps and plans
+
+Always attribute points to the person by name. Be factual, ignore chatter, and do not
+add an introduction or conclusion.
+
+**Messages:**
+{text}
+"""
+
+COMBINE_PROMPT = """
+The following are partial summaries of the standup messages from #{channel_name} on {date}.
+Merge them into one set of per-person bullet lists (progress, blockers, next steps),
+keeping every person and every blocker. Do not add an introduction or conclusion.
+
+{text}
+"""
+
+DIGEST_PROMPT = """
+You are writing a {days}-day digest of the standup channel #{channel_name}, from {start} to {end}.
+
+Below are the summaries of each day that had standup activity, followed by how many
+messages each person posted. Write ONE digest covering:
+1. The main themes and progress over the period
+2. Highlights per person (attribute points by name)
+3. Blockers that came up, and whether they appear resolved
+4. Decisions and notable changes in direction
+5. What is coming next
+
+Be concise, do not retell each day, and do not add an introduction.
+
+**Activity by person (messages, active days):**
+{stats}
+
+**Daily summaries:**
+{summaries}
+"""
+
+
+def block_text(author, lines):
+    return f"\n**{author}:**\n" + "".join(lines)
+
+
+def shard_blocks(blocks, chunk_chars):
+    """Pack author blocks into chunks of roughly `chunk_chars` characters."""
+    chunks = []
+    current = []
+    current_chars = 0
+
+    def emit():
+        nonlocal current, current_chars
+        if current:
+            chunks.append("\n".join(current))
+        current = []
+        current_chars = 0
+
+    for author, lines in blocks:
+        text = block_text(author, lines)
+        if len(text) <= chunk_chars:
+            if current_chars + len(text) > chunk_chars:
+                emit()
+            current.append(text)
+            current_chars += len(text)
+            continue
+
+        # One author alone overflows a chunk: split their lines by time.
+        emit()
+        header = f"\n**{author}:**\n"
+        piece = []
+        piece_chars = len(header)
+        for line in lines:
+            if piece and piece_chars + len(line) > chunk_chars:
+                chunks.append(header + "".join(piece))
+                piece = []
+                piece_chars = len(header)
+            piece.append(line)
+            piece_chars += len(line)
+        if piece:
+            current.append(header + "".join(piece))
+            current_chars = piece_chars
+    emit()
+    return chunks
+
+
+class MapReduceSummarizer:
+    """Summarizes chunks concurrently, then reduces the partial summaries."""
+
+    def __init__(self, llm, chunk_chars=60000, parallelism=4):
+        self.llm = llm
+        self.chunk_chars = chunk_chars
+        self.parallelism = max(1, parallelism)
+
+    @classmethod
+    def from_settings(cls, llm, settings):
+        return cls(llm, settings.summary_chunk_chars, settings.summary_parallelism)
+
+    def fits_single_prompt(self, blocks):
+        return sum(len(block_text(author, lines)) for author, lines in blocks) <= self.chunk_chars
+
+    async def summarize(self, blocks, channel_name, date, final_prompt):
+        """Summarize `blocks`; `final_prompt(text)` builds the reduce prompt."""
+        chunks = shard_blocks(blocks, self.chunk_chars)
+        if len(chunks) == 1:
+            return await self.llm.generate(final_prompt(chunks[0]))
+
+        slots = asyncio.Semaphore(self.parallelism)
+
+        async def run(prompt):
+            async with slots:
+                return await self.llm.generate(prompt)
+
+        total = len(chunks)
+        partials = await asyncio.gather(
+            *(
+                run(
+                    MAP_PROMPT.format(
+                        part=i + 1,
+                        total=total,
+                        channel_name=channel_name,
+                        date=date,
+                        text=chunk,
+                    )
+                )
+                for i, chunk in enumerate(chunks)
+            )
+        )
+
+        # Merge partial summaries level by level until they fit in one prompt.
+        while len(partials) > 1 and sum(len(p) for p in partials) > self.chunk_chars:
+            groups = shard_blocks(
+                [(f"Part {i + 1}", [p]) for i, p in enumerate(partials)], self.chunk_chars
+            )
+            if len(groups) >= len(partials):
+                break
+            partials = await asyncio.gather(
+                *(
+                    run(COMBINE_PROMPT.format(channel_name=channel_name, date=date, text=group))
+                    for group in groups
+                )
+            )
+
+        return await self.llm.generate(
+            final_prompt(
+                "(The messages were summarized in parts; the partial summaries follow.)\n\n"
+                + "\n\n".join(partials)
+            )
+        )